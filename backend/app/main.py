@@ -1,19 +1,123 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from .database import engine, Base
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers
+from .database import async_engine, run_migrations
 from .routers import stacks_router, documents_router, chat_router
+from .services import (
+    close_chat_log,
+    get_chat_log,
+    get_client_registry,
+    close_client_registry,
+    get_conversation_memory,
+    close_conversation_memory,
+    get_embedding_cache,
+    close_embedding_cache,
+    get_prompt_metrics,
+    get_query_batcher,
+    get_response_cache,
+    get_stack_cache,
+    stop_stack_cache,
+    get_retrieval_cache,
+    get_ingestion_worker,
+    stop_ingestion_worker,
+    close_lexical_indexes,
+    close_vector_indexes
+)
+from .schemas import error_response
 from .config import settings
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+# Create or upgrade database tables
+if settings.RUN_MIGRATIONS_ON_STARTUP:
+    run_migrations()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Provider clients and connection pools live for the whole app
+    app.state.client_registry = get_client_registry()
+    get_ingestion_worker().start()
+    get_stack_cache().start()
+    yield
+    await close_chat_log()
+    await close_conversation_memory()
+    await stop_stack_cache()
+    await stop_ingestion_worker()
+    await close_client_registry()
+    close_embedding_cache()
+    close_lexical_indexes()
+    close_vector_indexes()
+    await async_engine.dispose()
+
 
 # Initialize FastAPI app
 app = FastAPI(
     title=settings.APP_NAME,
     description="API for GenAI Stack - No-Code Workflow Builder",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+# Multipart overhead allowed on top of MAX_FILE_SIZE before rejecting an upload
+UPLOAD_OVERHEAD_BYTES = 64 * 1024
+UPLOAD_PATH_PREFIX = "/api/documents/upload"
+
+
+class UploadTooLarge(HTTPException):
+    def __init__(self):
+        super().__init__(
+            status_code=413,
+            detail=f"File exceeds the maximum size of {settings.MAX_FILE_SIZE} bytes"
+        )
+
+
+@app.exception_handler(UploadTooLarge)
+async def upload_too_large_handler(request: Request, exc: UploadTooLarge):
+    return JSONResponse(
+        status_code=exc.status_code,
+        content=error_response(code="FILE_TOO_LARGE", message=exc.detail)
+    )
+
+
+class UploadSizeLimitMiddleware:
+    """Cap the request body of uploads before the multipart parser spools it.
+
+    A declared Content-Length over the limit is rejected without reading the
+    body; otherwise (e.g. chunked uploads) the body is counted as it arrives
+    and reading stops as soon as it passes the limit.
+    """
+
+    def __init__(self, app, max_body_size: int):
+        self.app = app
+        self.max_body_size = max_body_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" \
+                or not scope["path"].startswith(UPLOAD_PATH_PREFIX):
+            await self.app(scope, receive, send)
+            return
+        content_length = Headers(scope=scope).get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > self.max_body_size:
+            response = await upload_too_large_handler(Request(scope), UploadTooLarge())
+            await response(scope, receive, send)
+            return
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_size:
+                    raise UploadTooLarge()
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+app.add_middleware(UploadSizeLimitMiddleware, max_body_size=settings.MAX_FILE_SIZE + UPLOAD_OVERHEAD_BYTES)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -38,6 +142,28 @@ def health_check():
     }
 
 
+@app.get("/api/metrics")
+def metrics():
+    embedding_cache = get_embedding_cache()
+    retrieval_cache = get_retrieval_cache()
+    query_batcher = get_query_batcher()
+    return {
+        "success": True,
+        "data": {
+            "chat_log": get_chat_log().stats(),
+            "client_registry": get_client_registry().stats(),
+            "conversation_memory": get_conversation_memory().stats(),
+            "embedding_cache": embedding_cache.stats() if embedding_cache else None,
+            "retrieval_cache": retrieval_cache.stats() if retrieval_cache else None,
+            "response_cache": get_response_cache().stats(),
+            "stack_cache": get_stack_cache().stats(),
+            "query_batcher": query_batcher.stats() if query_batcher else None,
+            "prompt_size": get_prompt_metrics().stats()
+        },
+        "message": "Metrics retrieved successfully"
+    }
+
+
 @app.get("/")
 def root():
     return {
@@ -1,5 +1,6 @@
 from .stack import Stack
 from .document import Document
 from .chat import ChatMessage
+from .ingestion_job import IngestionJob
 
-__all__ = ["Stack", "Document", "ChatMessage"]
+__all__ = ["Stack", "Document", "ChatMessage", "IngestionJob"]
@@ -1,7 +1,6 @@
 import uuid
 from datetime import datetime
-from sqlalchemy import Column, String, Boolean, DateTime, ForeignKey
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Column, String, Boolean, Float, DateTime, ForeignKey, Uuid
 from sqlalchemy.orm import relationship
 from ..database import Base
 
@@ -9,16 +8,20 @@ from ..database import Base
 class Document(Base):
     __tablename__ = "documents"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    stack_id = Column(UUID(as_uuid=True), ForeignKey("stacks.id", ondelete="CASCADE"), nullable=False)
+    id = Column(Uuid, primary_key=True, default=uuid.uuid4)
+    stack_id = Column(Uuid, ForeignKey("stacks.id", ondelete="CASCADE"), nullable=False, index=True)
     filename = Column(String(255), nullable=False)
     file_path = Column(String(512), nullable=False)
-    content_hash = Column(String(64), nullable=True)
+    content_hash = Column(String(64), nullable=True, index=True)
     is_processed = Column(Boolean, default=False)
+    processing_status = Column(String(20), default="pending")  # pending, queued, processing, completed, failed
+    progress = Column(Float, default=0.0)
+    embedding_model = Column(String(50), nullable=True)  # model the stored chunks were embedded with
     created_at = Column(DateTime, default=datetime.utcnow)
 
     # Relationships
     stack = relationship("Stack", back_populates="documents")
+    ingestion_jobs = relationship("IngestionJob", back_populates="document", cascade="all, delete-orphan")
 
     def __repr__(self):
         return f"<Document(id={self.id}, filename={self.filename})>"
@@ -0,0 +1,29 @@
+import uuid
+from datetime import datetime
+from sqlalchemy import Column, String, Text, Float, Integer, DateTime, ForeignKey, Uuid
+from sqlalchemy.orm import relationship
+from ..database import Base
+
+
+class IngestionJob(Base):
+    __tablename__ = "ingestion_jobs"
+
+    id = Column(Uuid, primary_key=True, default=uuid.uuid4)
+    document_id = Column(Uuid, ForeignKey("documents.id", ondelete="CASCADE"), nullable=False)
+    embedding_model = Column(String(50), nullable=False, default="openai")
+    status = Column(String(20), nullable=False, default="queued")  # queued, running, completed, failed
+    progress = Column(Float, nullable=False, default=0.0)
+    message = Column(Text, nullable=True)
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    encrypted_api_key = Column(Text, nullable=True)  # API key passed to /process; cleared when the job finishes
+    lease_expires_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+    # Relationships
+    document = relationship("Document", back_populates="ingestion_jobs")
+
+    def __repr__(self):
+        return f"<IngestionJob(id={self.id}, status={self.status})>"
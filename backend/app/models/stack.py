@@ -1,15 +1,18 @@
 import uuid
 from datetime import datetime
-from sqlalchemy import Column, String, Text, DateTime, JSON
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Column, String, Text, DateTime, JSON, Index, Uuid
 from sqlalchemy.orm import relationship
 from ..database import Base
 
 
 class Stack(Base):
     __tablename__ = "stacks"
+    __table_args__ = (
+        # Keyset pagination of the stack list, most recently updated first
+        Index("ix_stacks_updated_at", "updated_at", "id"),
+    )
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = Column(Uuid, primary_key=True, default=uuid.uuid4)
     name = Column(String(255), nullable=False)
     description = Column(Text, nullable=True)
     workflow_data = Column(JSON, nullable=True, default=dict)
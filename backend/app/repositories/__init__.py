@@ -1,11 +1,22 @@
-from .base import BaseRepository
-from .stack_repository import StackRepository
-from .document_repository import DocumentRepository
-from .chat_repository import ChatRepository
+from .base import AsyncBaseRepository, BaseRepository
+from .pagination import Cursor, encode_cursor, decode_cursor
+from .stack_repository import AsyncStackRepository, StackRepository
+from .document_repository import AsyncDocumentRepository, DocumentRepository
+from .chat_repository import AsyncChatRepository, ChatRepository
+from .ingestion_job_repository import AsyncIngestionJobRepository, IngestionJobRepository
 
 __all__ = [
     "BaseRepository",
     "StackRepository",
     "DocumentRepository",
     "ChatRepository",
+    "IngestionJobRepository",
+    "AsyncBaseRepository",
+    "AsyncStackRepository",
+    "AsyncDocumentRepository",
+    "AsyncChatRepository",
+    "AsyncIngestionJobRepository",
+    "Cursor",
+    "encode_cursor",
+    "decode_cursor",
 ]
@@ -1,4 +1,6 @@
 from typing import TypeVar, Generic, Type, Optional, List
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from uuid import UUID
 
@@ -42,3 +44,42 @@ class BaseRepository(Generic[T]):
             self.db.commit()
             return True
         return False
+
+
+class AsyncBaseRepository(Generic[T]):
+    """Async counterpart of BaseRepository for use from the event loop"""
+    
+    def __init__(self, model: Type[T], db: AsyncSession):
+        self.model = model
+        self.db = db
+    
+    async def get_by_id(self, id: UUID) -> Optional[T]:
+        return await self.db.scalar(select(self.model).where(self.model.id == id))
+    
+    async def get_all(self, skip: int = 0, limit: int = 100) -> List[T]:
+        return list(await self.db.scalars(select(self.model).offset(skip).limit(limit)))
+    
+    async def create(self, obj_data: dict) -> T:
+        db_obj = self.model(**obj_data)
+        self.db.add(db_obj)
+        await self.db.commit()
+        await self.db.refresh(db_obj)
+        return db_obj
+    
+    async def update(self, id: UUID, obj_data: dict) -> Optional[T]:
+        db_obj = await self.get_by_id(id)
+        if db_obj:
+            for key, value in obj_data.items():
+                if value is not None:
+                    setattr(db_obj, key, value)
+            await self.db.commit()
+            await self.db.refresh(db_obj)
+        return db_obj
+    
+    async def delete(self, id: UUID) -> bool:
+        db_obj = await self.get_by_id(id)
+        if db_obj:
+            await self.db.delete(db_obj)
+            await self.db.commit()
+            return True
+        return False
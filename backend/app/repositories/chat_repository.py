@@ -1,10 +1,21 @@
-from typing import List
+from typing import List, Optional
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from uuid import UUID
-from .base import BaseRepository
+from .base import AsyncBaseRepository, BaseRepository
+from .pagination import Cursor, keyset_filter
 from ..models.chat import ChatMessage
 
 
+def _page_query(stack_id: UUID, limit: int, after: Optional[Cursor]):
+    """Oldest-first messages of a stack, starting after a cursor"""
+    query = select(ChatMessage).where(ChatMessage.stack_id == stack_id)
+    if after is not None:
+        query = query.where(keyset_filter(ChatMessage.created_at, ChatMessage.id, after))
+    return query.order_by(ChatMessage.created_at.asc(), ChatMessage.id.asc()).limit(limit)
+
+
 class ChatRepository(BaseRepository[ChatMessage]):
     """Repository for ChatMessage model operations"""
     
@@ -16,6 +27,9 @@ class ChatRepository(BaseRepository[ChatMessage]):
             ChatMessage.stack_id == stack_id
         ).order_by(ChatMessage.created_at.asc()).limit(limit).all()
     
+    def get_page(self, stack_id: UUID, limit: int, after: Optional[Cursor] = None) -> List[ChatMessage]:
+        return list(self.db.scalars(_page_query(stack_id, limit, after)))
+    
     def add_message(self, stack_id: UUID, role: str, content: str) -> ChatMessage:
         return self.create({
             "stack_id": stack_id,
@@ -29,3 +43,42 @@ class ChatRepository(BaseRepository[ChatMessage]):
         ).delete()
         self.db.commit()
         return count
+
+
+class AsyncChatRepository(AsyncBaseRepository[ChatMessage]):
+    """Async repository for ChatMessage model operations"""
+    
+    def __init__(self, db: AsyncSession):
+        super().__init__(ChatMessage, db)
+    
+    async def get_by_stack_id(self, stack_id: UUID, limit: int = 50) -> List[ChatMessage]:
+        return list(await self.db.scalars(
+            select(ChatMessage).where(
+                ChatMessage.stack_id == stack_id
+            ).order_by(ChatMessage.created_at.asc()).limit(limit)
+        ))
+    
+    async def get_page(self, stack_id: UUID, limit: int, after: Optional[Cursor] = None) -> List[ChatMessage]:
+        return list(await self.db.scalars(_page_query(stack_id, limit, after)))
+    
+    async def get_recent(self, stack_id: UUID, limit: int) -> List[ChatMessage]:
+        """The latest `limit` messages of a stack, oldest first"""
+        messages = list(await self.db.scalars(
+            select(ChatMessage).where(
+                ChatMessage.stack_id == stack_id
+            ).order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc()).limit(limit)
+        ))
+        messages.reverse()
+        return messages
+    
+    async def add_message(self, stack_id: UUID, role: str, content: str) -> ChatMessage:
+        return await self.create({
+            "stack_id": stack_id,
+            "role": role,
+            "content": content
+        })
+    
+    async def clear_history(self, stack_id: UUID) -> int:
+        result = await self.db.execute(delete(ChatMessage).where(ChatMessage.stack_id == stack_id))
+        await self.db.commit()
+        return result.rowcount
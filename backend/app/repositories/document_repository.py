@@ -1,7 +1,9 @@
-from typing import List
+from typing import List, Optional
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from uuid import UUID
-from .base import BaseRepository
+from .base import AsyncBaseRepository, BaseRepository
 from ..models.document import Document
 
 
@@ -20,6 +22,25 @@ class DocumentRepository(BaseRepository[Document]):
             Document.is_processed == True
         ).all()
     
+    def get_by_stack_and_hash(self, stack_id: UUID, content_hash: str) -> Optional[Document]:
+        return self.db.query(Document).filter(
+            Document.stack_id == stack_id,
+            Document.content_hash == content_hash
+        ).first()
+    
+    def get_processed_copy(self, content_hash: str, embedding_model: str, exclude_id: UUID) -> Optional[Document]:
+        """Find another processed document with the same content and embedding model"""
+        return self.db.query(Document).filter(
+            Document.content_hash == content_hash,
+            Document.embedding_model == embedding_model,
+            Document.is_processed == True,
+            Document.id != exclude_id
+        ).first()
+    
+    def count_by_file_path(self, file_path: str) -> int:
+        """Number of documents referencing a stored file"""
+        return self.db.query(Document).filter(Document.file_path == file_path).count()
+    
     def mark_as_processed(self, id: UUID) -> bool:
         doc = self.get_by_id(id)
         if doc:
@@ -27,3 +48,48 @@ class DocumentRepository(BaseRepository[Document]):
             self.db.commit()
             return True
         return False
+
+
+class AsyncDocumentRepository(AsyncBaseRepository[Document]):
+    """Async repository for Document model operations"""
+    
+    def __init__(self, db: AsyncSession):
+        super().__init__(Document, db)
+    
+    async def get_by_stack_id(self, stack_id: UUID) -> List[Document]:
+        return list(await self.db.scalars(select(Document).where(Document.stack_id == stack_id)))
+    
+    async def get_processed_by_stack_id(self, stack_id: UUID) -> List[Document]:
+        return list(await self.db.scalars(select(Document).where(
+            Document.stack_id == stack_id,
+            Document.is_processed == True
+        )))
+    
+    async def get_by_stack_and_hash(self, stack_id: UUID, content_hash: str) -> Optional[Document]:
+        return await self.db.scalar(select(Document).where(
+            Document.stack_id == stack_id,
+            Document.content_hash == content_hash
+        ).limit(1))
+    
+    async def get_processed_copy(self, content_hash: str, embedding_model: str, exclude_id: UUID) -> Optional[Document]:
+        """Find another processed document with the same content and embedding model"""
+        return await self.db.scalar(select(Document).where(
+            Document.content_hash == content_hash,
+            Document.embedding_model == embedding_model,
+            Document.is_processed == True,
+            Document.id != exclude_id
+        ).limit(1))
+    
+    async def count_by_file_path(self, file_path: str) -> int:
+        """Number of documents referencing a stored file"""
+        return await self.db.scalar(
+            select(func.count()).select_from(Document).where(Document.file_path == file_path)
+        )
+    
+    async def mark_as_processed(self, id: UUID) -> bool:
+        doc = await self.get_by_id(id)
+        if doc:
+            doc.is_processed = True
+            await self.db.commit()
+            return True
+        return False
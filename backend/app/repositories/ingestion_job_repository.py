@@ -0,0 +1,151 @@
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from uuid import UUID
+from .base import AsyncBaseRepository, BaseRepository
+from ..models.document import Document
+from ..models.ingestion_job import IngestionJob
+
+
+class IngestionJobRepository(BaseRepository[IngestionJob]):
+    """Repository for IngestionJob model operations; the queue itself is
+    driven through AsyncIngestionJobRepository"""
+
+    def __init__(self, db: Session):
+        super().__init__(IngestionJob, db)
+
+
+class AsyncIngestionJobRepository(AsyncBaseRepository[IngestionJob]):
+    """Async repository for IngestionJob model operations.
+
+    The table doubles as the job queue: workers claim jobs with a row lock and
+    hold a time-limited lease, so jobs whose worker died become claimable
+    again once the lease expires.
+    """
+
+    def __init__(self, db: AsyncSession):
+        super().__init__(IngestionJob, db)
+
+    async def get_active_for_document(self, document_id: UUID) -> Optional[IngestionJob]:
+        return await self.db.scalar(select(IngestionJob).where(
+            IngestionJob.document_id == document_id,
+            IngestionJob.status.in_(["queued", "running"])
+        ).limit(1))
+
+    async def enqueue(
+        self,
+        document_id: UUID,
+        embedding_model: str,
+        encrypted_api_key: Optional[str] = None
+    ) -> IngestionJob:
+        job = await self.create({
+            "document_id": document_id,
+            "embedding_model": embedding_model,
+            "encrypted_api_key": encrypted_api_key,
+            "status": "queued"
+        })
+        await self._set_document_status(document_id, "queued", 0.0)
+        await self.db.commit()
+        return job
+
+    async def claim_next(self, lease_seconds: float, max_attempts: int) -> Optional[IngestionJob]:
+        """Claim the oldest runnable job, including running jobs whose lease
+        expired. A job already claimed max_attempts times is failed instead:
+        whatever it does keeps killing its worker."""
+        while True:
+            now = datetime.utcnow()
+            job = await self.db.scalar(select(IngestionJob).where(
+                or_(
+                    IngestionJob.status == "queued",
+                    (IngestionJob.status == "running") & (IngestionJob.lease_expires_at < now)
+                )
+            ).order_by(IngestionJob.created_at.asc()).limit(1).with_for_update(skip_locked=True))
+
+            if job is None:
+                await self.db.rollback()
+                return None
+            if job.attempts < max_attempts:
+                break
+            await self._fail(job, f"Gave up after {job.attempts} attempts; the worker stopped each time")
+            await self.db.commit()
+
+        job.status = "running"
+        job.attempts += 1
+        job.error = None
+        job.lease_expires_at = now + timedelta(seconds=lease_seconds)
+        await self._set_document_status(job.document_id, "processing", job.progress)
+        await self.db.commit()
+        await self.db.refresh(job)
+        return job
+
+    async def renew_lease(self, id: UUID, lease_seconds: float) -> None:
+        await self.db.execute(update(IngestionJob).where(
+            IngestionJob.id == id,
+            IngestionJob.status == "running"
+        ).values(lease_expires_at=datetime.utcnow() + timedelta(seconds=lease_seconds)))
+        await self.db.commit()
+
+    async def update_progress(self, id: UUID, progress: float, message: str) -> None:
+        job = await self.get_by_id(id)
+        if job:
+            job.progress = progress
+            job.message = message
+            await self._set_document_status(job.document_id, "processing", progress)
+            await self.db.commit()
+
+    async def mark_completed(self, id: UUID, message: str) -> None:
+        job = await self.get_by_id(id)
+        if job:
+            job.status = "completed"
+            job.progress = 1.0
+            job.message = message
+            job.encrypted_api_key = None
+            job.lease_expires_at = None
+            job.finished_at = datetime.utcnow()
+            await self._set_document_status(
+                job.document_id, "completed", 1.0,
+                is_processed=True,
+                embedding_model=job.embedding_model
+            )
+            await self.db.commit()
+
+    async def mark_failed(self, id: UUID, error: str) -> None:
+        job = await self.get_by_id(id)
+        if job:
+            await self._fail(job, error)
+            await self.db.commit()
+
+    async def requeue(self, id: UUID) -> None:
+        job = await self.get_by_id(id)
+        if job:
+            # Handed back on shutdown; that run doesn't count as an attempt
+            job.status = "queued"
+            job.attempts -= 1
+            job.lease_expires_at = None
+            await self._set_document_status(job.document_id, "queued", job.progress)
+            await self.db.commit()
+
+    async def _fail(self, job: IngestionJob, error: str) -> None:
+        job.status = "failed"
+        job.error = error
+        job.encrypted_api_key = None
+        job.lease_expires_at = None
+        job.finished_at = datetime.utcnow()
+        await self._set_document_status(job.document_id, "failed", job.progress)
+
+    async def _set_document_status(
+        self,
+        document_id: UUID,
+        status: str,
+        progress: float,
+        is_processed: Optional[bool] = None,
+        embedding_model: Optional[str] = None
+    ) -> None:
+        values = {"processing_status": status, "progress": progress}
+        if is_processed is not None:
+            values["is_processed"] = is_processed
+        if embedding_model is not None:
+            values["embedding_model"] = embedding_model
+        await self.db.execute(update(Document).where(Document.id == document_id).values(**values))
@@ -0,0 +1,35 @@
+import base64
+import json
+from datetime import datetime
+from typing import Tuple
+from uuid import UUID
+from sqlalchemy import tuple_
+
+# Position in a list ordered by (timestamp, id)
+Cursor = Tuple[datetime, UUID]
+
+
+def encode_cursor(timestamp: datetime, id: UUID) -> str:
+    """Opaque cursor for the row after which the next page starts"""
+    raw = json.dumps([timestamp.isoformat(), str(id)]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Cursor:
+    """Parse a cursor from encode_cursor(); raises ValueError if it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        timestamp, id = json.loads(raw)
+        return datetime.fromisoformat(timestamp), UUID(id)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def keyset_filter(timestamp_column, id_column, cursor: Cursor, descending: bool = False):
+    """Rows strictly past the cursor in (timestamp, id) order.
+
+    Compares the pair as a row value so the database can seek straight into
+    a (timestamp, id) index instead of skipping rows like OFFSET does.
+    """
+    key = tuple_(timestamp_column, id_column)
+    return key < tuple_(*cursor) if descending else key > tuple_(*cursor)
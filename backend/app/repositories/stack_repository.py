@@ -1,8 +1,20 @@
 from typing import Optional, List
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from uuid import UUID
-from .base import BaseRepository
+from .base import AsyncBaseRepository, BaseRepository
+from .pagination import Cursor, keyset_filter
 from ..models.stack import Stack
+from ..stack_events import stack_changed
+
+
+def _page_query(limit: int, after: Optional[Cursor]):
+    """Most recently updated stacks first, starting after a cursor"""
+    query = select(Stack)
+    if after is not None:
+        query = query.where(keyset_filter(Stack.updated_at, Stack.id, after, descending=True))
+    return query.order_by(Stack.updated_at.desc(), Stack.id.desc()).limit(limit)
 
 
 class StackRepository(BaseRepository[Stack]):
@@ -17,10 +29,57 @@ class StackRepository(BaseRepository[Stack]):
     def get_all_ordered(self, skip: int = 0, limit: int = 100) -> List[Stack]:
         return self.db.query(Stack).order_by(Stack.updated_at.desc()).offset(skip).limit(limit).all()
     
+    def get_page(self, limit: int, after: Optional[Cursor] = None) -> List[Stack]:
+        return list(self.db.scalars(_page_query(limit, after)))
+    
+    def update(self, id: UUID, obj_data: dict) -> Optional[Stack]:
+        stack_changed(self.db, id)
+        return super().update(id, obj_data)
+    
     def update_workflow(self, id: UUID, workflow_data: dict) -> Optional[Stack]:
         stack = self.get_by_id(id)
         if stack:
             stack.workflow_data = workflow_data
+            stack_changed(self.db, id)
             self.db.commit()
             self.db.refresh(stack)
         return stack
+    
+    def delete(self, id: UUID) -> bool:
+        stack_changed(self.db, id)
+        return super().delete(id)
+
+
+class AsyncStackRepository(AsyncBaseRepository[Stack]):
+    """Async repository for Stack model operations"""
+    
+    def __init__(self, db: AsyncSession):
+        super().__init__(Stack, db)
+    
+    async def get_by_name(self, name: str) -> Optional[Stack]:
+        return await self.db.scalar(select(Stack).where(Stack.name == name))
+    
+    async def get_all_ordered(self, skip: int = 0, limit: int = 100) -> List[Stack]:
+        return list(await self.db.scalars(
+            select(Stack).order_by(Stack.updated_at.desc()).offset(skip).limit(limit)
+        ))
+    
+    async def get_page(self, limit: int, after: Optional[Cursor] = None) -> List[Stack]:
+        return list(await self.db.scalars(_page_query(limit, after)))
+    
+    async def update(self, id: UUID, obj_data: dict) -> Optional[Stack]:
+        stack_changed(self.db, id)
+        return await super().update(id, obj_data)
+    
+    async def update_workflow(self, id: UUID, workflow_data: dict) -> Optional[Stack]:
+        stack = await self.get_by_id(id)
+        if stack:
+            stack.workflow_data = workflow_data
+            stack_changed(self.db, id)
+            await self.db.commit()
+            await self.db.refresh(stack)
+        return stack
+    
+    async def delete(self, id: UUID) -> bool:
+        stack_changed(self.db, id)
+        return await super().delete(id)
@@ -1,20 +1,23 @@
+import json
+from typing import Optional
 from uuid import UUID
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from ..database import get_db
-from ..repositories import StackRepository, ChatRepository
-from ..schemas import ChatRequest, ChatMessageResponse, success_response, error_response
-from ..services import WorkflowEngine
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..config import settings
+from ..database import get_async_db
+from ..repositories import AsyncChatRepository, decode_cursor, encode_cursor
+from ..schemas import ChatRequest, ChatMessageResponse, success_response, paginated_response, error_response
+from ..services import WorkflowEngine, get_cached_stack, get_chat_log, get_conversation_memory
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
 
 @router.post("/{stack_id}/message")
-async def send_message(stack_id: UUID, request: ChatRequest, db: Session = Depends(get_db)):
+async def send_message(stack_id: UUID, request: ChatRequest, db: AsyncSession = Depends(get_async_db)):
     """Send a message to a stack and get a response"""
     # Validate stack exists
-    stack_repo = StackRepository(db)
-    stack = stack_repo.get_by_id(stack_id)
+    stack = await get_cached_stack(db, stack_id)
     if not stack:
         return error_response(
             code="STACK_NOT_FOUND",
@@ -27,9 +30,9 @@ async def send_message(stack_id: UUID, request: ChatRequest, db: Session = Depen
             message="Stack has no workflow configured"
         )
     
-    # Save user message
-    chat_repo = ChatRepository(db)
-    chat_repo.add_message(stack_id, "user", request.message)
+    # Save user message (written to the database in the next batch)
+    chat_log = get_chat_log()
+    chat_log.append(stack_id, "user", request.message)
     
     try:
         # Execute workflow
@@ -41,7 +44,7 @@ async def send_message(stack_id: UUID, request: ChatRequest, db: Session = Depen
         )
         
         # Save assistant response
-        chat_repo.add_message(stack_id, "assistant", response)
+        chat_log.append(stack_id, "assistant", response)
         
         return success_response(
             data={"response": response},
@@ -55,32 +58,111 @@ async def send_message(stack_id: UUID, request: ChatRequest, db: Session = Depen
         )
 
 
+def _sse_event(event: dict) -> str:
+    """Format an event as a Server-Sent Events message"""
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+@router.post("/{stack_id}/stream")
+async def stream_message(stack_id: UUID, request: ChatRequest, db: AsyncSession = Depends(get_async_db)):
+    """Send a message to a stack and stream the response as Server-Sent Events"""
+    # Validate stack exists
+    stack = await get_cached_stack(db, stack_id)
+    if not stack:
+        return error_response(
+            code="STACK_NOT_FOUND",
+            message=f"Stack with ID {stack_id} not found"
+        )
+    
+    if not stack.workflow_data or not stack.workflow_data.get("nodes"):
+        return error_response(
+            code="NO_WORKFLOW",
+            message="Stack has no workflow configured"
+        )
+    
+    # Save user message (written to the database in the next batch)
+    chat_log = get_chat_log()
+    chat_log.append(stack_id, "user", request.message)
+    
+    workflow_engine = WorkflowEngine(db)
+    workflow_data = stack.workflow_data
+    
+    async def event_stream():
+        try:
+            async for event in workflow_engine.execute_stream(
+                stack_id=stack_id,
+                workflow_data=workflow_data,
+                query=request.message
+            ):
+                if event["type"] == "done":
+                    chat_log.append(stack_id, "assistant", event["response"])
+                yield _sse_event(event)
+        except Exception as e:
+            yield _sse_event({
+                "type": "error",
+                "code": "EXECUTION_ERROR",
+                "message": f"Error executing workflow: {str(e)}"
+            })
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.get("/{stack_id}/history")
-def get_chat_history(stack_id: UUID, limit: int = 50, db: Session = Depends(get_db)):
-    """Get chat history for a stack"""
+async def get_chat_history(
+    stack_id: UUID,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get chat history for a stack, oldest first, one page at a time.
+
+    Pass the returned next_cursor to get the following page.
+    """
+    limit = min(max(limit, 1), settings.MAX_PAGE_SIZE)
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        return error_response(code="INVALID_CURSOR", message=str(e))
+    
     # Validate stack exists
-    stack_repo = StackRepository(db)
-    stack = stack_repo.get_by_id(stack_id)
+    stack = await get_cached_stack(db, stack_id)
     if not stack:
         return error_response(
             code="STACK_NOT_FOUND",
             message=f"Stack with ID {stack_id} not found"
         )
     
-    chat_repo = ChatRepository(db)
-    messages = chat_repo.get_by_stack_id(stack_id, limit=limit)
+    # One extra row tells whether another page follows
+    chat_repo = AsyncChatRepository(db)
+    messages = await chat_repo.get_page(stack_id, limit + 1, after)
+    # Include messages still waiting in the write buffer
+    seen = {m.id for m in messages}
+    messages += [
+        m for m in get_chat_log().pending(stack_id)
+        if m.id not in seen and (after is None or (m.created_at, m.id) > after)
+    ]
+    messages.sort(key=lambda m: (m.created_at, m.id))
+    next_cursor = encode_cursor(messages[limit - 1].created_at, messages[limit - 1].id) if len(messages) > limit else None
     
-    return success_response(
-        data=[ChatMessageResponse.model_validate(m).model_dump() for m in messages],
+    return paginated_response(
+        data=[ChatMessageResponse.model_validate(m).model_dump() for m in messages[:limit]],
+        next_cursor=next_cursor,
         message="Chat history retrieved successfully"
     )
 
 
 @router.delete("/{stack_id}/history")
-def clear_chat_history(stack_id: UUID, db: Session = Depends(get_db)):
+async def clear_chat_history(stack_id: UUID, db: AsyncSession = Depends(get_async_db)):
     """Clear chat history for a stack"""
-    chat_repo = ChatRepository(db)
-    count = chat_repo.clear_history(stack_id)
+    # Write out buffered messages first so none land after the delete
+    await get_chat_log().flush()
+    chat_repo = AsyncChatRepository(db)
+    count = await chat_repo.clear_history(stack_id)
+    get_conversation_memory().forget(stack_id)
     
     return success_response(
         data={"deleted_count": count},
@@ -1,53 +1,50 @@
 import os
-import hashlib
-import uuid as uuid_lib
 from uuid import UUID
-from typing import List
-from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException
+from fastapi import APIRouter, Depends, UploadFile, File
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-import fitz  # PyMuPDF
-from ..database import get_db
-from ..repositories import StackRepository, DocumentRepository
-from ..schemas import DocumentResponse, DocumentUploadResponse, success_response, error_response
-from ..services import EmbeddingService, VectorStoreService
-from ..config import settings
+from ..database import get_db, get_async_db
+from ..repositories import (
+    AsyncDocumentRepository,
+    AsyncIngestionJobRepository,
+    DocumentRepository,
+    IngestionJobRepository
+)
+from ..schemas import (
+    DocumentResponse,
+    DocumentUploadResponse,
+    IngestionJobResponse,
+    success_response,
+    error_response
+)
+from ..services import (
+    VectorStoreService,
+    get_cached_stack,
+    get_ingestion_worker,
+    get_lexical_index,
+    seal_api_key
+)
+from ..services.document_storage import (
+    save_upload,
+    commit_upload,
+    content_path,
+    discard_upload,
+    remove_content
+)
+from ..stack_events import stack_changed
 
 router = APIRouter(prefix="/documents", tags=["documents"])
 
 
-def extract_text_from_pdf(file_path: str) -> str:
-    """Extract text from a PDF file using PyMuPDF"""
-    doc = fitz.open(file_path)
-    text = ""
-    for page in doc:
-        text += page.get_text()
-    doc.close()
-    return text
-
-
-def chunk_text(text: str, chunk_size: int = 1000, overlap: int = 200) -> List[str]:
-    """Split text into overlapping chunks"""
-    chunks = []
-    start = 0
-    while start < len(text):
-        end = start + chunk_size
-        chunk = text[start:end]
-        if chunk.strip():
-            chunks.append(chunk)
-        start = end - overlap
-    return chunks
-
-
 @router.post("/upload/{stack_id}")
 async def upload_document(
     stack_id: UUID,
     file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Upload a document to a stack"""
     # Validate stack exists
-    stack_repo = StackRepository(db)
-    stack = stack_repo.get_by_id(stack_id)
+    stack = await get_cached_stack(db, stack_id)
     if not stack:
         return error_response(
             code="STACK_NOT_FOUND",
@@ -61,30 +58,41 @@ async def upload_document(
             message="Only PDF files are supported"
         )
     
-    # Create upload directory
-    os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
-    
-    # Generate unique filename
-    file_ext = os.path.splitext(file.filename)[1]
-    unique_filename = f"{uuid_lib.uuid4()}{file_ext}"
-    file_path = os.path.join(settings.UPLOAD_DIR, unique_filename)
-    
-    # Save file
-    content = await file.read()
-    content_hash = hashlib.sha256(content).hexdigest()
+    # Copy to disk in chunks rather than reading the whole file into memory
+    try:
+        temp_path, content_hash = await save_upload(file)
+    except ValueError as e:
+        return error_response(code="FILE_TOO_LARGE", message=str(e))
     
-    with open(file_path, "wb") as f:
-        f.write(content)
+    doc_repo = AsyncDocumentRepository(db)
+    existing = await doc_repo.get_by_stack_and_hash(stack_id, content_hash)
+    if existing:
+        discard_upload(temp_path)
+        return success_response(
+            data=DocumentUploadResponse(
+                id=existing.id,
+                filename=existing.filename,
+                message="This document is already in the stack."
+            ).model_dump(),
+            message="Document already uploaded"
+        )
     
-    # Create document record
-    doc_repo = DocumentRepository(db)
-    doc = doc_repo.create({
-        "stack_id": stack_id,
-        "filename": file.filename,
-        "file_path": file_path,
-        "content_hash": content_hash,
-        "is_processed": False
-    })
+    # Files are stored by content hash, so identical uploads share one copy
+    extension = os.path.splitext(file.filename)[1]
+    try:
+        doc = await doc_repo.create({
+            "stack_id": stack_id,
+            "filename": file.filename,
+            "file_path": content_path(content_hash, extension),
+            "content_hash": content_hash,
+            "is_processed": False
+        })
+    except BaseException:
+        discard_upload(temp_path)
+        raise
+    # Stored only once the record exists, so deleting another document with
+    # the same content cannot remove the file from under this one
+    commit_upload(temp_path, content_hash, extension)
     
     return success_response(
         data=DocumentUploadResponse(
@@ -101,11 +109,16 @@ async def process_document(
     document_id: UUID,
     embedding_model: str = "openai",
     api_key: str = None,
-    db: Session = Depends(get_db)
+    reprocess: bool = False,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Process a document: extract text and generate embeddings"""
-    doc_repo = DocumentRepository(db)
-    doc = doc_repo.get_by_id(document_id)
+    """Queue a document for processing: extract text and generate embeddings.
+
+    With reprocess, an already processed document is chunked again and only
+    chunks whose content changed are re-embedded.
+    """
+    doc_repo = AsyncDocumentRepository(db)
+    doc = await doc_repo.get_by_id(document_id)
     
     if not doc:
         return error_response(
@@ -113,55 +126,44 @@ async def process_document(
             message=f"Document with ID {document_id} not found"
         )
     
-    if doc.is_processed:
+    if doc.is_processed and not reprocess:
         return success_response(
             data=DocumentResponse.model_validate(doc).model_dump(),
             message="Document already processed"
         )
     
-    try:
-        # Extract text from PDF
-        text = extract_text_from_pdf(doc.file_path)
-        
-        # Chunk text
-        chunks = chunk_text(text)
-        
-        if not chunks:
-            return error_response(
-                code="EXTRACTION_FAILED",
-                message="No text could be extracted from the document"
-            )
-        
-        # Generate embeddings
-        embedding_service = EmbeddingService(provider=embedding_model, api_key=api_key)
-        embeddings = embedding_service.generate_embeddings(chunks)
-        
-        # Store in vector database
-        vector_store = VectorStoreService(collection_name=f"stack_{doc.stack_id}")
-        chunk_ids = [f"{doc.id}_{i}" for i in range(len(chunks))]
-        metadatas = [{"document_id": str(doc.id), "filename": doc.filename, "chunk_index": i} for i in range(len(chunks))]
-        
-        vector_store.add_documents(
-            documents=chunks,
-            embeddings=embeddings,
-            ids=chunk_ids,
-            metadatas=metadatas
-        )
-        
-        # Mark as processed
-        doc_repo.mark_as_processed(document_id)
-        doc = doc_repo.get_by_id(document_id)
-        
+    job_repo = AsyncIngestionJobRepository(db)
+    job = await job_repo.get_active_for_document(document_id)
+    if job:
         return success_response(
-            data=DocumentResponse.model_validate(doc).model_dump(),
-            message=f"Document processed successfully. {len(chunks)} chunks created."
+            data=IngestionJobResponse.model_validate(job).model_dump(),
+            message="Document is already being processed"
         )
-        
-    except Exception as e:
+    
+    # Processing runs in the background; poll the job for progress
+    job = await job_repo.enqueue(document_id, embedding_model, seal_api_key(api_key))
+    get_ingestion_worker().notify()
+    
+    return success_response(
+        data=IngestionJobResponse.model_validate(job).model_dump(),
+        message="Document queued for processing"
+    )
+
+
+@router.get("/jobs/{job_id}")
+def get_ingestion_job(job_id: UUID, db: Session = Depends(get_db)):
+    """Get the status and progress of a document processing job"""
+    job_repo = IngestionJobRepository(db)
+    job = job_repo.get_by_id(job_id)
+    if not job:
         return error_response(
-            code="PROCESSING_ERROR",
-            message=f"Error processing document: {str(e)}"
+            code="JOB_NOT_FOUND",
+            message=f"Job with ID {job_id} not found"
         )
+    return success_response(
+        data=IngestionJobResponse.model_validate(job).model_dump(),
+        message="Job retrieved successfully"
+    )
 
 
 @router.get("/stack/{stack_id}")
@@ -189,16 +191,19 @@ def delete_document(document_id: UUID, db: Session = Depends(get_db)):
     
     # Delete from vector store
     try:
-        vector_store = VectorStoreService(collection_name=f"stack_{doc.stack_id}")
-        vector_store.delete_by_metadata({"document_id": str(document_id)})
-    except Exception:
-        pass
-    
-    # Delete file
-    if os.path.exists(doc.file_path):
-        os.remove(doc.file_path)
+        # A failed run may have stored chunks under a model the document
+        # doesn't record
+        for vector_store in VectorStoreService.all_for_stack(doc.stack_id):
+            vector_store.delete_by_metadata({"document_id": str(document_id)})
+        get_lexical_index(doc.stack_id).delete_document(document_id)
+    except Exception as e:
+        print(f"Failed to remove document {document_id} from the search indexes: {e}")
     
-    # Delete record
+    # Delete record, then the file once no other document references it;
+    # cached retrievals and answers are dropped everywhere once this commits
+    file_path = doc.file_path
+    stack_changed(db, doc.stack_id)
     doc_repo.delete(document_id)
+    remove_content(file_path, lambda: doc_repo.count_by_file_path(file_path))
     
     return success_response(message="Document deleted successfully")
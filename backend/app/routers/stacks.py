@@ -1,29 +1,63 @@
-from typing import List
+from typing import Optional
 from uuid import UUID
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
+from ..config import settings
 from ..database import get_db
-from ..repositories import StackRepository
+from ..repositories import StackRepository, DocumentRepository, decode_cursor, encode_cursor
 from ..schemas import (
     StackCreate, 
     StackUpdate, 
     StackResponse, 
     WorkflowData,
     success_response, 
+    paginated_response,
     error_response
 )
-from ..services import WorkflowEngine
+from ..services import (
+    WorkflowEngine,
+    VectorStoreService,
+    drop_lexical_index,
+    get_chat_log,
+    get_conversation_memory
+)
+from ..services.document_storage import remove_content
 
 router = APIRouter(prefix="/stacks", tags=["stacks"])
 
 
 @router.get("")
-def get_stacks(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """Get all stacks"""
+def get_stacks(
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    skip: int = 0,
+    db: Session = Depends(get_db)
+):
+    """Get stacks, most recently updated first, one page at a time.
+
+    Pass the returned next_cursor to get the following page. `skip` is the
+    old offset pagination, kept for existing clients.
+    """
+    limit = min(max(limit, 1), settings.MAX_PAGE_SIZE)
     repo = StackRepository(db)
-    stacks = repo.get_all_ordered(skip=skip, limit=limit)
-    return success_response(
-        data=[StackResponse.model_validate(s).model_dump() for s in stacks],
+    if skip and cursor is None:
+        stacks = repo.get_all_ordered(skip=skip, limit=limit)
+        return success_response(
+            data=[StackResponse.model_validate(s).model_dump() for s in stacks],
+            message="Stacks retrieved successfully"
+        )
+    
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        return error_response(code="INVALID_CURSOR", message=str(e))
+    
+    # One extra row tells whether another page follows
+    stacks = repo.get_page(limit + 1, after)
+    next_cursor = encode_cursor(stacks[limit - 1].updated_at, stacks[limit - 1].id) if len(stacks) > limit else None
+    return paginated_response(
+        data=[StackResponse.model_validate(s).model_dump() for s in stacks[:limit]],
+        next_cursor=next_cursor,
         message="Stacks retrieved successfully"
     )
 
@@ -80,11 +114,21 @@ def update_stack(stack_id: UUID, stack: StackUpdate, db: Session = Depends(get_d
 def delete_stack(stack_id: UUID, db: Session = Depends(get_db)):
     """Delete a stack"""
     repo = StackRepository(db)
+    doc_repo = DocumentRepository(db)
+    file_paths = {doc.file_path for doc in doc_repo.get_by_stack_id(stack_id)}
     if not repo.delete(stack_id):
         return error_response(
             code="STACK_NOT_FOUND",
             message=f"Stack with ID {stack_id} not found"
         )
+    for vector_store in VectorStoreService.all_for_stack(stack_id):
+        vector_store.clear_collection()
+    get_chat_log().discard_stack(stack_id)
+    get_conversation_memory().forget(stack_id)
+    drop_lexical_index(stack_id)
+    # Documents are deleted with the stack; drop files nothing else references
+    for file_path in file_paths:
+        remove_content(file_path, lambda: doc_repo.count_by_file_path(file_path))
     return success_response(message="Stack deleted successfully")
 
 
@@ -116,16 +160,16 @@ def build_stack(stack_id: UUID, db: Session = Depends(get_db)):
         )
     
     workflow_engine = WorkflowEngine(db)
-    validation = workflow_engine.validate_workflow(stack.workflow_data or {})
+    plan = workflow_engine.compile_workflow(stack.workflow_data or {}, stack_id=stack_id)
     
-    if not validation["valid"]:
+    if not plan.valid:
         return error_response(
             code="INVALID_WORKFLOW",
             message="Workflow validation failed",
-            details={"errors": validation["errors"], "warnings": validation["warnings"]}
+            details={"errors": plan.errors, "warnings": plan.warnings}
         )
     
     return success_response(
-        data={"valid": True, "warnings": validation["warnings"]},
+        data={"valid": True, "warnings": plan.warnings, "workflow_hash": plan.workflow_hash},
         message="Stack built successfully"
     )
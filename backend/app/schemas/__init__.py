@@ -1,12 +1,13 @@
-from .base import BaseResponse, ErrorDetail, success_response, error_response
+from .base import BaseResponse, ErrorDetail, success_response, paginated_response, error_response
 from .stack import StackCreate, StackUpdate, StackResponse, WorkflowData
-from .document import DocumentResponse, DocumentUploadResponse
+from .document import DocumentResponse, DocumentUploadResponse, IngestionJobResponse
 from .chat import ChatMessageCreate, ChatMessageResponse, ChatRequest, ChatResponse
 
 __all__ = [
     "BaseResponse",
     "ErrorDetail",
     "success_response",
+    "paginated_response",
     "error_response",
     "StackCreate",
     "StackUpdate",
@@ -14,6 +15,7 @@ __all__ = [
     "WorkflowData",
     "DocumentResponse",
     "DocumentUploadResponse",
+    "IngestionJobResponse",
     "ChatMessageCreate",
     "ChatMessageResponse",
     "ChatRequest",
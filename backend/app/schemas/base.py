@@ -16,6 +16,7 @@ class BaseResponse(BaseModel, Generic[T]):
     data: Optional[T] = None
     message: Optional[str] = None
     error: Optional[ErrorDetail] = None
+    next_cursor: Optional[str] = None
 
 
 def success_response(data: Any = None, message: str = "Operation successful") -> dict:
@@ -28,6 +29,13 @@ def success_response(data: Any = None, message: str = "Operation successful") ->
     }
 
 
+def paginated_response(data: list, next_cursor: Optional[str], message: str = "Operation successful") -> dict:
+    """Success response for one page of a list; next_cursor is None on the last page"""
+    response = success_response(data, message)
+    response["next_cursor"] = next_cursor
+    return response
+
+
 def error_response(code: str, message: str, details: dict = None) -> dict:
     """Create a standardized error response"""
     return {
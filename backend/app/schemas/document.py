@@ -1,3 +1,4 @@
+from typing import Optional
 from datetime import datetime
 from uuid import UUID
 from pydantic import BaseModel
@@ -8,6 +9,8 @@ class DocumentResponse(BaseModel):
     stack_id: UUID
     filename: str
     is_processed: bool
+    processing_status: Optional[str] = None
+    progress: Optional[float] = None
     created_at: datetime
 
     class Config:
@@ -18,3 +21,20 @@ class DocumentUploadResponse(BaseModel):
     id: UUID
     filename: str
     message: str
+
+
+class IngestionJobResponse(BaseModel):
+    id: UUID
+    document_id: UUID
+    embedding_model: str
+    status: str
+    progress: float
+    message: Optional[str]
+    error: Optional[str]
+    attempts: int
+    created_at: datetime
+    updated_at: datetime
+    finished_at: Optional[datetime]
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,79 @@
+"""Compare time to first token of streamed and complete LLM responses under
+concurrent load.
+
+    python -m app.scripts.measure_ttft --provider openai --concurrency 20
+
+Runs the same prompt as N concurrent streams, then as N concurrent complete
+responses, using the provider keys from the environment. A streamed answer's
+first token is what the chat UI can show first; a complete response shows
+nothing until its last token.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import List, Optional, Tuple
+from ..services.client_registry import close_client_registry
+from ..services.llm_service import LLMService
+
+DEFAULT_PROMPT = "Explain in about 200 words how a hash map handles collisions."
+
+
+async def _streamed(llm_service: LLMService, prompt: str) -> Tuple[float, float]:
+    """Seconds to the first delta and to the end of the stream"""
+    started = time.perf_counter()
+    first: Optional[float] = None
+    async for _ in llm_service.astream_response(prompt, temperature=0.0):
+        if first is None:
+            first = time.perf_counter() - started
+    total = time.perf_counter() - started
+    return (first if first is not None else total), total
+
+
+async def _complete(llm_service: LLMService, prompt: str) -> Tuple[float, float]:
+    """The whole answer arrives at once, so its first token is its last"""
+    started = time.perf_counter()
+    await llm_service.agenerate_response(prompt, temperature=0.0)
+    total = time.perf_counter() - started
+    return total, total
+
+
+def _percentile(values: List[float], share: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))]
+
+
+def _report(label: str, timings: List[Tuple[float, float]]) -> None:
+    ttfts = [ttft for ttft, _ in timings]
+    totals = [total for _, total in timings]
+    print(
+        f"{label:>9}: TTFT p50 {statistics.median(ttfts):.3f}s p95 {_percentile(ttfts, 0.95):.3f}s | "
+        f"total p50 {statistics.median(totals):.3f}s p95 {_percentile(totals, 0.95):.3f}s"
+    )
+
+
+async def run(provider: str, model: Optional[str], concurrency: int, prompt: str) -> None:
+    llm_service = LLMService(provider=provider, model=model)
+    try:
+        streamed = await asyncio.gather(*(_streamed(llm_service, prompt) for _ in range(concurrency)))
+        complete = await asyncio.gather(*(_complete(llm_service, prompt) for _ in range(concurrency)))
+    finally:
+        await close_client_registry()
+    print(f"{provider} {llm_service.model}, {concurrency} concurrent requests")
+    _report("streamed", streamed)
+    _report("complete", complete)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure time to first token with concurrent streams")
+    parser.add_argument("--provider", default="openai", choices=["openai", "gemini"])
+    parser.add_argument("--model", default=None, help="Defaults to the provider's default model")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--prompt", default=DEFAULT_PROMPT)
+    args = parser.parse_args()
+
+    asyncio.run(run(args.provider, args.model, args.concurrency, args.prompt))
+
+
+if __name__ == "__main__":
+    main()
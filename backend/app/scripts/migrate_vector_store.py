@@ -0,0 +1,26 @@
+"""Move stored vectors between the per-stack and shared collection modes.
+
+    python -m app.scripts.migrate_vector_store --to shared
+
+Run it with the API stopped, then set VECTOR_STORE_MODE to the target mode.
+Embeddings are copied as stored, so nothing is re-embedded.
+"""
+import argparse
+from ..services.vector_store_service import PER_STACK_MODE, SHARED_MODE, migrate_vector_store
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Migrate vectors between storage modes")
+    parser.add_argument("--to", dest="target_mode", required=True, choices=[PER_STACK_MODE, SHARED_MODE])
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--keep-source", action="store_true", help="Leave the source collections in place")
+    args = parser.parse_args()
+
+    moved = migrate_vector_store(args.target_mode, batch_size=args.batch_size, keep_source=args.keep_source)
+    for stack_id, count in moved.items():
+        print(f"Stack {stack_id}: {count} chunks")
+    print(f"Migrated {len(moved)} stacks, {sum(moved.values())} chunks. Set VECTOR_STORE_MODE={args.target_mode}.")
+
+
+if __name__ == "__main__":
+    main()
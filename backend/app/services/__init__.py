@@ -1,13 +1,71 @@
+from .chat_log import ChatLog, get_chat_log, close_chat_log
+from .client_registry import ClientRegistry, get_client_registry, close_client_registry
+from .conversation_memory import ConversationMemory, get_conversation_memory, close_conversation_memory
+from .embedding_cache import EmbeddingCache, get_embedding_cache, close_embedding_cache
 from .embedding_service import EmbeddingService
+from .ingestion_worker import IngestionWorker, get_ingestion_worker, stop_ingestion_worker
+from .job_credentials import seal_api_key, open_api_key
+from .lexical_index import LexicalIndex, get_lexical_index, drop_lexical_index, close_lexical_indexes
 from .llm_service import LLMService
-from .vector_store_service import VectorStoreService
+from .prompt_metrics import PromptMetrics, get_prompt_metrics
+from .query_batcher import QueryBatcher, get_query_batcher
+from .response_cache import ResponseCache, get_response_cache, invalidate_stack_responses
+from .retrieval_cache import RetrievalCache, get_retrieval_cache, invalidate_stack_retrievals
+from .stack_cache import StackCache, CachedStack, get_stack_cache, get_cached_stack, stop_stack_cache
+from .vector_backends import VectorBackend, ChromaBackend, NumpyVectorIndex, close_vector_indexes
+from .vector_store_service import VectorStoreService, migrate_vector_store
 from .web_search_service import WebSearchService
+from .workflow_compiler import CompiledWorkflow, compile_workflow, workflow_plan_cache
 from .workflow_engine import WorkflowEngine
 
 __all__ = [
+    "ChatLog",
+    "get_chat_log",
+    "close_chat_log",
+    "ClientRegistry",
+    "get_client_registry",
+    "close_client_registry",
+    "ConversationMemory",
+    "get_conversation_memory",
+    "close_conversation_memory",
+    "EmbeddingCache",
+    "get_embedding_cache",
+    "close_embedding_cache",
     "EmbeddingService",
+    "IngestionWorker",
+    "get_ingestion_worker",
+    "stop_ingestion_worker",
+    "seal_api_key",
+    "open_api_key",
+    "LexicalIndex",
+    "get_lexical_index",
+    "drop_lexical_index",
+    "close_lexical_indexes",
     "LLMService",
+    "PromptMetrics",
+    "get_prompt_metrics",
+    "QueryBatcher",
+    "get_query_batcher",
+    "ResponseCache",
+    "get_response_cache",
+    "invalidate_stack_responses",
+    "RetrievalCache",
+    "get_retrieval_cache",
+    "invalidate_stack_retrievals",
+    "StackCache",
+    "CachedStack",
+    "get_stack_cache",
+    "get_cached_stack",
+    "stop_stack_cache",
+    "VectorBackend",
+    "ChromaBackend",
+    "NumpyVectorIndex",
+    "close_vector_indexes",
     "VectorStoreService",
+    "migrate_vector_store",
     "WebSearchService",
+    "CompiledWorkflow",
+    "compile_workflow",
+    "workflow_plan_cache",
     "WorkflowEngine",
 ]
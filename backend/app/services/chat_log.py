@@ -0,0 +1,210 @@
+import asyncio
+import threading
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+from uuid import UUID
+from sqlalchemy import insert
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError, TimeoutError as PoolTimeoutError
+from ..config import settings
+from ..database import AsyncSessionLocal
+from ..models.chat import ChatMessage
+
+# Longest wait between flush retries while the database is unavailable
+MAX_RETRY_DELAY = 30.0
+
+
+def _is_transient(error: Exception) -> bool:
+    """Whether an insert failed because of the connection or server rather
+    than the rows themselves"""
+    if isinstance(error, DBAPIError):
+        return error.connection_invalidated or isinstance(error, (OperationalError, InterfaceError))
+    return isinstance(error, (OSError, asyncio.TimeoutError, PoolTimeoutError))
+
+
+class ChatLog:
+    """Write-behind buffer for chat messages.
+
+    Messages get their id and timestamp when appended and are inserted in
+    batches with one multi-row INSERT, either after a short interval or as
+    soon as a batch fills up. Until a message is committed, pending() still
+    returns it, so history reads in this process see their own writes. The
+    app flushes the buffer on shutdown; messages buffered in a process that
+    dies without shutting down are lost.
+
+    While the database is unreachable, flushes are retried with exponential
+    backoff and at most `max_pending` messages are kept, oldest dropped
+    first. A batch rejected for its contents is split until the offending
+    messages are isolated; those are logged and dropped.
+    """
+
+    def __init__(
+        self,
+        flush_interval: float = settings.CHAT_LOG_FLUSH_INTERVAL,
+        batch_size: int = settings.CHAT_LOG_BATCH_SIZE,
+        max_pending: int = settings.CHAT_LOG_MAX_PENDING
+    ):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        # Stack deletion runs in the threadpool, so buffer access is locked
+        self._lock = threading.Lock()
+        self._pending: List[Dict[str, Any]] = []
+        self._inflight: List[Dict[str, Any]] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+        # Non-zero while flushes are failing
+        self._retry_delay = 0.0
+        self.flushes = 0
+        self.flushed = 0
+        self.failed_flushes = 0
+        self.dropped = 0
+
+    def append(self, stack_id: UUID, role: str, content: str) -> ChatMessage:
+        """Buffer a message; returns it as an unsaved ChatMessage"""
+        row = {
+            "id": uuid.uuid4(),
+            "stack_id": stack_id,
+            "role": role,
+            "content": content,
+            "created_at": datetime.utcnow()
+        }
+        with self._lock:
+            self._pending.append(row)
+            overflow = len(self._pending) - self.max_pending
+            if overflow > 0:
+                del self._pending[:overflow]
+                self.dropped += overflow
+            full = len(self._pending) >= self.batch_size
+        loop = self._bind_loop()
+        if full and not self._retry_delay:
+            self._schedule_flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.flush_interval, self._schedule_flush)
+        return ChatMessage(**row)
+
+    def pending(self, stack_id: UUID) -> List[ChatMessage]:
+        """Messages for a stack that are not committed yet, oldest first"""
+        with self._lock:
+            rows = [row for row in self._inflight + self._pending if row["stack_id"] == stack_id]
+        return [ChatMessage(**row) for row in rows]
+
+    def discard_stack(self, stack_id: UUID) -> None:
+        """Drop buffered messages of a deleted stack"""
+        with self._lock:
+            self._pending = [row for row in self._pending if row["stack_id"] != stack_id]
+
+    async def flush(self) -> int:
+        """Insert everything buffered so far; returns the number of messages written"""
+        self._bind_loop()
+        async with self._flush_lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            with self._lock:
+                batch, self._pending = self._pending, []
+                self._inflight = batch
+            if not batch:
+                return 0
+            try:
+                written = await self._write(batch)
+            except Exception as e:
+                # Whatever was written before the failure is retried too;
+                # rows carry their ids, so a retry cannot save them twice
+                # without failing on the primary key and being isolated
+                self.failed_flushes += 1
+                self._retry_delay = min(max(self._retry_delay * 2, self.flush_interval), MAX_RETRY_DELAY)
+                with self._lock:
+                    self._pending[:0] = batch
+                    overflow = len(self._pending) - self.max_pending
+                    if overflow > 0:
+                        del self._pending[:overflow]
+                        self.dropped += overflow
+                    buffered = len(self._pending)
+                print(
+                    f"Chat log flush failed, retrying in {self._retry_delay:.1f}s with "
+                    f"{buffered} messages buffered ({self.dropped} dropped so far): {e}"
+                )
+                if self._timer is not None:
+                    # append() scheduled a flush while this one was writing
+                    self._timer.cancel()
+                self._timer = self._loop.call_later(self._retry_delay, self._schedule_flush)
+                return 0
+            finally:
+                with self._lock:
+                    self._inflight = []
+            self._retry_delay = 0.0
+            self.flushes += 1
+            self.flushed += written
+            return written
+
+    async def _write(self, rows: List[Dict[str, Any]]) -> int:
+        """Insert rows, splitting the batch to isolate rows the database
+        rejects; returns how many were written. Transient errors propagate."""
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(insert(ChatMessage), rows)
+                await db.commit()
+            return len(rows)
+        except Exception as e:
+            if _is_transient(e):
+                raise
+            if len(rows) == 1:
+                # e.g. the stack was deleted while the message waited
+                self.dropped += 1
+                print(f"Dropping chat message {rows[0]['id']} that cannot be saved: {e}")
+                return 0
+        middle = len(rows) // 2
+        return await self._write(rows[:middle]) + await self._write(rows[middle:])
+
+    def _bind_loop(self) -> asyncio.AbstractEventLoop:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Timers and locks belong to the loop that created them
+            self._loop = loop
+            self._flush_lock = asyncio.Lock()
+            self._timer = None
+        return loop
+
+    def _schedule_flush(self) -> None:
+        self._timer = None
+        task = asyncio.ensure_future(self.flush())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def close(self) -> None:
+        if self._loop is None:
+            return
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self._pending),
+            "flushes": self.flushes,
+            "flushed": self.flushed,
+            "failed_flushes": self.failed_flushes,
+            "dropped": self.dropped,
+            "avg_batch_size": self.flushed / self.flushes if self.flushes else 0.0
+        }
+
+
+_chat_log: Optional[ChatLog] = None
+_chat_log_lock = threading.Lock()
+
+
+def get_chat_log() -> ChatLog:
+    global _chat_log
+    if _chat_log is None:
+        with _chat_log_lock:
+            if _chat_log is None:
+                _chat_log = ChatLog()
+    return _chat_log
+
+
+async def close_chat_log() -> None:
+    """Flush buffered messages; called on app shutdown"""
+    if _chat_log is not None:
+        await _chat_log.close()
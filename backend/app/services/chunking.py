@@ -0,0 +1,352 @@
+import hashlib
+import re
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple, Type
+from ..config import settings
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+
+# Without tiktoken, token counts are approximated at four UTF-8 bytes per token
+APPROX_BYTES_PER_TOKEN = 4
+_PARAGRAPH_BREAK = re.compile(r"\n[ \t]*\n\s*")
+# Sentence ends (after whitespace has been collapsed): terminal punctuation,
+# a space, and something that isn't a lowercase letter, so "e.g. the" stays
+# together. The leading literal space keeps the regex scan fast.
+_SENTENCE_BREAK = re.compile(r" (?<=[.!?] )(?=[^a-z ])")
+# CJK terminal punctuation needs no trailing space
+_CJK_SENTENCE_BREAK = re.compile(r"(?<=[。！？]) ?(?=[^ ])")
+_CJK_TERMINAL_PUNCTUATION = ("。", "！", "？")
+_TERMINAL_PUNCTUATION = tuple(".!?。！？\"')]”’")
+
+
+class Tokenizer:
+    """Counts and splits text in the embedding model's tokens.
+
+    Uses tiktoken when it is installed and its encoding can be loaded,
+    otherwise falls back to a byte-length approximation.
+    """
+
+    def __init__(self, encoding_name: str = settings.CHUNK_TOKENIZER_ENCODING):
+        self.encoding_name = encoding_name
+        self._encoding = None
+        if tiktoken is not None:
+            try:
+                self._encoding = tiktoken.get_encoding(encoding_name)
+            except Exception as e:
+                print(f"Tokenizer {encoding_name} unavailable, approximating token counts: {e}")
+
+    @property
+    def exact(self) -> bool:
+        return self._encoding is not None
+
+    def count(self, text: str) -> int:
+        if self._encoding is not None:
+            return len(self._encoding.encode_ordinary(text))
+        return _approximate_count(text)
+
+    def count_many(self, texts: List[str]) -> List[int]:
+        if self._encoding is not None:
+            return [len(tokens) for tokens in self._encoding.encode_ordinary_batch(texts)]
+        return [_approximate_count(text) for text in texts]
+
+    def split(self, text: str, max_tokens: int) -> List[str]:
+        """Hard-split text into pieces of at most max_tokens tokens"""
+        if self._encoding is not None:
+            tokens = self._encoding.encode_ordinary(text)
+            return [
+                self._encoding.decode(tokens[start:start + max_tokens])
+                for start in range(0, len(tokens), max_tokens)
+            ]
+        data = text.encode("utf-8")
+        size = max_tokens * APPROX_BYTES_PER_TOKEN
+        pieces = []
+        start = 0
+        while start < len(data):
+            stop = min(start + size, len(data))
+            # Don't cut a multi-byte character in half
+            while stop < len(data) and data[stop] & 0xC0 == 0x80:
+                stop -= 1
+            pieces.append(data[start:stop].decode("utf-8"))
+            start = stop
+        return pieces
+
+
+def _approximate_count(text: str) -> int:
+    return -(-len(text.encode("utf-8")) // APPROX_BYTES_PER_TOKEN)
+
+
+@dataclass(frozen=True)
+class Chunk:
+    """A chunk of document text with its position and content fingerprint"""
+    text: str
+    index: int
+    page_start: int
+    page_end: int
+    token_count: int
+    fingerprint: str
+
+    def metadata(self) -> Dict[str, Any]:
+        return {
+            "chunk_index": self.index,
+            "page_start": self.page_start,
+            "page_end": self.page_end,
+            "token_count": self.token_count,
+            "fingerprint": self.fingerprint,
+        }
+
+
+def fingerprint(text: str) -> str:
+    """Stable content fingerprint; unchanged chunks keep the same fingerprint across runs"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+
+class BaseChunker(ABC):
+    """Incremental chunker fed one page at a time.
+
+    feed() returns the chunks completed so far and flush() returns the rest,
+    so only a window of the document is held in memory.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = settings.CHUNK_MAX_TOKENS,
+        overlap_tokens: int = settings.CHUNK_OVERLAP_TOKENS,
+        tokenizer: Optional[Tokenizer] = None
+    ):
+        if overlap_tokens >= max_tokens:
+            raise ValueError("overlap_tokens must be smaller than max_tokens")
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.tokenizer = tokenizer or get_tokenizer()
+        self._next_index = 0
+
+    @abstractmethod
+    def feed(self, page_number: int, text: str) -> List[Chunk]:
+        ...
+
+    @abstractmethod
+    def flush(self) -> List[Chunk]:
+        ...
+
+    def _make_chunk(self, text: str, page_start: int, page_end: int, token_count: int) -> Chunk:
+        chunk = Chunk(
+            text=text,
+            index=self._next_index,
+            page_start=page_start,
+            page_end=page_end,
+            token_count=token_count,
+            fingerprint=fingerprint(text)
+        )
+        self._next_index += 1
+        return chunk
+
+
+@dataclass
+class _Sentence:
+    text: str
+    tokens: int
+    page: int
+    starts_paragraph: bool
+
+
+class SentenceChunker(BaseChunker):
+    """Packs whole sentences into chunks of at most max_tokens tokens.
+
+    Chunks end early at a paragraph break once they are at least half full,
+    and start with up to overlap_tokens worth of the previous chunk's
+    trailing sentences. Sentences longer than max_tokens are hard-split.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.min_tokens = self.max_tokens // 2
+        # Longest unterminated page tail carried over to join the next page
+        self.max_carry_chars = self.max_tokens * 8
+        self._sentences: List[_Sentence] = []
+        self._tokens = 0
+        self._fresh = 0  # sentences added since the last emitted chunk
+        self._carry: Optional[Tuple[str, int]] = None
+
+    def feed(self, page_number: int, text: str) -> List[Chunk]:
+        chunks: List[Chunk] = []
+        carry_page = None
+        if self._carry is not None:
+            carry_text, carry_page = self._carry
+            text = f"{carry_text} {text}"
+            self._carry = None
+
+        segments = self._segment(text)
+        # The page's last sentence may continue on the next page
+        if segments and not segments[-1][0].endswith(_TERMINAL_PUNCTUATION) \
+                and len(segments[-1][0]) <= self.max_carry_chars:
+            tail, _ = segments.pop()
+            self._carry = (tail, carry_page if carry_page is not None and not segments else page_number)
+
+        counts = self.tokenizer.count_many([sentence for sentence, _ in segments])
+        for i, ((sentence, starts_paragraph), tokens) in enumerate(zip(segments, counts)):
+            page = carry_page if i == 0 and carry_page is not None else page_number
+            self._add(_Sentence(sentence, tokens, page, starts_paragraph), chunks)
+        return chunks
+
+    def flush(self) -> List[Chunk]:
+        chunks: List[Chunk] = []
+        if self._carry is not None:
+            tail, page = self._carry
+            self._carry = None
+            self._add(_Sentence(tail, self.tokenizer.count(tail), page, False), chunks)
+        if self._fresh:
+            chunks.append(self._emit())
+        self._sentences = []
+        self._tokens = 0
+        return chunks
+
+    @staticmethod
+    def _segment(text: str) -> List[Tuple[str, bool]]:
+        segments = []
+        for paragraph in _PARAGRAPH_BREAK.split(text):
+            # Collapse the hard line wraps PDF extraction leaves inside paragraphs
+            paragraph = " ".join(paragraph.split())
+            if not paragraph:
+                continue
+            sentences = _SENTENCE_BREAK.split(paragraph)
+            if any(mark in paragraph for mark in _CJK_TERMINAL_PUNCTUATION):
+                sentences = [part for sentence in sentences for part in _CJK_SENTENCE_BREAK.split(sentence)]
+            for i, sentence in enumerate(sentences):
+                if sentence:
+                    segments.append((sentence, i == 0))
+        return segments
+
+    def _add(self, sentence: _Sentence, chunks: List[Chunk]) -> None:
+        if sentence.tokens > self.max_tokens:
+            pieces = self.tokenizer.split(sentence.text, self.max_tokens)
+            for i, piece in enumerate(pieces):
+                self._add(
+                    _Sentence(piece, self.tokenizer.count(piece), sentence.page, sentence.starts_paragraph and i == 0),
+                    chunks
+                )
+            return
+
+        at_paragraph_break = sentence.starts_paragraph and self._tokens >= self.min_tokens
+        if self._fresh and (self._tokens + sentence.tokens > self.max_tokens or at_paragraph_break):
+            chunks.append(self._emit())
+        # Drop overlap sentences that would leave no room for the new one
+        while self._sentences and self._tokens + sentence.tokens > self.max_tokens:
+            self._tokens -= self._sentences.pop(0).tokens
+
+        self._sentences.append(sentence)
+        self._tokens += sentence.tokens
+        self._fresh += 1
+
+    def _emit(self) -> Chunk:
+        parts = []
+        for i, sentence in enumerate(self._sentences):
+            if i:
+                parts.append("\n\n" if sentence.starts_paragraph else " ")
+            parts.append(sentence.text)
+        chunk = self._make_chunk(
+            "".join(parts),
+            self._sentences[0].page,
+            max(sentence.page for sentence in self._sentences),
+            self._tokens
+        )
+
+        overlap: List[_Sentence] = []
+        overlap_tokens = 0
+        for sentence in reversed(self._sentences[1:]):
+            if overlap_tokens + sentence.tokens > self.overlap_tokens:
+                break
+            overlap.insert(0, sentence)
+            overlap_tokens += sentence.tokens
+        self._sentences = overlap
+        self._tokens = overlap_tokens
+        self._fresh = 0
+        return chunk
+
+
+class FixedSizeChunker(BaseChunker):
+    """Fixed character windows, sized to roughly max_tokens tokens.
+
+    The original chunking scheme; kept for collections built with it.
+    """
+
+    CHARS_PER_TOKEN = 4
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.chunk_size = self.max_tokens * self.CHARS_PER_TOKEN
+        self.step = self.chunk_size - self.overlap_tokens * self.CHARS_PER_TOKEN
+        self._buffer = ""
+        self._page_offsets: List[Tuple[int, int]] = []  # (buffer offset, page number)
+
+    def feed(self, page_number: int, text: str) -> List[Chunk]:
+        self._page_offsets.append((len(self._buffer), page_number))
+        self._buffer += text
+        chunks: List[Chunk] = []
+        while len(self._buffer) >= self.chunk_size:
+            self._emit(chunks)
+        return chunks
+
+    def flush(self) -> List[Chunk]:
+        chunks: List[Chunk] = []
+        while self._buffer:
+            self._emit(chunks)
+        self._page_offsets = []
+        return chunks
+
+    def _page_at(self, offset: int) -> int:
+        page = self._page_offsets[0][1]
+        for start, page_number in self._page_offsets:
+            if start > offset:
+                break
+            page = page_number
+        return page
+
+    def _emit(self, chunks: List[Chunk]) -> None:
+        text = self._buffer[:self.chunk_size]
+        if text.strip():
+            chunks.append(self._make_chunk(
+                text,
+                self._page_at(0),
+                self._page_at(len(text) - 1),
+                self.tokenizer.count(text)
+            ))
+        self._buffer = self._buffer[self.step:]
+        offsets = [(start - self.step, page) for start, page in self._page_offsets]
+        # Keep the page that the new buffer start falls in
+        while len(offsets) > 1 and offsets[1][0] <= 0:
+            offsets.pop(0)
+        self._page_offsets = offsets
+
+
+CHUNKERS: Dict[str, Type[BaseChunker]] = {
+    "sentence": SentenceChunker,
+    "fixed": FixedSizeChunker,
+}
+
+
+def get_chunker(strategy: str = settings.CHUNKING_STRATEGY, **kwargs) -> BaseChunker:
+    """Create a chunker for one document using a registered strategy"""
+    chunker_cls = CHUNKERS.get(strategy)
+    if chunker_cls is None:
+        raise ValueError(f"Unknown chunking strategy: {strategy}")
+    return chunker_cls(**kwargs)
+
+
+_tokenizer: Optional[Tokenizer] = None
+_tokenizer_lock = threading.Lock()
+
+
+def get_tokenizer() -> Tokenizer:
+    """Get the process-wide tokenizer; loading an encoding is too slow to repeat per document"""
+    global _tokenizer
+    if _tokenizer is None:
+        with _tokenizer_lock:
+            if _tokenizer is None:
+                _tokenizer = Tokenizer()
+    return _tokenizer
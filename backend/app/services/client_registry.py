@@ -0,0 +1,208 @@
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import httpx
+import chromadb
+from chromadb.config import Settings as ChromaSettings
+from openai import OpenAI, AsyncOpenAI
+from google.ai import generativelanguage as glm
+from ..config import settings
+
+
+class ClientRegistry:
+    """Application-scoped pool of long-lived provider clients.
+
+    Per-key clients (OpenAI, Gemini) are kept in a bounded LRU and evicted when
+    idle. All OpenAI clients share one HTTP/2 keep-alive pool per sync/async
+    flavour, and the Chroma client is opened once per process. Each Gemini
+    client owns a gRPC channel, which is closed when the client is evicted.
+    """
+
+    def __init__(
+        self,
+        max_clients: int = settings.CLIENT_POOL_MAX_SIZE,
+        idle_ttl: float = settings.CLIENT_POOL_IDLE_TTL
+    ):
+        self.max_clients = max_clients
+        self.idle_ttl = idle_ttl
+        self._clients: "OrderedDict[Tuple[str, str], Tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._http: Optional[httpx.Client] = None
+        self._async_http: Optional[httpx.AsyncClient] = None
+        self._chroma = None
+        # Loop the async Gemini clients' gRPC channels are bound to
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.evictions = 0
+
+    @staticmethod
+    def _limits() -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=settings.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS
+        )
+
+    @property
+    def http(self) -> httpx.Client:
+        """Shared sync HTTP connection pool"""
+        if self._http is None:
+            with self._lock:
+                if self._http is None:
+                    self._http = httpx.Client(http2=True, limits=self._limits(), timeout=60)
+        return self._http
+
+    @property
+    def async_http(self) -> httpx.AsyncClient:
+        """Shared async HTTP connection pool"""
+        if self._async_http is None:
+            with self._lock:
+                if self._async_http is None:
+                    self._async_http = httpx.AsyncClient(http2=True, limits=self._limits(), timeout=60)
+        return self._async_http
+
+    def chroma(self):
+        """Process-wide Chroma client"""
+        if self._chroma is None:
+            with self._lock:
+                if self._chroma is None:
+                    self._chroma = chromadb.PersistentClient(
+                        path=settings.CHROMA_PERSIST_DIRECTORY,
+                        settings=ChromaSettings(anonymized_telemetry=False)
+                    )
+        return self._chroma
+
+    def openai(self, api_key: Optional[str] = None) -> OpenAI:
+        api_key = api_key or settings.OPENAI_API_KEY
+        return self._get(
+            "openai", api_key,
+            lambda: OpenAI(api_key=api_key, http_client=self.http)
+        )
+
+    def async_openai(self, api_key: Optional[str] = None) -> AsyncOpenAI:
+        api_key = api_key or settings.OPENAI_API_KEY
+        return self._get(
+            "openai_async", api_key,
+            lambda: AsyncOpenAI(api_key=api_key, http_client=self.async_http)
+        )
+
+    def gemini(self, api_key: Optional[str] = None) -> glm.GenerativeServiceClient:
+        api_key = api_key or settings.GOOGLE_API_KEY
+        return self._get(
+            "gemini", api_key,
+            lambda: glm.GenerativeServiceClient(client_options={"api_key": api_key})
+        )
+
+    def gemini_async(self, api_key: Optional[str] = None) -> glm.GenerativeServiceAsyncClient:
+        """Async Gemini client; only call from the app's event loop"""
+        api_key = api_key or settings.GOOGLE_API_KEY
+        self._loop = asyncio.get_running_loop()
+        return self._get(
+            "gemini_async", api_key,
+            lambda: glm.GenerativeServiceAsyncClient(client_options={"api_key": api_key})
+        )
+
+    def _get(self, provider: str, api_key: str, factory: Callable[[], Any]) -> Any:
+        # Keys are hashed so raw credentials never sit in the registry index
+        key = (provider, hashlib.sha256((api_key or "").encode("utf-8")).hexdigest())
+        now = time.monotonic()
+        evicted: List[Tuple[Tuple[str, str], Any]] = []
+        with self._lock:
+            self._evict_idle(now, evicted)
+            entry = self._clients.get(key)
+            if entry is not None:
+                self._clients[key] = (entry[0], now)
+                self._clients.move_to_end(key)
+        if entry is not None:
+            self._close_evicted(evicted)
+            return entry[0]
+
+        client = factory()
+        with self._lock:
+            entry = self._clients.get(key)
+            if entry is not None:
+                # Another caller built it first, keep theirs
+                evicted.append((key, client))
+                client = entry[0]
+            self._clients[key] = (client, now)
+            self._clients.move_to_end(key)
+            while len(self._clients) > self.max_clients:
+                evicted_key, (evicted_client, _) = self._clients.popitem(last=False)
+                evicted.append((evicted_key, evicted_client))
+                self.evictions += 1
+        self._close_evicted(evicted)
+        return client
+
+    def _evict_idle(self, now: float, evicted: List[Tuple[Tuple[str, str], Any]]) -> None:
+        # Entries are in LRU order, so idle ones are always at the front
+        while self._clients:
+            key, (client, last_used) = next(iter(self._clients.items()))
+            if now - last_used < self.idle_ttl:
+                break
+            self._clients.popitem(last=False)
+            evicted.append((key, client))
+            self.evictions += 1
+
+    def _close_evicted(self, evicted: List[Tuple[Tuple[str, str], Any]]) -> None:
+        """Close evicted Gemini clients' channels; OpenAI clients only hold the shared pools"""
+        for (provider, _), client in evicted:
+            try:
+                if provider == "gemini":
+                    client.transport.close()
+                elif provider == "gemini_async" and self._loop is not None and not self._loop.is_closed():
+                    # gRPC aio channels must be closed on the loop that opened them;
+                    # calls already in flight keep running during the grace period
+                    asyncio.run_coroutine_threadsafe(client.transport.grpc_channel.close(grace=30), self._loop)
+            except Exception as e:
+                print(f"Failed to close evicted {provider} client: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "clients": len(self._clients),
+            "max_clients": self.max_clients,
+            "evictions": self.evictions
+        }
+
+    async def aclose(self) -> None:
+        """Close shared connection pools and the Gemini clients' channels"""
+        with self._lock:
+            clients = [(key, client) for key, (client, _) in self._clients.items()]
+            self._clients.clear()
+            http, self._http = self._http, None
+            async_http, self._async_http = self._async_http, None
+            self._chroma = None
+        for (provider, _), client in clients:
+            try:
+                if provider == "gemini":
+                    client.transport.close()
+                elif provider == "gemini_async":
+                    await client.transport.close()
+            except Exception as e:
+                print(f"Failed to close {provider} client: {e}")
+        if http is not None:
+            http.close()
+        if async_http is not None:
+            await async_http.aclose()
+
+
+_registry: Optional[ClientRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_client_registry() -> ClientRegistry:
+    """Get the application client registry, creating it if the app has not started one"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ClientRegistry()
+    return _registry
+
+
+async def close_client_registry() -> None:
+    global _registry
+    with _registry_lock:
+        registry, _registry = _registry, None
+    if registry is not None:
+        await registry.aclose()
@@ -0,0 +1,166 @@
+import math
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+from .chunking import Tokenizer, get_tokenizer
+from .lexical_index import tokenize
+
+# Chunks whose texts share at least this fraction of their terms are
+# treated as duplicates
+DUPLICATE_SIMILARITY = 0.9
+# Shortest shared run of characters treated as chunker overlap rather than
+# a coincidental match
+MIN_OVERLAP_CHARS = 32
+# What remains of a chunk after trimming overlap must be at least this long
+MIN_REMAINDER_CHARS = 16
+# Share of the rerank score taken from the local scorer; the rest comes from
+# the retrieval rank
+RERANK_LEXICAL_WEIGHT = 0.5
+
+
+@dataclass
+class ContextChunk:
+    """A retrieved chunk on its way into the prompt"""
+    id: str
+    text: str
+    score: float
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def document_id(self) -> Optional[str]:
+        return self.metadata.get("document_id")
+
+
+def rerank(query: str, chunks: List[ContextChunk]) -> List[ContextChunk]:
+    """Reorder candidates with a local lexical scorer blended with their retrieval rank.
+
+    The scorer rewards chunks that cover more of the query's distinct terms
+    (weighted by how rare each term is among the candidates) and that contain
+    them close together.
+    """
+    query_terms = set(tokenize(query))
+    if not query_terms or len(chunks) < 2:
+        return chunks
+
+    chunk_terms = [tokenize(chunk.text) for chunk in chunks]
+    document_frequency = Counter(term for terms in chunk_terms for term in set(terms) & query_terms)
+    n = len(chunks)
+    idf = {term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in document_frequency.items()}
+    total_idf = sum(idf.values()) or 1.0
+
+    lexical_scores = []
+    for terms in chunk_terms:
+        positions: Dict[str, List[int]] = {}
+        for position, term in enumerate(terms):
+            if term in idf:
+                positions.setdefault(term, []).append(position)
+        coverage = sum(idf[term] for term in positions) / total_idf
+        lexical_scores.append(coverage * (1 + _proximity(positions)))
+
+    best = max(lexical_scores) or 1.0
+    scored = []
+    for rank, (chunk, lexical) in enumerate(zip(chunks, lexical_scores)):
+        retrieval = 1 - rank / n
+        score = (1 - RERANK_LEXICAL_WEIGHT) * retrieval + RERANK_LEXICAL_WEIGHT * lexical / best
+        scored.append(ContextChunk(chunk.id, chunk.text, score, chunk.metadata))
+    scored.sort(key=lambda chunk: chunk.score, reverse=True)
+    return scored
+
+
+def _proximity(positions: Dict[str, List[int]]) -> float:
+    """1 when all matched terms are adjacent, falling towards 0 as they spread out"""
+    if len(positions) < 2:
+        return 0.0
+    # Smallest window containing one occurrence of every matched term
+    events = sorted((position, term) for term, found in positions.items() for position in found)
+    counts: Counter = Counter()
+    covered = 0
+    best = math.inf
+    left = 0
+    for position, term in events:
+        counts[term] += 1
+        if counts[term] == 1:
+            covered += 1
+        while covered == len(positions):
+            best = min(best, position - events[left][0] + 1)
+            left_term = events[left][1]
+            counts[left_term] -= 1
+            if counts[left_term] == 0:
+                covered -= 1
+            left += 1
+    return len(positions) / best
+
+
+def dedup(chunks: List[ContextChunk], limit: int) -> List[ContextChunk]:
+    """Keep up to `limit` chunks in order, dropping near-duplicates and
+    trimming text a chunk shares with an already kept neighbour"""
+    kept: List[ContextChunk] = []
+    kept_terms: List[set] = []
+    for chunk in chunks:
+        if len(kept) >= limit:
+            break
+        text = chunk.text
+        for other in kept:
+            if chunk.document_id != other.document_id:
+                continue
+            # The chunker repeats the end of one chunk at the start of the next
+            text = text[_overlap(other.text, text):]
+            tail = _overlap(text, other.text)
+            if tail:
+                text = text[:len(text) - tail]
+        text = text.strip()
+        if len(text) < MIN_REMAINDER_CHARS or any(text in other.text for other in kept):
+            continue
+        terms = set(tokenize(text))
+        if any(_similarity(terms, other) >= DUPLICATE_SIMILARITY for other in kept_terms):
+            continue
+        kept.append(ContextChunk(chunk.id, text, chunk.score, chunk.metadata))
+        kept_terms.append(terms)
+    return kept
+
+
+def _overlap(left: str, right: str) -> int:
+    """Length of the longest suffix of `left` that is a prefix of `right`"""
+    probe = right[:MIN_OVERLAP_CHARS]
+    if len(probe) < MIN_OVERLAP_CHARS:
+        return 0
+    position = left.find(probe, max(0, len(left) - len(right)))
+    while position != -1:
+        if right.startswith(left[position:]):
+            return len(left) - position
+        position = left.find(probe, position + 1)
+    return 0
+
+
+def _similarity(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def pack(
+    chunks: List[ContextChunk],
+    budget: int,
+    tokenizer: Optional[Tokenizer] = None
+) -> List[ContextChunk]:
+    """Greedily fit the best chunks into a token budget, keeping their order.
+
+    A chunk that does not fit is skipped in favour of smaller ones further
+    down; if not even the first chunk fits, it is cut to the budget.
+    """
+    tokenizer = tokenizer or get_tokenizer()
+    packed: List[ContextChunk] = []
+    used = 0
+    for chunk, tokens in zip(chunks, tokenizer.count_many([chunk.text for chunk in chunks])):
+        if used + tokens <= budget:
+            packed.append(chunk)
+            used += tokens
+        elif not packed and budget > 0:
+            text = tokenizer.split(chunk.text, budget)[0]
+            packed.append(ContextChunk(chunk.id, text, chunk.score, chunk.metadata))
+            used += tokenizer.count(text)
+    return packed
+
+
+def format_chunks(chunks: List[ContextChunk]) -> Optional[str]:
+    return "\n\n".join(chunk.text for chunk in chunks) if chunks else None
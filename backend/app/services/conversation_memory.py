@@ -0,0 +1,252 @@
+import asyncio
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+from uuid import UUID
+from .chat_log import get_chat_log
+from .chunking import get_tokenizer
+from .llm_service import LLMService
+from ..config import settings
+from ..database import AsyncSessionLocal
+from ..repositories.chat_repository import AsyncChatRepository
+from ..repositories.pagination import Cursor
+
+ROLE_LABELS = {"user": "User", "assistant": "Assistant"}
+# Share of the memory budget the summary may take; recent turns get the rest
+SUMMARY_SHARE = 0.4
+# New messages fetched per sync
+SYNC_PAGE_SIZE = 200
+# Unsummarized messages kept at most while summarizing keeps failing
+MAX_UNSUMMARIZED = 50
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a conversation between a user and an assistant. "
+    "Merge the new messages into the current summary. Keep facts, names, numbers, decisions "
+    "and open questions the user may refer back to; drop greetings and filler. "
+    "Reply with the updated summary only, in at most 150 words."
+)
+
+
+@dataclass
+class _Turn:
+    id: UUID
+    role: str
+    content: str
+    created_at: datetime
+
+    @property
+    def key(self) -> Cursor:
+        return (self.created_at, self.id)
+
+    def format(self) -> str:
+        return f"{ROLE_LABELS.get(self.role, self.role)}: {self.content}"
+
+
+@dataclass
+class _Conversation:
+    summary: str = ""
+    # Committed messages not folded into the summary yet, oldest first
+    turns: List[_Turn] = field(default_factory=list)
+    # Last committed message synced
+    cursor: Optional[Cursor] = None
+    summarizing: bool = False
+
+
+class ConversationMemory:
+    """Per-stack conversation memory for LLM engine nodes.
+
+    Keeps the most recent messages verbatim plus a summary of everything
+    older. Each call fetches only the rows committed since the last one
+    through a keyset query, and overlays the messages still buffered in this
+    process's chat log, which are read again every time. Once more than
+    `window` messages are unsummarized, the oldest committed ones are folded
+    into the summary with one LLM call in the background, so answers never
+    wait on summarization. A stack seen for the first time starts from its
+    latest `window` messages with an empty summary.
+    """
+
+    def __init__(
+        self,
+        window: int = settings.MEMORY_WINDOW_MESSAGES,
+        max_stacks: int = settings.MEMORY_MAX_STACKS
+    ):
+        self.window = window
+        self.max_stacks = max_stacks
+        self._conversations: "OrderedDict[UUID, _Conversation]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._tasks: Set[asyncio.Task] = set()
+        self.syncs = 0
+        self.summaries = 0
+        self.summary_failures = 0
+
+    async def context(
+        self,
+        stack_id: UUID,
+        query: str,
+        budget: int,
+        llm_service: LLMService
+    ) -> Optional[str]:
+        """Earlier conversation to put in the prompt, within `budget` tokens"""
+        conversation = self._conversation(stack_id)
+        pending: List[_Turn] = []
+        try:
+            pending = await self._sync(stack_id, conversation)
+        except Exception as e:
+            print(f"Conversation memory sync failed: {e}")
+        turns = sorted(conversation.turns + pending, key=lambda turn: turn.key)
+        # The chat route logs the message being answered before running the workflow
+        if turns and turns[-1].role == "user" and turns[-1].content == query:
+            turns = turns[:-1]
+        if len(turns) > self.window and not conversation.summarizing:
+            # Buffered messages are folded once they are committed
+            buffered = {turn.id for turn in pending}
+            older = [turn for turn in turns[:len(turns) - self.window] if turn.id not in buffered]
+            if older:
+                self._summarize_later(stack_id, conversation, older, llm_service)
+        return self._render(conversation.summary, turns, budget)
+
+    def forget(self, stack_id: UUID) -> None:
+        """Drop a stack's memory, e.g. after its history was cleared"""
+        with self._lock:
+            self._conversations.pop(stack_id, None)
+
+    def _conversation(self, stack_id: UUID) -> _Conversation:
+        with self._lock:
+            conversation = self._conversations.get(stack_id)
+            if conversation is None:
+                conversation = self._conversations[stack_id] = _Conversation()
+                while len(self._conversations) > self.max_stacks:
+                    self._conversations.popitem(last=False)
+            else:
+                self._conversations.move_to_end(stack_id)
+            return conversation
+
+    async def _sync(self, stack_id: UUID, conversation: _Conversation) -> List[_Turn]:
+        """Append newly committed messages to the conversation; returns the
+        messages still buffered in the chat log.
+
+        Only committed rows move the cursor: a buffered message can commit
+        after another process's message with an earlier timestamp.
+        """
+        # Read the buffer first, so a message committed in between is found
+        # by the query below instead of falling between the two reads
+        buffered = get_chat_log().pending(stack_id)
+        cursor = conversation.cursor
+        async with AsyncSessionLocal() as db:
+            repo = AsyncChatRepository(db)
+            if cursor is None:
+                # Room for the window plus the message being answered
+                rows = await repo.get_recent(stack_id, self.window + 1)
+            else:
+                rows = await repo.get_page(stack_id, SYNC_PAGE_SIZE, after=cursor)
+        self.syncs += 1
+        # A concurrent sync may have moved the cursor while this one waited
+        cursor = conversation.cursor
+        new = [
+            _Turn(row.id, row.role, row.content, row.created_at)
+            for row in rows if cursor is None or (row.created_at, row.id) > cursor
+        ]
+        if new:
+            conversation.turns.extend(new)
+            conversation.cursor = new[-1].key
+            if len(conversation.turns) > MAX_UNSUMMARIZED:
+                del conversation.turns[:len(conversation.turns) - MAX_UNSUMMARIZED]
+        committed = {row.id for row in rows}
+        return [
+            _Turn(message.id, message.role, message.content, message.created_at)
+            for message in buffered if message.id not in committed
+        ]
+
+    def _summarize_later(
+        self,
+        stack_id: UUID,
+        conversation: _Conversation,
+        turns: List[_Turn],
+        llm_service: LLMService
+    ) -> None:
+        conversation.summarizing = True
+        task = asyncio.ensure_future(self._summarize(stack_id, conversation, turns, llm_service))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _summarize(
+        self,
+        stack_id: UUID,
+        conversation: _Conversation,
+        turns: List[_Turn],
+        llm_service: LLMService
+    ) -> None:
+        transcript = "\n".join(turn.format() for turn in turns)
+        try:
+            summary = await llm_service.agenerate_response(
+                query=f"Current summary:\n{conversation.summary or '(none)'}\n\nNew messages:\n{transcript}",
+                system_prompt=SUMMARY_PROMPT,
+                temperature=0.0
+            )
+        except Exception as e:
+            self.summary_failures += 1
+            print(f"Conversation summary failed: {e}")
+            return
+        finally:
+            conversation.summarizing = False
+        self.summaries += 1
+        folded = {turn.id for turn in turns}
+        conversation.summary = summary.strip()
+        conversation.turns = [turn for turn in conversation.turns if turn.id not in folded]
+
+    @staticmethod
+    def _render(summary: str, turns: List[_Turn], budget: int) -> Optional[str]:
+        tokenizer = get_tokenizer()
+        used = 0
+        if summary:
+            summary_budget = int(budget * SUMMARY_SHARE)
+            if tokenizer.count(summary) > summary_budget:
+                summary = tokenizer.split(summary, summary_budget)[0] if summary_budget > 0 else ""
+            used = tokenizer.count(summary)
+        # Newest turns first until the budget runs out
+        lines: List[str] = []
+        formatted = [turn.format() for turn in reversed(turns)]
+        for line, tokens in zip(formatted, tokenizer.count_many(formatted)):
+            if used + tokens > budget:
+                break
+            lines.append(line)
+            used += tokens
+        if not summary and not lines:
+            return None
+        parts = ["Conversation so far:"]
+        if summary:
+            parts.append(f"Summary of earlier messages: {summary}")
+        parts.extend(reversed(lines))
+        return "\n".join(parts)
+
+    async def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "conversations": len(self._conversations),
+            "syncs": self.syncs,
+            "summaries": self.summaries,
+            "summary_failures": self.summary_failures
+        }
+
+
+_memory: Optional[ConversationMemory] = None
+_memory_lock = threading.Lock()
+
+
+def get_conversation_memory() -> ConversationMemory:
+    global _memory
+    if _memory is None:
+        with _memory_lock:
+            if _memory is None:
+                _memory = ConversationMemory()
+    return _memory
+
+
+async def close_conversation_memory() -> None:
+    if _memory is not None:
+        await _memory.close()
@@ -0,0 +1,67 @@
+import asyncio
+from collections import deque
+from concurrent.futures import Executor
+from typing import AsyncIterator, Iterator, List, Optional, Tuple
+import fitz  # PyMuPDF
+from ..config import settings
+
+
+def get_page_count(file_path: str) -> int:
+    """Number of pages in a PDF"""
+    with fitz.open(file_path) as doc:
+        return doc.page_count
+
+
+def extract_page_text(page: fitz.Page) -> str:
+    """Text of a page with its text blocks separated by blank lines, so the
+    chunker can see paragraph boundaries"""
+    blocks = page.get_text("blocks", sort=True)
+    return "\n\n".join(block[4].strip() for block in blocks if block[6] == 0) + "\n\n"
+
+
+def iter_pdf_pages(file_path: str, start: int = 0, stop: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+    """Lazily yield (page_number, text) for a range of pages"""
+    with fitz.open(file_path) as doc:
+        stop = doc.page_count if stop is None else min(stop, doc.page_count)
+        for page_number in range(start, stop):
+            yield page_number, extract_page_text(doc.load_page(page_number))
+
+
+def extract_page_range(file_path: str, start: int, stop: int) -> List[Tuple[int, str]]:
+    """Extract a page range in one call; module-level so process pools can pickle it"""
+    return list(iter_pdf_pages(file_path, start, stop))
+
+
+async def aiter_pdf_pages(
+    file_path: str,
+    executor: Optional[Executor] = None,
+    page_count: Optional[int] = None,
+    pages_per_task: int = settings.PDF_PAGES_PER_TASK,
+    max_pending: int = settings.PDF_MAX_PENDING_TASKS
+) -> AsyncIterator[Tuple[int, str]]:
+    """Yield pages in order while page ranges are extracted in parallel.
+
+    At most max_pending ranges are in flight, so memory is bounded by
+    max_pending * pages_per_task pages regardless of document size. Pass
+    page_count when the caller already knows it, to skip opening the PDF
+    just to count pages.
+    """
+    loop = asyncio.get_running_loop()
+    if page_count is None:
+        page_count = await loop.run_in_executor(executor, get_page_count, file_path)
+    ranges = deque(
+        (start, min(start + pages_per_task, page_count))
+        for start in range(0, page_count, pages_per_task)
+    )
+    pending: deque = deque()
+
+    try:
+        while ranges or pending:
+            while ranges and len(pending) < max_pending:
+                start, stop = ranges.popleft()
+                pending.append(loop.run_in_executor(executor, extract_page_range, file_path, start, stop))
+            for page in await pending.popleft():
+                yield page
+    finally:
+        for future in pending:
+            future.cancel()
@@ -0,0 +1,91 @@
+import hashlib
+import os
+import tempfile
+import uuid
+from typing import Callable, Tuple
+import aiofiles
+from fastapi import UploadFile
+from ..config import settings
+
+
+def content_path(content_hash: str, extension: str = ".pdf") -> str:
+    """Content-addressed location of an uploaded file: identical bytes share one path"""
+    return os.path.join(settings.UPLOAD_DIR, content_hash[:2], f"{content_hash}{extension}")
+
+
+async def save_upload(
+    upload: UploadFile,
+    max_size: int = settings.MAX_FILE_SIZE,
+    chunk_size: int = settings.UPLOAD_CHUNK_SIZE
+) -> Tuple[str, str]:
+    """Copy an upload to a temp file under UPLOAD_DIR, hashing it as it goes.
+
+    Starlette has already spooled the request body (capped at the upload
+    limit by the app's middleware); this moves it next to its final
+    location one chunk at a time. Returns the temp path and the sha256 of
+    the content; raises ValueError if the file itself exceeds max_size,
+    leaving nothing behind.
+    """
+    os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=settings.UPLOAD_DIR, suffix=".part")
+    os.close(fd)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(temp_path, "wb") as f:
+            while True:
+                chunk = await upload.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_size:
+                    raise ValueError(f"File exceeds the maximum size of {max_size} bytes")
+                digest.update(chunk)
+                await f.write(chunk)
+    except BaseException:
+        discard_upload(temp_path)
+        raise
+    return temp_path, digest.hexdigest()
+
+
+def commit_upload(temp_path: str, content_hash: str, extension: str = ".pdf") -> str:
+    """Move a saved upload to its content-addressed path; returns the path.
+
+    The rename is atomic, so a file at a content path is always complete. If
+    the content is already stored, the temp file is dropped. Call this after
+    the document row referencing the path is committed, so remove_content()
+    cannot delete the file from under it.
+    """
+    path = content_path(content_hash, extension)
+    if os.path.exists(path):
+        discard_upload(temp_path)
+        return path
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.replace(temp_path, path)
+    return path
+
+
+def discard_upload(temp_path: str) -> None:
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+
+
+def remove_content(file_path: str, count_references: Callable[[], int]) -> None:
+    """Delete a stored file unless a document references it.
+
+    An upload of the same content may commit a row for the path at any time,
+    so the file is first moved aside and the references counted again; if an
+    upload claimed the file meanwhile, it is put back. Overwriting a copy that
+    upload stored in between is harmless, as the bytes are identical.
+    """
+    if count_references():
+        return
+    removed_path = f"{file_path}.{uuid.uuid4().hex}.removed"
+    try:
+        os.replace(file_path, removed_path)
+    except FileNotFoundError:
+        return
+    if count_references():
+        os.replace(removed_path, file_path)
+    else:
+        os.remove(removed_path)
@@ -0,0 +1,158 @@
+import asyncio
+import hashlib
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+import openai
+from google.api_core import exceptions as google_exceptions
+from .chunking import get_tokenizer
+from ..config import settings
+
+
+# Per-request limits for each provider's embedding endpoint
+PROVIDER_BATCH_LIMITS: Dict[str, Dict[str, int]] = {
+    "openai": {"max_items": 2048, "max_tokens": 250_000},
+    "gemini": {"max_items": 100, "max_tokens": 100 * 2048},
+}
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+    openai.InternalServerError,
+    google_exceptions.ResourceExhausted,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.InternalServerError,
+)
+
+
+def make_batches(
+    texts: List[str],
+    max_items: int,
+    max_tokens: int,
+    token_counts: Optional[List[int]] = None
+) -> List[List[int]]:
+    """Split texts into batches of indices bounded by item count and token budget"""
+    if token_counts is None:
+        token_counts = get_tokenizer().count_many(texts)
+    batches = []
+    current: List[int] = []
+    current_tokens = 0
+    for i, tokens in enumerate(token_counts):
+        tokens = max(1, tokens)
+        if current and (len(current) >= max_items or current_tokens + tokens > max_tokens):
+            batches.append(current)
+            current = []
+            current_tokens = 0
+        current.append(i)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+class TokenRateLimiter:
+    """Async token bucket enforcing a tokens-per-minute budget"""
+
+    def __init__(self, tokens_per_minute: int):
+        self.capacity = float(tokens_per_minute)
+        self.rate = tokens_per_minute / 60.0
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens: int) -> None:
+        # A single batch larger than the bucket would wait forever; cap it
+        tokens = min(float(tokens), self.capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+
+class EmbeddingBatcher:
+    """Runs embedding batches concurrently under a shared concurrency and rate limit"""
+
+    def __init__(
+        self,
+        provider: str,
+        max_concurrency: int = settings.EMBEDDING_MAX_CONCURRENCY,
+        tokens_per_minute: int = settings.EMBEDDING_TOKENS_PER_MINUTE,
+        max_retries: int = settings.EMBEDDING_MAX_RETRIES
+    ):
+        limits = PROVIDER_BATCH_LIMITS.get(provider, PROVIDER_BATCH_LIMITS["openai"])
+        self.max_items = limits["max_items"]
+        self.max_tokens = limits["max_tokens"]
+        self.max_retries = max_retries
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._limiter = TokenRateLimiter(tokens_per_minute) if tokens_per_minute > 0 else None
+
+    async def run(
+        self,
+        texts: List[str],
+        embed_batch: Callable[[List[str]], Awaitable[List[List[float]]]]
+    ) -> List[List[float]]:
+        """Embed texts in provider-sized batches, returning results in input order"""
+        token_counts = get_tokenizer().count_many(texts)
+        batches = make_batches(texts, self.max_items, self.max_tokens, token_counts)
+        results: List[Optional[List[float]]] = [None] * len(texts)
+
+        async def run_batch(indices: List[int]) -> None:
+            batch = [texts[i] for i in indices]
+            async with self._semaphore:
+                if self._limiter is not None:
+                    await self._limiter.acquire(sum(token_counts[i] for i in indices))
+                embeddings = await self._with_retries(embed_batch, batch)
+            for i, embedding in zip(indices, embeddings):
+                results[i] = embedding
+
+        await asyncio.gather(*(run_batch(indices) for indices in batches))
+        return results
+
+    async def _with_retries(
+        self,
+        embed_batch: Callable[[List[str]], Awaitable[List[List[float]]]],
+        batch: List[str]
+    ) -> List[List[float]]:
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await embed_batch(batch)
+            except RETRYABLE_ERRORS:
+                if attempt == self.max_retries:
+                    raise
+                # Exponential backoff with jitter: ~1s, 2s, 4s, ... capped at 30s
+                await asyncio.sleep(min(30.0, 2 ** attempt) * (0.5 + random.random()))
+
+
+# Batchers per (provider, hashed key), in LRU order with their last use;
+# bounded and expired like the client registry's per-key clients
+_batchers: "OrderedDict[Tuple[str, str], Tuple[EmbeddingBatcher, float]]" = OrderedDict()
+_batchers_lock = threading.Lock()
+
+
+def get_embedding_batcher(provider: str, api_key: Optional[str] = None) -> EmbeddingBatcher:
+    """Get the batcher shared by all requests using this provider and key"""
+    key = (provider, hashlib.sha256((api_key or "").encode("utf-8")).hexdigest())
+    now = time.monotonic()
+    with _batchers_lock:
+        # Entries are in LRU order, so idle ones are always at the front
+        while _batchers:
+            _, last_used = next(iter(_batchers.values()))
+            if now - last_used < settings.CLIENT_POOL_IDLE_TTL:
+                break
+            _batchers.popitem(last=False)
+        entry = _batchers.get(key)
+        batcher = entry[0] if entry is not None else EmbeddingBatcher(provider)
+        _batchers[key] = (batcher, now)
+        _batchers.move_to_end(key)
+        while len(_batchers) > settings.CLIENT_POOL_MAX_SIZE:
+            _batchers.popitem(last=False)
+    return batcher
@@ -0,0 +1,266 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+from ..config import settings
+
+
+class EmbeddingCache:
+    """Content-addressed embedding cache with an in-process LRU tier backed by SQLite.
+
+    Entries are keyed by (provider, model, sha256(text)) and stored as float32.
+    The on-disk tier is capped at max_entries; the least recently used rows are
+    evicted in bulk when the cap is exceeded. The async methods only touch the
+    in-memory tier on the event loop and run SQLite in a worker thread.
+    """
+
+    # Rows looked up / written per SQL statement
+    BATCH_SIZE = 500
+
+    def __init__(
+        self,
+        path: str = settings.EMBEDDING_CACHE_PATH,
+        memory_items: int = settings.EMBEDDING_CACHE_MEMORY_ITEMS,
+        max_entries: int = settings.EMBEDDING_CACHE_MAX_ENTRIES
+    ):
+        self.path = path
+        self.memory_items = memory_items
+        self.max_entries = max_entries
+        self._memory: "OrderedDict[str, array]" = OrderedDict()
+        # Guards the in-memory tier and counters; never held during disk I/O
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        # Rows on disk as far as this process knows; recounted before evicting
+        self._disk_rows = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_embeddings_last_used ON embeddings (last_used)")
+            self._disk_rows = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def make_key(provider: str, model: str, text: str) -> str:
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{provider}:{model}:{digest}"
+
+    def get_many(self, provider: str, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """Look up embeddings for texts; missing entries are returned as None"""
+        keys = [self.make_key(provider, model, text) for text in texts]
+        found = self._memory_get(keys)
+        disk_keys = list({key for key in keys if key not in found})
+        if disk_keys:
+            self._remember_many(self._disk_get(disk_keys), found)
+        return self._results(keys, found, disk_keys)
+
+    async def aget_many(self, provider: str, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """get_many() that reads the disk tier in a worker thread"""
+        keys = [self.make_key(provider, model, text) for text in texts]
+        found = self._memory_get(keys)
+        disk_keys = list({key for key in keys if key not in found})
+        if disk_keys:
+            self._remember_many(await asyncio.to_thread(self._disk_get, disk_keys), found)
+        return self._results(keys, found, disk_keys)
+
+    def put_many(
+        self,
+        provider: str,
+        model: str,
+        texts: List[str],
+        embeddings: List[List[float]]
+    ) -> None:
+        """Store embeddings for texts in both tiers"""
+        self._disk_put(self._memory_put(provider, model, texts, embeddings))
+
+    async def aput_many(
+        self,
+        provider: str,
+        model: str,
+        texts: List[str],
+        embeddings: List[List[float]]
+    ) -> None:
+        """put_many() that writes the disk tier in a worker thread"""
+        rows = self._memory_put(provider, model, texts, embeddings)
+        await asyncio.to_thread(self._disk_put, rows)
+
+    def _memory_get(self, keys: List[str]) -> Dict[str, array]:
+        found: Dict[str, array] = {}
+        with self._lock:
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+        return found
+
+    def _memory_put(
+        self,
+        provider: str,
+        model: str,
+        texts: List[str],
+        embeddings: List[List[float]]
+    ) -> List[Tuple[str, bytes, float]]:
+        """Remember embeddings in memory; returns the rows for the disk tier"""
+        now = time.time()
+        rows = []
+        with self._lock:
+            for text, embedding in zip(texts, embeddings):
+                key = self.make_key(provider, model, text)
+                vector = array("f", embedding)
+                self._remember(key, vector)
+                rows.append((key, vector.tobytes(), now))
+        return rows
+
+    def _remember_many(self, vectors: Dict[str, array], found: Dict[str, array]) -> None:
+        with self._lock:
+            for key, vector in vectors.items():
+                found[key] = vector
+                self._remember(key, vector)
+
+    def _results(
+        self,
+        keys: List[str],
+        found: Dict[str, array],
+        disk_keys: List[str]
+    ) -> List[Optional[List[float]]]:
+        results = []
+        disk_key_set = set(disk_keys)
+        with self._lock:
+            for key in keys:
+                vector = found.get(key)
+                if vector is None:
+                    self.misses += 1
+                    results.append(None)
+                else:
+                    if key in disk_key_set:
+                        self.disk_hits += 1
+                    else:
+                        self.memory_hits += 1
+                    results.append(vector.tolist())
+        return results
+
+    def _remember(self, key: str, vector: array) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def _disk_get(self, keys: List[str]) -> Dict[str, array]:
+        found: Dict[str, array] = {}
+        now = time.time()
+        with self._disk_lock:
+            conn = self.conn
+            for start in range(0, len(keys), self.BATCH_SIZE):
+                batch = keys[start:start + self.BATCH_SIZE]
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[key] = vector
+                if rows:
+                    conn.executemany(
+                        "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                        [(now, key) for key, _ in rows]
+                    )
+            conn.commit()
+        return found
+
+    def _disk_put(self, rows: List[Tuple[str, bytes, float]]) -> None:
+        with self._disk_lock:
+            conn = self.conn
+            for start in range(0, len(rows), self.BATCH_SIZE):
+                # Keys are content hashes, so an existing row already holds the same vector
+                cursor = conn.executemany(
+                    "INSERT OR IGNORE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                    rows[start:start + self.BATCH_SIZE]
+                )
+                self._disk_rows += max(cursor.rowcount, 0)
+            conn.commit()
+            self._enforce_cap()
+
+    def _enforce_cap(self) -> None:
+        if self._disk_rows <= self.max_entries:
+            return
+        # Other processes sharing the file may have evicted rows meanwhile
+        self._disk_rows = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        if self._disk_rows <= self.max_entries:
+            return
+        # Evict down to 90% of the cap so we don't pay this on every insert
+        excess = self._disk_rows - int(self.max_entries * 0.9)
+        evicted = self.conn.execute(
+            "DELETE FROM embeddings WHERE key IN ("
+            "SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+            (excess,)
+        ).rowcount
+        self.conn.commit()
+        self._disk_rows -= evicted
+        self.evictions += evicted
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "disk_entries": self._disk_rows,
+            "evictions": self.evictions
+        }
+
+    def close(self) -> None:
+        with self._disk_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+        with self._lock:
+            self._memory.clear()
+
+
+_cache: Optional[EmbeddingCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """Get the process-wide embedding cache, or None when caching is disabled"""
+    global _cache
+    if not settings.EMBEDDING_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = EmbeddingCache()
+    return _cache
+
+
+def close_embedding_cache() -> None:
+    global _cache
+    with _cache_lock:
+        cache, _cache = _cache, None
+    if cache is not None:
+        cache.close()
@@ -1,7 +1,13 @@
-from typing import List
-from openai import OpenAI
+from typing import List, Optional, Tuple
 import google.generativeai as genai
-from ..config import settings
+from .client_registry import get_client_registry
+from .embedding_batcher import PROVIDER_BATCH_LIMITS, get_embedding_batcher, make_batches
+from .embedding_cache import get_embedding_cache
+
+EMBEDDING_MODELS = {
+    "openai": "text-embedding-3-small",
+    "gemini": "models/embedding-001",
+}
 
 
 class EmbeddingService:
@@ -10,37 +16,140 @@ class EmbeddingService:
     def __init__(self, provider: str = "openai", api_key: str = None):
         self.provider = provider.lower()
         self.api_key = api_key
-        
-        if self.provider == "openai":
-            self.client = OpenAI(api_key=api_key or settings.OPENAI_API_KEY)
-        elif self.provider == "gemini":
-            genai.configure(api_key=api_key or settings.GOOGLE_API_KEY)
+        self.model = EMBEDDING_MODELS.get(self.provider)
+    
+    # Clients come from the shared registry on each use, so a long-lived
+    # service never pins a client the registry has evicted
+    @property
+    def client(self):
+        return get_client_registry().openai(self.api_key)
+    
+    @property
+    def async_client(self):
+        return get_client_registry().async_openai(self.api_key)
     
     def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
         """Generate embeddings for a list of texts"""
-        if self.provider == "openai":
-            return self._openai_embeddings(texts)
-        elif self.provider == "gemini":
-            return self._gemini_embeddings(texts)
+        embeddings, missing = self._lookup_cached(texts)
+        if missing:
+            if self.provider == "openai":
+                computed = self._openai_embeddings(missing)
+            elif self.provider == "gemini":
+                computed = self._gemini_embeddings(missing)
+            else:
+                raise ValueError(f"Unsupported provider: {self.provider}")
+            self._store_computed(texts, embeddings, missing, computed)
+        return embeddings
+    
+    async def agenerate_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Generate embeddings for a list of texts without blocking the event loop"""
+        cache = get_embedding_cache() if self.model is not None else None
+        if cache is None:
+            embeddings = [None] * len(texts)
         else:
-            raise ValueError(f"Unsupported provider: {self.provider}")
+            embeddings = await cache.aget_many(self.provider, self.model, texts)
+        missing = self._missing(texts, embeddings)
+        if missing:
+            if self.provider == "openai":
+                computed = await self._openai_embeddings_async(missing)
+            elif self.provider == "gemini":
+                computed = await self._gemini_embeddings_async(missing)
+            else:
+                raise ValueError(f"Unsupported provider: {self.provider}")
+            self._fill_computed(texts, embeddings, missing, computed)
+            if cache is not None:
+                await cache.aput_many(self.provider, self.model, missing, computed)
+        return embeddings
+    
+    def _lookup_cached(self, texts: List[str]) -> Tuple[List[Optional[List[float]]], List[str]]:
+        """Return cached embeddings (None where missing) and the unique texts still to embed"""
+        cache = get_embedding_cache()
+        if cache is None or self.model is None:
+            return [None] * len(texts), list(dict.fromkeys(texts))
+        embeddings = cache.get_many(self.provider, self.model, texts)
+        return embeddings, self._missing(texts, embeddings)
+    
+    @staticmethod
+    def _missing(texts: List[str], embeddings: List[Optional[List[float]]]) -> List[str]:
+        """Unique texts without an embedding yet"""
+        return list(dict.fromkeys(text for text, embedding in zip(texts, embeddings) if embedding is None))
+    
+    @staticmethod
+    def _fill_computed(
+        texts: List[str],
+        embeddings: List[Optional[List[float]]],
+        missing: List[str],
+        computed: List[List[float]]
+    ) -> None:
+        by_text = dict(zip(missing, computed))
+        for i, text in enumerate(texts):
+            if embeddings[i] is None:
+                embeddings[i] = by_text[text]
+    
+    def _store_computed(
+        self,
+        texts: List[str],
+        embeddings: List[Optional[List[float]]],
+        missing: List[str],
+        computed: List[List[float]]
+    ) -> None:
+        """Fill computed embeddings into the result list and the cache"""
+        self._fill_computed(texts, embeddings, missing, computed)
+        cache = get_embedding_cache()
+        if cache is not None:
+            cache.put_many(self.provider, self.model, missing, computed)
+    
+    def _batches(self, texts: List[str]) -> List[List[str]]:
+        limits = PROVIDER_BATCH_LIMITS[self.provider]
+        return [
+            [texts[i] for i in indices]
+            for indices in make_batches(texts, limits["max_items"], limits["max_tokens"])
+        ]
     
     def _openai_embeddings(self, texts: List[str]) -> List[List[float]]:
         """Generate embeddings using OpenAI"""
-        response = self.client.embeddings.create(
-            model="text-embedding-3-small",
-            input=texts
-        )
-        return [item.embedding for item in response.data]
+        embeddings = []
+        for batch in self._batches(texts):
+            response = self.client.embeddings.create(
+                model=self.model,
+                input=batch
+            )
+            embeddings.extend(item.embedding for item in response.data)
+        return embeddings
     
     def _gemini_embeddings(self, texts: List[str]) -> List[List[float]]:
-        """Generate embeddings using Gemini"""
+        """Generate embeddings using Gemini's batch embedding call"""
         embeddings = []
-        for text in texts:
+        for batch in self._batches(texts):
             result = genai.embed_content(
-                model="models/embedding-001",
-                content=text,
-                task_type="retrieval_document"
+                model=self.model,
+                content=batch,
+                task_type="retrieval_document",
+                client=get_client_registry().gemini(self.api_key)
             )
-            embeddings.append(result['embedding'])
+            embeddings.extend(result['embedding'])
         return embeddings
+    
+    async def _openai_embeddings_async(self, texts: List[str]) -> List[List[float]]:
+        """Generate embeddings using the async OpenAI client"""
+        async def embed_batch(batch: List[str]) -> List[List[float]]:
+            response = await self.async_client.embeddings.create(
+                model=self.model,
+                input=batch
+            )
+            return [item.embedding for item in response.data]
+        
+        return await get_embedding_batcher(self.provider, self.api_key).run(texts, embed_batch)
+    
+    async def _gemini_embeddings_async(self, texts: List[str]) -> List[List[float]]:
+        """Generate embeddings using Gemini's async batch embedding call"""
+        async def embed_batch(batch: List[str]) -> List[List[float]]:
+            result = await genai.embed_content_async(
+                model=self.model,
+                content=batch,
+                task_type="retrieval_document",
+                client=get_client_registry().gemini_async(self.api_key)
+            )
+            return result['embedding']
+        
+        return await get_embedding_batcher(self.provider, self.api_key).run(texts, embed_batch)
@@ -0,0 +1,341 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from uuid import UUID
+from .chunking import Chunk, get_chunker
+from .document_processor import aiter_pdf_pages, get_page_count
+from .embedding_service import EmbeddingService
+from .job_credentials import open_api_key
+from .lexical_index import get_lexical_index
+from .vector_store_service import VectorStoreService
+from ..config import settings
+from ..database import AsyncSessionLocal
+from ..models.document import Document
+from ..repositories.document_repository import AsyncDocumentRepository
+from ..repositories.ingestion_job_repository import AsyncIngestionJobRepository
+from ..stack_events import stack_changed
+
+
+async def ingest_document(
+    doc: Document,
+    embedding_model: str,
+    api_key: Optional[str],
+    executor: Optional[ProcessPoolExecutor] = None,
+    on_progress: Optional[Callable[[float, str], None]] = None
+) -> Tuple[int, int]:
+    """Extract, chunk, embed and store a document.
+
+    Pages stream from the extractor into the chunker, and chunks are embedded
+    and stored in slices, so memory stays bounded by a window rather than by
+    the size of the document. Chunk ids are derived from content fingerprints:
+    chunks already in the collection are kept and only new ones are embedded,
+    and chunks that no longer occur are removed at the end.
+
+    Returns the number of chunks and the number that had to be embedded.
+    """
+    def report(progress: float, message: str) -> None:
+        if on_progress is not None:
+            on_progress(progress, message)
+
+    embedding_service = EmbeddingService(provider=embedding_model, api_key=api_key)
+    vector_store = VectorStoreService.for_stack(doc.stack_id, embedding_model)
+    lexical_index = get_lexical_index(doc.stack_id)
+    chunker = get_chunker()
+    document_filter = {"document_id": str(doc.id)}
+    existing_ids = set(await asyncio.to_thread(vector_store.get_ids, document_filter))
+    seen_ids: Set[str] = set()
+    occurrences: Dict[str, int] = {}
+    pending: List[Chunk] = []
+    chunk_count = 0
+    embedded_count = 0
+
+    def chunk_id(chunk: Chunk) -> str:
+        # Repeated passages in one document share a fingerprint; number them
+        n = occurrences.get(chunk.fingerprint, 0)
+        occurrences[chunk.fingerprint] = n + 1
+        return f"{doc.id}_{chunk.fingerprint}" if n == 0 else f"{doc.id}_{chunk.fingerprint}_{n}"
+
+    async def store(chunks: List[Chunk]) -> None:
+        nonlocal chunk_count, embedded_count
+        ids = [chunk_id(chunk) for chunk in chunks]
+        metadatas = [
+            {"document_id": str(doc.id), "filename": doc.filename, **chunk.metadata()}
+            for chunk in chunks
+        ]
+        new = [i for i, id in enumerate(ids) if id not in existing_ids]
+        unchanged = [i for i, id in enumerate(ids) if id in existing_ids]
+
+        if new:
+            embeddings = await embedding_service.agenerate_embeddings([chunks[i].text for i in new])
+            await asyncio.to_thread(
+                vector_store.add_documents,
+                documents=[chunks[i].text for i in new],
+                embeddings=embeddings,
+                ids=[ids[i] for i in new],
+                metadatas=[metadatas[i] for i in new]
+            )
+        if unchanged:
+            # Positions may have shifted even though the text didn't
+            await asyncio.to_thread(
+                vector_store.update_metadata,
+                [ids[i] for i in unchanged],
+                [metadatas[i] for i in unchanged]
+            )
+        # Unchanged chunks may predate the lexical index
+        texts = {id: chunk.text for id, chunk in zip(ids, chunks)}
+        unindexed = await asyncio.to_thread(lexical_index.missing, ids)
+        await asyncio.to_thread(
+            lexical_index.add, unindexed, [str(doc.id)] * len(unindexed), [texts[id] for id in unindexed]
+        )
+        seen_ids.update(ids)
+        chunk_count += len(chunks)
+        embedded_count += len(new)
+
+    report(0.0, "Extracting text")
+    loop = asyncio.get_running_loop()
+    page_count = await loop.run_in_executor(executor, get_page_count, doc.file_path)
+    slice_size = settings.INGESTION_PROGRESS_CHUNKS
+
+    async for page_number, text in aiter_pdf_pages(doc.file_path, executor, page_count):
+        pending.extend(chunker.feed(page_number + 1, text))
+        if len(pending) >= slice_size:
+            await store(pending)
+            pending = []
+            report(
+                (page_number + 1) / page_count,
+                f"Processed {page_number + 1}/{page_count} pages, {chunk_count} chunks"
+            )
+
+    pending.extend(chunker.flush())
+    if pending:
+        await store(pending)
+    if chunk_count == 0:
+        raise ValueError("No text could be extracted from the document")
+
+    stale_ids = list(existing_ids - seen_ids)
+    await asyncio.to_thread(vector_store.delete_ids, stale_ids)
+    await asyncio.to_thread(lexical_index.delete_chunks, stale_ids)
+    # Chunks embedded earlier with another model live in another collection
+    for other_store in VectorStoreService.all_for_stack(doc.stack_id):
+        if other_store.collection_name != vector_store.collection_name:
+            await asyncio.to_thread(other_store.delete_by_metadata, document_filter)
+    return chunk_count, embedded_count
+
+
+async def copy_document_chunks(
+    source: Document,
+    doc: Document,
+    on_progress: Optional[Callable[[float, str], None]] = None
+) -> int:
+    """Copy the stored chunks and embeddings of an identical, already processed
+    document into doc's stack collection instead of re-extracting and
+    re-embedding it. Returns the number of chunks copied (0 if the source
+    collection no longer has them).
+    """
+    source_store = VectorStoreService.for_stack(source.stack_id, source.embedding_model)
+    target_store = VectorStoreService.for_stack(doc.stack_id, source.embedding_model)
+    lexical_index = get_lexical_index(doc.stack_id)
+    document_filter = {"document_id": str(doc.id)}
+    existing_ids = set(await asyncio.to_thread(target_store.get_ids, document_filter))
+    source_prefix = str(source.id)
+    copied_ids: Set[str] = set()
+    page_size = settings.INGESTION_PROGRESS_CHUNKS
+
+    while True:
+        batch = await asyncio.to_thread(
+            source_store.get_documents,
+            {"document_id": source_prefix},
+            limit=page_size,
+            offset=len(copied_ids)
+        )
+        if not batch["ids"]:
+            break
+        # Chunk ids are "<document id><suffix>"; keep the suffix
+        ids = [f"{doc.id}{id[len(source_prefix):]}" for id in batch["ids"]]
+        await asyncio.to_thread(
+            target_store.add_documents,
+            documents=batch["documents"],
+            embeddings=batch["embeddings"],
+            ids=ids,
+            metadatas=[
+                {**metadata, "document_id": str(doc.id), "filename": doc.filename}
+                for metadata in batch["metadatas"]
+            ]
+        )
+        await asyncio.to_thread(lexical_index.add, ids, [str(doc.id)] * len(ids), batch["documents"])
+        copied_ids.update(ids)
+        if on_progress is not None:
+            on_progress(0.5, f"Copied {len(copied_ids)} chunks from an identical document")
+        if len(batch["ids"]) < page_size:
+            break
+
+    if copied_ids:
+        stale_ids = list(existing_ids - copied_ids)
+        await asyncio.to_thread(target_store.delete_ids, stale_ids)
+        await asyncio.to_thread(lexical_index.delete_chunks, stale_ids)
+    return len(copied_ids)
+
+
+class IngestionWorker:
+    """Local worker pool that drains the database-backed ingestion queue.
+
+    Async tasks claim jobs and run embedding; PDF extraction goes to a process
+    pool. Claimed jobs hold a lease that is renewed while they run, so a job
+    interrupted by a crash or restart is picked up again once its lease lapses.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = settings.INGESTION_WORKERS,
+        poll_interval: float = settings.INGESTION_POLL_INTERVAL,
+        lease_seconds: float = settings.INGESTION_JOB_LEASE,
+        max_attempts: int = settings.INGESTION_MAX_ATTEMPTS
+    ):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._tasks = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def start(self) -> None:
+        self._wakeup = asyncio.Event()
+        self._executor = ProcessPoolExecutor(
+            max_workers=settings.INGESTION_PROCESS_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.concurrency)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def notify(self) -> None:
+        """Tell the worker a job was enqueued so it doesn't wait for the next poll"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self) -> None:
+        while True:
+            job_id = await self._claim()
+            if job_id is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._process(job_id)
+
+    async def _claim(self) -> Optional[UUID]:
+        async with AsyncSessionLocal() as db:
+            job = await AsyncIngestionJobRepository(db).claim_next(self.lease_seconds, self.max_attempts)
+            return job.id if job else None
+
+    async def _heartbeat(self, job_id: UUID) -> None:
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            async with AsyncSessionLocal() as db:
+                await AsyncIngestionJobRepository(db).renew_lease(job_id, self.lease_seconds)
+
+    async def _report_progress(self, job_id: UUID, updates: asyncio.Queue) -> None:
+        """Write progress from its own session, skipping to the latest update
+        when ingestion reports faster than the database keeps up"""
+        async with AsyncSessionLocal() as db:
+            job_repo = AsyncIngestionJobRepository(db)
+            while True:
+                update = await updates.get()
+                while not updates.empty():
+                    update = updates.get_nowait()
+                await job_repo.update_progress(job_id, *update)
+
+    async def _process(self, job_id: UUID) -> None:
+        db = AsyncSessionLocal()
+        job_repo = AsyncIngestionJobRepository(db)
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        updates: asyncio.Queue = asyncio.Queue()
+        progress = asyncio.create_task(self._report_progress(job_id, updates))
+        stack_id = None
+        try:
+            job = await job_repo.get_by_id(job_id)
+            doc = await AsyncDocumentRepository(db).get_by_id(job.document_id)
+            stack_id = doc.stack_id
+            api_key = open_api_key(job.encrypted_api_key)
+            on_progress = lambda progress, message: updates.put_nowait((progress, message))
+
+            # Identical bytes already processed with this model (usually in
+            # another stack): copy its chunks rather than redo the work
+            chunk_count = 0
+            if doc.content_hash:
+                source = await AsyncDocumentRepository(db).get_processed_copy(
+                    doc.content_hash, job.embedding_model, doc.id
+                )
+                if source is not None:
+                    chunk_count = await copy_document_chunks(source, doc, on_progress)
+
+            if chunk_count:
+                message = f"Document processed successfully. {chunk_count} chunks reused from an identical document."
+            else:
+                chunk_count, embedded_count = await ingest_document(
+                    doc,
+                    job.embedding_model,
+                    api_key,
+                    executor=self._executor,
+                    on_progress=on_progress
+                )
+                message = f"Document processed successfully. {chunk_count} chunks created, {embedded_count} newly embedded."
+            # A pending progress write must not land after the final status
+            await self._stop(progress)
+            self._chunks_changed(db, stack_id)
+            await job_repo.mark_completed(job_id, message)
+        except asyncio.CancelledError:
+            # Shutting down: hand the job back so the next start resumes it
+            await self._stop(progress)
+            self._chunks_changed(db, stack_id)
+            await job_repo.requeue(job_id)
+            raise
+        except Exception as e:
+            print(f"Ingestion job {job_id} failed: {e}")
+            await self._stop(progress)
+            self._chunks_changed(db, stack_id)
+            await job_repo.mark_failed(job_id, str(e))
+        finally:
+            heartbeat.cancel()
+            progress.cancel()
+            await db.close()
+
+    @staticmethod
+    def _chunks_changed(db, stack_id: Optional[UUID]) -> None:
+        # Chunks were written (or partly written); cached retrievals and
+        # answers for the stack are dropped everywhere once the status commits
+        if stack_id is not None:
+            stack_changed(db, stack_id)
+
+    @staticmethod
+    async def _stop(task: asyncio.Task) -> None:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+
+_worker: Optional[IngestionWorker] = None
+
+
+def get_ingestion_worker() -> IngestionWorker:
+    global _worker
+    if _worker is None:
+        _worker = IngestionWorker()
+    return _worker
+
+
+async def stop_ingestion_worker() -> None:
+    global _worker
+    worker, _worker = _worker, None
+    if worker is not None:
+        await worker.stop()
@@ -0,0 +1,41 @@
+import base64
+import hashlib
+from typing import Optional
+from cryptography.fernet import Fernet, InvalidToken
+from ..config import settings
+
+
+def _make_fernet() -> Fernet:
+    if not settings.INGESTION_KEY_SECRET:
+        # Only this process can read what it seals
+        return Fernet(Fernet.generate_key())
+    digest = hashlib.sha256(settings.INGESTION_KEY_SECRET.encode()).digest()
+    return Fernet(base64.urlsafe_b64encode(digest))
+
+
+_fernet = _make_fernet()
+
+
+def seal_api_key(api_key: Optional[str]) -> Optional[str]:
+    """Encrypt a per-request API key for storage with its ingestion job"""
+    if not api_key:
+        return None
+    return _fernet.encrypt(api_key.encode()).decode()
+
+
+def open_api_key(sealed: Optional[str]) -> Optional[str]:
+    """Decrypt an API key stored by seal_api_key.
+
+    Raises ValueError when the key was sealed under another secret: another
+    replica or an earlier run without INGESTION_KEY_SECRET. The job must not
+    silently fall back to the server's keys.
+    """
+    if not sealed:
+        return None
+    try:
+        return _fernet.decrypt(sealed.encode()).decode()
+    except InvalidToken:
+        raise ValueError(
+            "The API key for this job was encrypted by another process; set the same "
+            "INGESTION_KEY_SECRET on every replica and process the document again"
+        ) from None
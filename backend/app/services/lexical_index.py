@@ -0,0 +1,394 @@
+import os
+import re
+import shutil
+import sqlite3
+import threading
+from array import array
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from uuid import UUID
+import numpy as np
+from ..config import settings
+
+
+# Words, numbers and compound identifiers such as part numbers ("AB-1234"),
+# error codes ("0x80070005") and versions ("2.4.1")
+_TOKEN = re.compile(r"\w+(?:[-./:]\w+)*")
+_TOKEN_PARTS = re.compile(r"[-./:]")
+
+# A term's postings are written as one segment per batch; segments are merged
+# once a term has more than this many
+MAX_SEGMENTS_PER_TERM = 16
+# Terms / ordinals per SQL statement
+SQL_BATCH_SIZE = 500
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased terms; compound identifiers are indexed whole and by their parts"""
+    terms = []
+    for token in _TOKEN.findall(text.lower()):
+        terms.append(token)
+        if not token.isalnum():
+            terms.extend(part for part in _TOKEN_PARTS.split(token) if part)
+    return terms
+
+
+class LexicalIndex:
+    """On-disk BM25 index for one stack's chunks.
+
+    Postings are stored in SQLite as packed arrays (uint32 chunk ordinals and
+    uint16 term frequencies), one row per term per write batch. Chunk lengths
+    and deletion tombstones are kept in memory as NumPy arrays, so scoring a
+    query is a handful of vectorized operations over the query terms'
+    postings.
+
+    Ordinals only grow and a tombstone records the index version that deleted
+    the chunk, so catching up with other processes' writes reads only new
+    ordinals and newly deleted rows.
+    """
+
+    def __init__(self, path: str, k1: float = settings.BM25_K1, b: float = settings.BM25_B):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lengths = np.zeros(0, dtype=np.float32)
+        self._deleted = np.zeros(0, dtype=bool)
+        self._live_count = 0
+        self._total_length = 0
+        self._loaded_version = -1
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(
+                "CREATE TABLE IF NOT EXISTS chunks ("
+                " ordinal INTEGER PRIMARY KEY, chunk_id TEXT NOT NULL, document_id TEXT NOT NULL,"
+                " length INTEGER NOT NULL, deleted INTEGER NOT NULL DEFAULT 0);"
+                "CREATE INDEX IF NOT EXISTS ix_chunks_chunk_id ON chunks (chunk_id);"
+                "CREATE INDEX IF NOT EXISTS ix_chunks_document_id ON chunks (document_id);"
+                "CREATE INDEX IF NOT EXISTS ix_chunks_deleted ON chunks (deleted);"
+                "CREATE TABLE IF NOT EXISTS postings ("
+                " term TEXT NOT NULL, segment INTEGER NOT NULL, ordinals BLOB NOT NULL, tfs BLOB NOT NULL,"
+                " PRIMARY KEY (term, segment)) WITHOUT ROWID;"
+                "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);"
+                "INSERT OR IGNORE INTO meta VALUES ('version', 0), ('segment', 0);"
+            )
+            self._conn = conn
+        return self._conn
+
+    def add(self, chunk_ids: List[str], document_ids: List[str], texts: List[str]) -> None:
+        """Index chunks; re-adding a chunk id replaces its previous entry"""
+        if not chunk_ids:
+            return
+        with self._lock, self._writing() as version:
+            self._tombstone("chunk_id", chunk_ids, version)
+            start = self.conn.execute("SELECT COALESCE(MAX(ordinal), -1) + 1 FROM chunks").fetchone()[0]
+            segment = self._bump("segment")
+
+            postings: Dict[str, Tuple[array, array]] = {}
+            rows = []
+            for offset, (chunk_id, document_id, text) in enumerate(zip(chunk_ids, document_ids, texts)):
+                ordinal = start + offset
+                terms = tokenize(text)
+                rows.append((ordinal, chunk_id, document_id, len(terms)))
+                for term, tf in Counter(terms).items():
+                    entry = postings.get(term)
+                    if entry is None:
+                        entry = postings[term] = (array("I"), array("H"))
+                    entry[0].append(ordinal)
+                    entry[1].append(tf if tf < 65535 else 65535)
+
+            self.conn.executemany(
+                "INSERT INTO chunks (ordinal, chunk_id, document_id, length) VALUES (?, ?, ?, ?)", rows
+            )
+            self.conn.executemany(
+                "INSERT INTO postings (term, segment, ordinals, tfs) VALUES (?, ?, ?, ?)",
+                [(term, segment, ordinals.tobytes(), tfs.tobytes()) for term, (ordinals, tfs) in postings.items()]
+            )
+            self._merge_segments(list(postings))
+            self._bump("version")
+            self.conn.commit()
+
+            lengths = np.asarray([row[3] for row in rows], dtype=np.float32)
+            self._lengths = np.concatenate([self._lengths, np.zeros(start - len(self._lengths), dtype=np.float32), lengths])
+            self._deleted = np.concatenate([self._deleted, np.zeros(start + len(rows) - len(self._deleted), dtype=bool)])
+            self._live_count += len(rows)
+            self._total_length += int(lengths.sum())
+            self._loaded_version = version
+
+    def missing(self, chunk_ids: List[str]) -> List[str]:
+        """The chunk ids that are not indexed"""
+        with self._lock:
+            found = set()
+            for start in range(0, len(chunk_ids), SQL_BATCH_SIZE):
+                batch = chunk_ids[start:start + SQL_BATCH_SIZE]
+                placeholders = ",".join("?" * len(batch))
+                found.update(row[0] for row in self.conn.execute(
+                    f"SELECT chunk_id FROM chunks WHERE deleted = 0 AND chunk_id IN ({placeholders})", batch
+                ))
+            return [chunk_id for chunk_id in chunk_ids if chunk_id not in found]
+
+    def delete_chunks(self, chunk_ids: List[str]) -> None:
+        self._delete("chunk_id", chunk_ids)
+
+    def delete_document(self, document_id: UUID) -> None:
+        self._delete("document_id", [str(document_id)])
+
+    def search(self, query: str, n_results: int) -> List[Tuple[str, float]]:
+        """Top chunks by BM25 score as (chunk_id, score), best first"""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        # One snapshot for the refresh and the postings: a batch committed in
+        # between would bring ordinals the tombstone array doesn't cover yet
+        with self._lock, self._reading():
+            self._refresh()
+            if self._live_count == 0:
+                return []
+            avg_length = self._total_length / self._live_count
+            all_ordinals = []
+            all_scores = []
+            for term in terms:
+                rows = self.conn.execute(
+                    "SELECT ordinals, tfs FROM postings WHERE term = ?", (term,)
+                ).fetchall()
+                if not rows:
+                    continue
+                ordinals = np.concatenate([np.frombuffer(row[0], dtype=np.uint32) for row in rows])
+                tfs = np.concatenate([np.frombuffer(row[1], dtype=np.uint16) for row in rows]).astype(np.float32)
+                live = ~self._deleted[ordinals]
+                ordinals, tfs = ordinals[live], tfs[live]
+                if not len(ordinals):
+                    continue
+                df = len(ordinals)
+                idf = np.log(1.0 + (self._live_count - df + 0.5) / (df + 0.5))
+                norm = self.k1 * (1.0 - self.b + self.b * self._lengths[ordinals] / avg_length)
+                all_ordinals.append(ordinals)
+                all_scores.append(idf * tfs * (self.k1 + 1.0) / (tfs + norm))
+            if not all_ordinals:
+                return []
+
+            candidates, inverse = np.unique(np.concatenate(all_ordinals), return_inverse=True)
+            scores = np.bincount(inverse, weights=np.concatenate(all_scores))
+            top = min(n_results, len(candidates))
+            best = np.argpartition(-scores, top - 1)[:top]
+            best = best[np.argsort(-scores[best])]
+            chunk_ids = self._chunk_ids([int(candidates[i]) for i in best])
+            return [(chunk_ids[int(candidates[i])], float(scores[i])) for i in best]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock, self._reading():
+            self._refresh()
+            return {"chunks": self._live_count, "total_terms": self._total_length}
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _delete(self, column: str, values: List[str]) -> None:
+        if not values:
+            return
+        with self._lock, self._writing() as version:
+            if self._tombstone(column, values, version):
+                self._loaded_version = self._bump("version")
+            self.conn.commit()
+
+    @contextmanager
+    def _reading(self) -> Iterator[None]:
+        """Read from a single snapshot of the index"""
+        conn = self.conn
+        conn.execute("BEGIN")
+        try:
+            yield
+        finally:
+            conn.commit()
+
+    @contextmanager
+    def _writing(self) -> Iterator[int]:
+        """Open a write transaction and bring the in-memory arrays up to date
+        under its lock; yields the version the transaction will commit"""
+        conn = self.conn
+        # Take the write lock before reading, so no other writer can change
+        # the index between the refresh and this transaction's updates
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._refresh()
+            yield self._loaded_version + 1
+        except BaseException:
+            conn.rollback()
+            # Tombstones may already be applied in memory
+            self._reset()
+            raise
+
+    def _tombstone(self, column: str, values: List[str], version: int) -> int:
+        """Mark live chunks matching column IN values deleted as of version; returns how many"""
+        removed = 0
+        for start in range(0, len(values), SQL_BATCH_SIZE):
+            batch = values[start:start + SQL_BATCH_SIZE]
+            placeholders = ",".join("?" * len(batch))
+            rows = self.conn.execute(
+                f"UPDATE chunks SET deleted = ? WHERE deleted = 0 AND {column} IN ({placeholders}) "
+                "RETURNING ordinal, length",
+                [version, *batch]
+            ).fetchall()
+            for ordinal, length in rows:
+                self._deleted[ordinal] = True
+                self._live_count -= 1
+                self._total_length -= length
+            removed += len(rows)
+        return removed
+
+    def _merge_segments(self, terms: List[str]) -> None:
+        """Merge the segments of terms that have accumulated too many, dropping deleted chunks"""
+        for start in range(0, len(terms), SQL_BATCH_SIZE):
+            batch = terms[start:start + SQL_BATCH_SIZE]
+            placeholders = ",".join("?" * len(batch))
+            crowded = [row[0] for row in self.conn.execute(
+                f"SELECT term FROM postings WHERE term IN ({placeholders}) "
+                "GROUP BY term HAVING COUNT(*) > ?",
+                [*batch, MAX_SEGMENTS_PER_TERM]
+            )]
+            if not crowded:
+                continue
+
+            placeholders = ",".join("?" * len(crowded))
+            segments: Dict[str, List[Tuple[int, bytes, bytes]]] = {}
+            for term, segment, ordinals, tfs in self.conn.execute(
+                f"SELECT term, segment, ordinals, tfs FROM postings WHERE term IN ({placeholders}) "
+                "ORDER BY term, segment",
+                crowded
+            ):
+                segments.setdefault(term, []).append((segment, ordinals, tfs))
+
+            merged = []
+            for term, rows in segments.items():
+                ordinals = np.concatenate([np.frombuffer(row[1], dtype=np.uint32) for row in rows])
+                tfs = np.concatenate([np.frombuffer(row[2], dtype=np.uint16) for row in rows])
+                # Ordinals from the batch being added are past the end of the
+                # tombstone array and are always live
+                keep = np.ones(len(ordinals), dtype=bool)
+                known = ordinals < len(self._deleted)
+                keep[known] = ~self._deleted[ordinals[known]]
+                if keep.any():
+                    merged.append((term, rows[-1][0], ordinals[keep].tobytes(), tfs[keep].tobytes()))
+
+            self.conn.execute(f"DELETE FROM postings WHERE term IN ({placeholders})", crowded)
+            self.conn.executemany("INSERT INTO postings (term, segment, ordinals, tfs) VALUES (?, ?, ?, ?)", merged)
+
+    def _bump(self, key: str) -> int:
+        self.conn.execute("UPDATE meta SET value = value + 1 WHERE key = ?", (key,))
+        return self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()[0]
+
+    def _refresh(self) -> None:
+        """Apply chunks added or deleted by other processes since the last load"""
+        version = self.conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+        if version == self._loaded_version:
+            return
+        if version < self._loaded_version:
+            # The index was dropped and rebuilt
+            self._reset()
+        size = len(self._lengths)
+        # Chunks added since the last load, plus older chunks deleted since
+        rows = self.conn.execute(
+            "SELECT ordinal, length, deleted FROM chunks WHERE ordinal >= ? "
+            "UNION ALL SELECT ordinal, length, deleted FROM chunks WHERE deleted > ? AND ordinal < ?",
+            (size, max(self._loaded_version, 0), size)
+        ).fetchall()
+        if rows:
+            data = np.asarray(rows, dtype=np.int64)
+            ordinals, lengths, deleted = data[:, 0], data[:, 1], data[:, 2].astype(bool)
+            old = ordinals < size
+            # Deletions this process made are already applied
+            was_live = np.zeros(len(ordinals), dtype=bool)
+            was_live[old] = ~self._deleted[ordinals[old]]
+            newly_deleted = deleted & was_live
+            self._deleted[ordinals[newly_deleted]] = True
+            self._live_count -= int(newly_deleted.sum())
+            self._total_length -= int(lengths[newly_deleted].sum())
+            new = ~old
+            if new.any():
+                grown = int(ordinals[new].max()) + 1
+                self._lengths = np.concatenate([self._lengths, np.zeros(grown - size, dtype=np.float32)])
+                # Ordinals missing from the table count as deleted
+                self._deleted = np.concatenate([self._deleted, np.ones(grown - size, dtype=bool)])
+                self._lengths[ordinals[new]] = lengths[new]
+                self._deleted[ordinals[new]] = deleted[new]
+                live = new & ~deleted
+                self._live_count += int(live.sum())
+                self._total_length += int(lengths[live].sum())
+        self._loaded_version = version
+
+    def _reset(self) -> None:
+        """Forget the in-memory state; the next refresh reloads everything"""
+        self._lengths = np.zeros(0, dtype=np.float32)
+        self._deleted = np.zeros(0, dtype=bool)
+        self._live_count = 0
+        self._total_length = 0
+        self._loaded_version = -1
+
+    def _chunk_ids(self, ordinals: List[int]) -> Dict[int, str]:
+        placeholders = ",".join("?" * len(ordinals))
+        return dict(self.conn.execute(
+            f"SELECT ordinal, chunk_id FROM chunks WHERE ordinal IN ({placeholders})", ordinals
+        ).fetchall())
+
+
+def index_path(stack_id: UUID) -> str:
+    return os.path.join(settings.LEXICAL_INDEX_DIR, f"stack_{stack_id}", "bm25.sqlite3")
+
+
+_indexes: Dict[str, LexicalIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_lexical_index(stack_id: UUID) -> LexicalIndex:
+    """Get the shared handle to a stack's lexical index"""
+    key = str(stack_id)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = LexicalIndex(index_path(stack_id))
+        return index
+
+
+def drop_lexical_index(stack_id: UUID) -> None:
+    """Delete a stack's lexical index from disk"""
+    with _indexes_lock:
+        index = _indexes.pop(str(stack_id), None)
+    if index is not None:
+        index.close()
+    shutil.rmtree(os.path.dirname(index_path(stack_id)), ignore_errors=True)
+
+
+def close_lexical_indexes() -> None:
+    with _indexes_lock:
+        indexes = list(_indexes.values())
+        _indexes.clear()
+    for index in indexes:
+        index.close()
+
+
+def reciprocal_rank_fusion(
+    rankings: Iterable[Tuple[List[str], float]],
+    k: int = 60
+) -> List[Tuple[str, float]]:
+    """Fuse ranked id lists, each with a weight, into one ranking.
+
+    Each id scores sum(weight / (k + rank)) over the lists it appears in.
+    """
+    scores: Dict[str, float] = {}
+    for ids, weight in rankings:
+        if weight <= 0:
+            continue
+        for rank, id in enumerate(ids, start=1):
+            scores[id] = scores.get(id, 0.0) + weight / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
@@ -1,7 +1,6 @@
-from typing import Optional, List
-from openai import OpenAI
-import google.generativeai as genai
-from ..config import settings
+from typing import Optional, List, AsyncIterator
+from google.ai import generativelanguage as glm
+from .client_registry import get_client_registry
 
 
 class LLMService:
@@ -12,12 +11,20 @@ class LLMService:
         self.api_key = api_key
         
         if self.provider == "openai":
-            self.client = OpenAI(api_key=api_key or settings.OPENAI_API_KEY)
             self.model = model or "gpt-4o-mini"
         elif self.provider == "gemini":
-            genai.configure(api_key=api_key or settings.GOOGLE_API_KEY)
             self.model = model or "gemini-2.5-flash"
     
+    # Clients come from the shared registry on each use, so a long-lived
+    # service never pins a client the registry has evicted
+    @property
+    def client(self):
+        return get_client_registry().openai(self.api_key)
+    
+    @property
+    def async_client(self):
+        return get_client_registry().async_openai(self.api_key)
+    
     def generate_response(
         self, 
         query: str, 
@@ -33,6 +40,39 @@ class LLMService:
         else:
             raise ValueError(f"Unsupported provider: {self.provider}")
     
+    async def agenerate_response(
+        self, 
+        query: str, 
+        context: Optional[str] = None,
+        system_prompt: Optional[str] = None,
+        temperature: float = 0.7
+    ) -> str:
+        """Generate a response from the LLM without blocking the event loop"""
+        if self.provider == "openai":
+            return await self._openai_response_async(query, context, system_prompt, temperature)
+        elif self.provider == "gemini":
+            return await self._gemini_response_async(query, context, system_prompt, temperature)
+        else:
+            raise ValueError(f"Unsupported provider: {self.provider}")
+    
+    async def astream_response(
+        self, 
+        query: str, 
+        context: Optional[str] = None,
+        system_prompt: Optional[str] = None,
+        temperature: float = 0.7
+    ) -> AsyncIterator[str]:
+        """Stream the LLM response as text deltas"""
+        if self.provider == "openai":
+            stream = self._openai_stream(query, context, system_prompt, temperature)
+        elif self.provider == "gemini":
+            stream = self._gemini_stream(query, context, system_prompt, temperature)
+        else:
+            raise ValueError(f"Unsupported provider: {self.provider}")
+        
+        async for delta in stream:
+            yield delta
+    
     def _build_prompt(self, query: str, context: Optional[str], system_prompt: Optional[str]) -> str:
         """Build the full prompt with context and query"""
         prompt_parts = []
@@ -50,28 +90,77 @@ class LLMService:
         
         return "\n".join(prompt_parts)
     
-    def _openai_response(
+    def _user_message(self, query: str, context: Optional[str]) -> str:
+        """Build the user message with context if provided"""
+        if context:
+            return f"Context:\n{context}\n\nQuery: {query}"
+        return query
+    
+    def _openai_messages(
         self, 
         query: str, 
         context: Optional[str], 
-        system_prompt: Optional[str],
-        temperature: float
-    ) -> str:
-        """Generate response using OpenAI"""
+        system_prompt: Optional[str]
+    ) -> List[dict]:
         messages = []
         
         if system_prompt:
             messages.append({"role": "system", "content": system_prompt})
         
-        user_content = query
-        if context:
-            user_content = f"Context:\n{context}\n\nQuery: {query}"
-        
-        messages.append({"role": "user", "content": user_content})
-        
+        messages.append({"role": "user", "content": self._user_message(query, context)})
+        return messages
+    
+    def _gemini_request(
+        self,
+        query: str,
+        context: Optional[str],
+        system_prompt: Optional[str],
+        temperature: float
+    ) -> glm.GenerateContentRequest:
+        # Requests go straight to the per-key pooled service clients:
+        # genai.GenerativeModel only uses the process-global genai.configure
+        model = self.model if self.model.startswith("models/") else f"models/{self.model}"
+        request = glm.GenerateContentRequest(
+            model=model,
+            contents=[glm.Content(role="user", parts=[glm.Part(text=self._user_message(query, context))])],
+            generation_config=glm.GenerationConfig(temperature=temperature)
+        )
+        if system_prompt:
+            request.system_instruction = glm.Content(parts=[glm.Part(text=system_prompt)])
+        return request
+    
+    @staticmethod
+    def _gemini_text(response: glm.GenerateContentResponse) -> str:
+        if not response.candidates or not response.candidates[0].content.parts:
+            raise ValueError(f"Gemini returned no text: {response.prompt_feedback}")
+        return "".join(part.text for part in response.candidates[0].content.parts)
+    
+    def _openai_response(
+        self, 
+        query: str, 
+        context: Optional[str], 
+        system_prompt: Optional[str],
+        temperature: float
+    ) -> str:
+        """Generate response using OpenAI"""
         response = self.client.chat.completions.create(
             model=self.model,
-            messages=messages,
+            messages=self._openai_messages(query, context, system_prompt),
+            temperature=temperature
+        )
+        return response.choices[0].message.content
+    
+    async def _openai_response_async(
+        self, 
+        query: str, 
+        context: Optional[str], 
+        system_prompt: Optional[str],
+        temperature: float
+    ) -> str:
+        """Generate response using the async OpenAI client"""
+        response = await self.async_client.chat.completions.create(
+            model=self.model,
+            messages=self._openai_messages(query, context, system_prompt),
             temperature=temperature
         )
         return response.choices[0].message.content
@@ -84,22 +173,54 @@ class LLMService:
         temperature: float
     ) -> str:
         """Generate response using Gemini"""
-        # Build model initialization parameters
-        model_params = {
-            "model_name": self.model,
-            "generation_config": genai.types.GenerationConfig(temperature=temperature)
-        }
-        
-        # Add system instruction if provided
-        if system_prompt:
-            model_params["system_instruction"] = system_prompt
-        
-        model = genai.GenerativeModel(**model_params)
-        
-        # Build user message with context if provided
-        user_message = query
-        if context:
-            user_message = f"Context:\n{context}\n\nQuery: {query}"
-        
-        response = model.generate_content(user_message)
-        return response.text
+        response = get_client_registry().gemini(self.api_key).generate_content(
+            request=self._gemini_request(query, context, system_prompt, temperature)
+        )
+        return self._gemini_text(response)
+    
+    async def _gemini_response_async(
+        self, 
+        query: str, 
+        context: Optional[str], 
+        system_prompt: Optional[str],
+        temperature: float
+    ) -> str:
+        """Generate response using Gemini's async API"""
+        response = await get_client_registry().gemini_async(self.api_key).generate_content(
+            request=self._gemini_request(query, context, system_prompt, temperature)
+        )
+        return self._gemini_text(response)
+    
+    async def _openai_stream(
+        self, 
+        query: str, 
+        context: Optional[str], 
+        system_prompt: Optional[str],
+        temperature: float
+    ) -> AsyncIterator[str]:
+        """Stream response deltas using OpenAI"""
+        stream = await self.async_client.chat.completions.create(
+            model=self.model,
+            messages=self._openai_messages(query, context, system_prompt),
+            temperature=temperature,
+            stream=True
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    
+    async def _gemini_stream(
+        self, 
+        query: str, 
+        context: Optional[str], 
+        system_prompt: Optional[str],
+        temperature: float
+    ) -> AsyncIterator[str]:
+        """Stream response deltas using Gemini"""
+        stream = await get_client_registry().gemini_async(self.api_key).stream_generate_content(
+            request=self._gemini_request(query, context, system_prompt, temperature)
+        )
+        async for chunk in stream:
+            # Chunks without text parts (e.g. safety metadata) carry no delta
+            if chunk.candidates and chunk.candidates[0].content.parts:
+                yield "".join(part.text for part in chunk.candidates[0].content.parts)
@@ -0,0 +1,52 @@
+import threading
+from typing import Any, Dict, Optional
+
+# Parts of an LLM prompt that are measured separately
+PROMPT_SECTIONS = ("system", "workflow", "history", "documents", "web", "query")
+
+
+class PromptMetrics:
+    """Running totals of prompt size per section and of LLM call latency.
+
+    Sizes are in tokens, counted with the chunking tokenizer, so they are
+    exact for OpenAI models and an approximation otherwise.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.llm_seconds = 0.0
+        self.tokens: Dict[str, int] = {section: 0 for section in PROMPT_SECTIONS}
+        self.max_total = 0
+
+    def record(self, sections: Dict[str, int], llm_seconds: float) -> None:
+        with self._lock:
+            self.requests += 1
+            self.llm_seconds += llm_seconds
+            for section, tokens in sections.items():
+                self.tokens[section] = self.tokens.get(section, 0) + tokens
+            self.max_total = max(self.max_total, sum(sections.values()))
+
+    def stats(self) -> Dict[str, Any]:
+        requests = self.requests or 1
+        total = sum(self.tokens.values())
+        return {
+            "requests": self.requests,
+            "avg_tokens": {section: round(tokens / requests, 1) for section, tokens in self.tokens.items()},
+            "avg_total_tokens": round(total / requests, 1),
+            "max_total_tokens": self.max_total,
+            "avg_llm_seconds": round(self.llm_seconds / requests, 3)
+        }
+
+
+_metrics: Optional[PromptMetrics] = None
+_metrics_lock = threading.Lock()
+
+
+def get_prompt_metrics() -> PromptMetrics:
+    global _metrics
+    if _metrics is None:
+        with _metrics_lock:
+            if _metrics is None:
+                _metrics = PromptMetrics()
+    return _metrics
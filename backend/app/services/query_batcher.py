@@ -0,0 +1,155 @@
+import asyncio
+import hashlib
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple
+from .embedding_service import EmbeddingService
+from .vector_store_service import VectorStoreService
+from ..config import settings
+
+# Per-query fields of a multi-query search result
+RESULT_KEYS = ("ids", "documents", "metadatas", "distances")
+
+
+@dataclass
+class _Lookup:
+    """One knowledge-base lookup waiting for the batch it was coalesced into"""
+    query: str
+    n_results: int
+    embedding_service: EmbeddingService
+    vector_store: VectorStoreService
+    future: asyncio.Future = field(repr=False)
+
+
+class QueryBatcher:
+    """Coalesces concurrent knowledge-base lookups into batched calls.
+
+    Lookups arriving within a short window are embedded with one request per
+    provider and key, then searched with one multi-query call per collection
+    (and partition). Each caller gets back a single-query result shaped like
+    VectorStoreService.query().
+    """
+
+    def __init__(
+        self,
+        window: float = settings.QUERY_BATCH_WINDOW_MS / 1000,
+        max_batch_size: int = settings.QUERY_BATCH_MAX_SIZE
+    ):
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self._pending: List[_Lookup] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # The event loop holds only weak references to tasks
+        self._tasks: Set[asyncio.Task] = set()
+        self.batches = 0
+        self.lookups = 0
+        self.embedding_calls = 0
+        self.search_calls = 0
+
+    async def query(
+        self,
+        embedding_service: EmbeddingService,
+        vector_store: VectorStoreService,
+        query: str,
+        n_results: int
+    ) -> Dict[str, Any]:
+        """Embed a query and search a vector store, batched with concurrent lookups"""
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Pending lookups belong to the loop that created them
+            self._loop = loop
+            self._pending = []
+            self._timer = None
+        lookup = _Lookup(query, n_results, embedding_service, vector_store, loop.create_future())
+        self._pending.append(lookup)
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await lookup.future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            self.batches += 1
+            self.lookups += len(batch)
+            task = asyncio.ensure_future(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[_Lookup]) -> None:
+        embedding_groups: Dict[Tuple[str, str], List[_Lookup]] = {}
+        for lookup in batch:
+            service = lookup.embedding_service
+            key = (service.provider, hashlib.sha256((service.api_key or "").encode("utf-8")).hexdigest())
+            embedding_groups.setdefault(key, []).append(lookup)
+        embeddings = await asyncio.gather(
+            *(self._embed(group) for group in embedding_groups.values()),
+            return_exceptions=True
+        )
+
+        search_groups: Dict[Tuple, List[Tuple[_Lookup, List[float]]]] = {}
+        for group, result in zip(embedding_groups.values(), embeddings):
+            if isinstance(result, BaseException):
+                self._fail(group, result)
+                continue
+            for lookup, embedding in zip(group, result):
+                search_groups.setdefault(lookup.vector_store.batch_key, []).append((lookup, embedding))
+        await asyncio.gather(*(self._search(group) for group in search_groups.values()))
+
+    async def _embed(self, group: List[_Lookup]) -> List[List[float]]:
+        self.embedding_calls += 1
+        return await group[0].embedding_service.agenerate_embeddings([lookup.query for lookup in group])
+
+    async def _search(self, group: List[Tuple[_Lookup, List[float]]]) -> None:
+        lookups = [lookup for lookup, _ in group]
+        n_results = max(lookup.n_results for lookup in lookups)
+        self.search_calls += 1
+        try:
+            # Chroma is blocking, keep it off the event loop
+            results = await asyncio.to_thread(
+                lookups[0].vector_store.query_many,
+                [embedding for _, embedding in group],
+                n_results=n_results
+            )
+        except Exception as e:
+            self._fail(lookups, e)
+            return
+        for i, lookup in enumerate(lookups):
+            if not lookup.future.done():
+                lookup.future.set_result({
+                    key: [results[key][i][:lookup.n_results]]
+                    for key in RESULT_KEYS
+                    if results.get(key) is not None
+                })
+
+    @staticmethod
+    def _fail(lookups: List[_Lookup], error: BaseException) -> None:
+        for lookup in lookups:
+            if not lookup.future.done():
+                lookup.future.set_exception(error)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "lookups": self.lookups,
+            "avg_batch_size": self.lookups / self.batches if self.batches else 0.0,
+            "embedding_calls": self.embedding_calls,
+            "search_calls": self.search_calls
+        }
+
+
+_batcher: Optional[QueryBatcher] = None
+
+
+def get_query_batcher() -> Optional[QueryBatcher]:
+    """Get the process-wide query batcher, or None when batching is disabled"""
+    global _batcher
+    if settings.QUERY_BATCH_WINDOW_MS <= 0:
+        return None
+    if _batcher is None:
+        _batcher = QueryBatcher()
+    return _batcher
@@ -0,0 +1,156 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+import numpy as np
+from ..config import settings
+
+
+@dataclass
+class _Bucket:
+    """Cached answers for one stack and workflow version"""
+    vectors: np.ndarray  # (n, dim) unit-normalized query embeddings
+    answers: List[str] = field(default_factory=list)
+    expires_at: List[float] = field(default_factory=list)
+    latencies: List[float] = field(default_factory=list)
+
+
+class ResponseCache:
+    """Semantic cache of full workflow answers.
+
+    Answers are stored per (stack, workflow hash) with the embedding of the
+    query that produced them. A new query reuses the answer of the most
+    similar earlier query when their cosine similarity clears the threshold.
+    Only the latest workflow version of a stack is kept, and the least
+    recently used stacks are dropped beyond `max_stacks`.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = settings.RESPONSE_CACHE_MAX_ENTRIES,
+        ttl: float = settings.RESPONSE_CACHE_TTL,
+        max_stacks: int = settings.RESPONSE_CACHE_MAX_STACKS
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_stacks = max_stacks
+        self._buckets: "OrderedDict[Tuple[str, str], _Bucket]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(
+        self,
+        stack_id: UUID,
+        workflow_hash: str,
+        embedding: List[float],
+        threshold: float
+    ) -> Optional[str]:
+        """Answer of the most similar cached query, if it is similar enough"""
+        vector = self._normalize(embedding)
+        with self._lock:
+            key = (str(stack_id), workflow_hash)
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                self._buckets.move_to_end(key)
+                self._expire(bucket)
+            if bucket is None or not bucket.answers or bucket.vectors.shape[1] != vector.shape[0]:
+                self.misses += 1
+                return None
+            similarities = bucket.vectors @ vector
+            best = int(np.argmax(similarities))
+            if similarities[best] < threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.saved_seconds += bucket.latencies[best]
+            return bucket.answers[best]
+
+    def store(
+        self,
+        stack_id: UUID,
+        workflow_hash: str,
+        embedding: List[float],
+        answer: str,
+        latency: float
+    ) -> None:
+        vector = self._normalize(embedding)
+        key = (str(stack_id), workflow_hash)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None or bucket.vectors.shape[1] != vector.shape[0]:
+                # Answers of the stack's other workflow versions won't be asked for again
+                for other in [other for other in self._buckets if other[0] == key[0]]:
+                    del self._buckets[other]
+                bucket = self._buckets[key] = _Bucket(vectors=np.empty((0, vector.shape[0]), dtype=np.float32))
+                while len(self._buckets) > self.max_stacks:
+                    self._buckets.popitem(last=False)
+            self._buckets.move_to_end(key)
+            bucket.vectors = np.vstack([bucket.vectors, vector])
+            bucket.answers.append(answer)
+            bucket.expires_at.append(time.monotonic() + self.ttl)
+            bucket.latencies.append(latency)
+            # Oldest entries go first once the bucket is full
+            excess = len(bucket.answers) - self.max_entries
+            if excess > 0:
+                self._drop(bucket, slice(0, excess))
+
+    def invalidate_stack(self, stack_id: UUID) -> None:
+        """Forget every cached answer for a stack, e.g. after its documents change"""
+        with self._lock:
+            for key in [key for key in self._buckets if key[0] == str(stack_id)]:
+                del self._buckets[key]
+
+    def _expire(self, bucket: _Bucket) -> None:
+        now = time.monotonic()
+        live = [i for i, expires_at in enumerate(bucket.expires_at) if expires_at >= now]
+        if len(live) < len(bucket.expires_at):
+            bucket.vectors = bucket.vectors[live]
+            bucket.answers = [bucket.answers[i] for i in live]
+            bucket.expires_at = [bucket.expires_at[i] for i in live]
+            bucket.latencies = [bucket.latencies[i] for i in live]
+
+    @staticmethod
+    def _drop(bucket: _Bucket, dropped: slice) -> None:
+        bucket.vectors = np.delete(bucket.vectors, dropped, axis=0)
+        del bucket.answers[dropped]
+        del bucket.expires_at[dropped]
+        del bucket.latencies[dropped]
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "stacks": len(self._buckets),
+            "entries": sum(len(bucket.answers) for bucket in self._buckets.values()),
+            "saved_seconds": round(self.saved_seconds, 3)
+        }
+
+
+_cache: Optional[ResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """Get the process-wide response cache; stacks opt in through their LLM node config"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache()
+    return _cache
+
+
+def invalidate_stack_responses(stack_id: UUID) -> None:
+    get_response_cache().invalidate_stack(stack_id)
@@ -0,0 +1,113 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+from uuid import UUID
+from ..config import settings
+
+
+@dataclass
+class _Entry:
+    value: Any
+    expires_at: float
+    latency: float  # seconds the original retrieval took
+
+
+class RetrievalCache:
+    """LRU + TTL cache of knowledge-base retrieval results.
+
+    Keys include a per-stack collection version that is bumped whenever the
+    stack's documents change, so stale results are never served after an
+    ingestion or deletion in this process; the TTL bounds staleness for
+    changes made by other processes.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = settings.RETRIEVAL_CACHE_MAX_ENTRIES,
+        ttl: float = settings.RETRIEVAL_CACHE_TTL
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple, _Entry]" = OrderedDict()
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        return " ".join(query.lower().split())
+
+    def version(self, stack_id: UUID) -> int:
+        return self._versions.get(str(stack_id), 0)
+
+    def bump_version(self, stack_id: UUID) -> None:
+        """Invalidate every cached result for a stack"""
+        with self._lock:
+            key = str(stack_id)
+            self._versions[key] = self._versions.get(key, 0) + 1
+
+    def make_key(self, stack_id: UUID, query: str, n_results: int, options: Tuple = ()) -> Tuple:
+        """Cache key; options holds any retrieval settings that change the results"""
+        return (str(stack_id), self.version(stack_id), self.normalize_query(query), n_results, options)
+
+    def get(self, key: Tuple) -> Tuple[bool, Any]:
+        """Return (found, value); a cached value may itself be None (no matches)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires_at < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.saved_seconds += entry.latency
+            return True, entry.value
+
+    def put(self, key: Tuple, value: Any, latency: float) -> None:
+        with self._lock:
+            # Drop results computed against a collection version that has
+            # since been bumped
+            if key[1] != self._versions.get(key[0], 0):
+                return
+            self._entries[key] = _Entry(value, time.monotonic() + self.ttl, latency)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "saved_seconds": round(self.saved_seconds, 3)
+        }
+
+
+_cache: Optional[RetrievalCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_retrieval_cache() -> Optional[RetrievalCache]:
+    """Get the process-wide retrieval cache, or None when caching is disabled"""
+    global _cache
+    if not settings.RETRIEVAL_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = RetrievalCache()
+    return _cache
+
+
+def invalidate_stack_retrievals(stack_id: UUID) -> None:
+    """Bump a stack's collection version after its documents change"""
+    cache = get_retrieval_cache()
+    if cache is not None:
+        cache.bump_version(stack_id)
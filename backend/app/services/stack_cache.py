@@ -0,0 +1,247 @@
+import asyncio
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Optional
+from uuid import UUID
+from sqlalchemy import select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession
+from .response_cache import invalidate_stack_responses
+from .retrieval_cache import invalidate_stack_retrievals
+from .workflow_compiler import workflow_plan_cache
+from ..config import settings
+from ..database import ASYNC_DATABASE_URL, AsyncSessionLocal
+from ..models.stack import Stack
+from ..repositories.stack_repository import AsyncStackRepository
+from ..stack_events import STACK_CHANGES_CHANNEL, add_stack_change_listener
+
+try:
+    import asyncpg
+except ImportError:
+    asyncpg = None
+
+# Ids per polling query
+POLL_BATCH_SIZE = 500
+
+
+@dataclass(frozen=True)
+class CachedStack:
+    """Snapshot of a Stack row; workflow_data is shared between requests and
+    must not be modified"""
+    id: UUID
+    name: str
+    description: Optional[str]
+    workflow_data: Optional[Dict[str, Any]]
+    created_at: Optional[datetime]
+    updated_at: Optional[datetime]
+
+    @classmethod
+    def from_row(cls, stack: Stack) -> "CachedStack":
+        return cls(
+            id=stack.id,
+            name=stack.name,
+            description=stack.description,
+            workflow_data=stack.workflow_data,
+            created_at=stack.created_at,
+            updated_at=stack.updated_at
+        )
+
+
+class StackCache:
+    """Read-through LRU cache of stacks for the chat and upload paths.
+
+    Writes through the stack repositories invalidate the local entry as soon
+    as they commit. Other processes learn about changes from PostgreSQL
+    LISTEN/NOTIFY; when that is unavailable (SQLite, asyncpg missing,
+    connection lost) a background task instead compares the cached rows'
+    updated_at with the database every poll interval, which also catches
+    deleted stacks.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = settings.STACK_CACHE_MAX_ENTRIES,
+        poll_interval: float = settings.STACK_CACHE_POLL_INTERVAL
+    ):
+        self.max_entries = max_entries
+        self.poll_interval = poll_interval
+        self._entries: "OrderedDict[UUID, CachedStack]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by every invalidation so a load that raced one is not stored
+        self._version = 0
+        self._task: Optional[asyncio.Task] = None
+        self._listener = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.polls = 0
+
+    def get(self, stack_id: UUID) -> Optional[CachedStack]:
+        with self._lock:
+            stack = self._entries.get(stack_id)
+            if stack is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(stack_id)
+            self.hits += 1
+            return stack
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def put(self, stack: Stack, version: int) -> CachedStack:
+        """Cache a freshly loaded row, unless something was invalidated since
+        `version` was read"""
+        cached = CachedStack.from_row(stack)
+        if self.max_entries <= 0:
+            return cached
+        with self._lock:
+            if version == self._version:
+                self._entries[cached.id] = cached
+                self._entries.move_to_end(cached.id)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return cached
+
+    def invalidate(self, stack_id: UUID) -> None:
+        with self._lock:
+            self._version += 1
+            self.invalidations += 1
+            self._entries.pop(stack_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._version += 1
+            self._entries.clear()
+
+    def start(self) -> None:
+        if self.max_entries > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self._close_listener()
+
+    async def _run(self) -> None:
+        while True:
+            if not await self._listening():
+                try:
+                    await self._poll()
+                except Exception as e:
+                    print(f"Stack cache poll failed: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+    async def _listening(self) -> bool:
+        """Keep a LISTEN connection open; False when changes must be polled for"""
+        url = make_url(ASYNC_DATABASE_URL)
+        if asyncpg is None or url.get_backend_name() != "postgresql":
+            return False
+        if self._listener is not None:
+            try:
+                await self._listener.fetchval("SELECT 1")
+                return True
+            except Exception as e:
+                print(f"Stack change listener lost its connection: {e}")
+                await self._close_listener()
+        try:
+            self._listener = await asyncpg.connect(
+                url.set(drivername="postgresql").render_as_string(hide_password=False)
+            )
+            await self._listener.add_listener(STACK_CHANGES_CHANNEL, self._on_notify)
+        except Exception as e:
+            print(f"Stack change listener unavailable, polling instead: {e}")
+            await self._close_listener()
+            return False
+        # Notifications sent while nobody was listening are lost
+        self.clear()
+        return True
+
+    async def _close_listener(self) -> None:
+        listener, self._listener = self._listener, None
+        if listener is not None:
+            try:
+                await listener.close(timeout=5)
+            except Exception:
+                listener.terminate()
+
+    def _on_notify(self, connection, pid, channel, payload) -> None:
+        try:
+            stack_id = UUID(payload)
+        except ValueError:
+            return
+        forget_stack(stack_id)
+
+    async def _poll(self) -> None:
+        with self._lock:
+            cached = list(self._entries.values())
+        if not cached:
+            return
+        self.polls += 1
+        current: Dict[UUID, Optional[datetime]] = {}
+        async with AsyncSessionLocal() as db:
+            for start in range(0, len(cached), POLL_BATCH_SIZE):
+                ids = [stack.id for stack in cached[start:start + POLL_BATCH_SIZE]]
+                rows = await db.execute(select(Stack.id, Stack.updated_at).where(Stack.id.in_(ids)))
+                current.update(rows.tuples().all())
+        for stack in cached:
+            if stack.id not in current or current[stack.id] != stack.updated_at:
+                forget_stack(stack.id)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "listening": self._listener is not None,
+            "polls": self.polls
+        }
+
+
+_cache: Optional[StackCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_stack_cache() -> StackCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = StackCache()
+    return _cache
+
+
+async def stop_stack_cache() -> None:
+    if _cache is not None:
+        await _cache.stop()
+
+
+async def get_cached_stack(db: AsyncSession, stack_id: UUID) -> Optional[CachedStack]:
+    """Stack snapshot from the stack cache, loaded on a miss"""
+    cache = get_stack_cache()
+    stack = cache.get(stack_id)
+    if stack is None:
+        version = cache.version
+        row = await AsyncStackRepository(db).get_by_id(stack_id)
+        stack = cache.put(row, version) if row is not None else None
+    return stack
+
+
+def forget_stack(stack_id: UUID) -> None:
+    """Drop everything this process caches for a stack, after a change to the
+    stack itself or to its documents"""
+    get_stack_cache().invalidate(stack_id)
+    workflow_plan_cache.invalidate(stack_id)
+    invalidate_stack_retrievals(stack_id)
+    invalidate_stack_responses(stack_id)
+
+
+add_stack_change_listener(forget_stack)
@@ -0,0 +1,575 @@
+import fcntl
+import json
+import os
+import shutil
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+from uuid import UUID
+import numpy as np
+from .client_registry import get_client_registry
+from ..config import settings
+
+Where = Optional[Dict[str, Any]]
+
+# Rows scored per matrix product, bounding the temporary score buffer
+SEARCH_BLOCK_ROWS = 8192
+# Deleted rows are compacted away once they outnumber live rows and exceed this
+COMPACT_MIN_DELETED = 1024
+SQL_BATCH_SIZE = 500
+QUANTIZATIONS = ("float32", "int8")
+
+
+class VectorBackend(ABC):
+    """Storage and nearest-neighbour search for one collection of chunks.
+
+    Results use Chroma's shapes: get() returns {"ids": [...], <include>: [...]}
+    and query() returns one list per query embedding under each key. Metadata
+    filters use Chroma's where syntax (equality, $eq, $ne, $in, $and, $or).
+    """
+
+    @abstractmethod
+    def upsert(
+        self,
+        ids: List[str],
+        documents: List[str],
+        embeddings: List[List[float]],
+        metadatas: Optional[List[Dict[str, Any]]]
+    ) -> None:
+        pass
+
+    @abstractmethod
+    def update(self, ids: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        pass
+
+    @abstractmethod
+    def get(
+        self,
+        ids: Optional[List[str]] = None,
+        where: Where = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        include: Sequence[str] = ("documents", "metadatas")
+    ) -> Dict[str, Any]:
+        pass
+
+    @abstractmethod
+    def query(
+        self,
+        query_embeddings: List[List[float]],
+        n_results: int,
+        where: Where = None,
+        include: Sequence[str] = ("documents", "metadatas", "distances")
+    ) -> Dict[str, Any]:
+        pass
+
+    @abstractmethod
+    def delete(self, ids: Optional[List[str]] = None, where: Where = None) -> None:
+        pass
+
+    @abstractmethod
+    def count(self) -> int:
+        pass
+
+    @abstractmethod
+    def drop(self) -> None:
+        """Delete the whole collection"""
+        pass
+
+
+class ChromaBackend(VectorBackend):
+    """A collection in the shared ChromaDB client (HNSW, cosine space)"""
+
+    def __init__(self, collection_name: str):
+        self.client = get_client_registry().chroma()
+        self.collection_name = collection_name
+        self._collection = None
+
+    @property
+    def collection(self):
+        if self._collection is None:
+            self._collection = self.client.get_or_create_collection(
+                name=self.collection_name,
+                metadata={"hnsw:space": "cosine"}
+            )
+        return self._collection
+
+    def upsert(self, ids, documents, embeddings, metadatas):
+        self.collection.upsert(ids=ids, documents=documents, embeddings=embeddings, metadatas=metadatas)
+
+    def update(self, ids, metadatas):
+        self.collection.update(ids=ids, metadatas=metadatas)
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=("documents", "metadatas")):
+        return self.collection.get(ids=ids, where=where, limit=limit, offset=offset, include=list(include))
+
+    def query(self, query_embeddings, n_results, where=None, include=("documents", "metadatas", "distances")):
+        return self.collection.query(
+            query_embeddings=query_embeddings,
+            n_results=n_results,
+            where=where,
+            include=list(include)
+        )
+
+    def delete(self, ids=None, where=None):
+        self.collection.delete(ids=ids, where=where)
+
+    def count(self):
+        return self.collection.count()
+
+    def drop(self):
+        self.client.delete_collection(self.collection_name)
+        self._collection = None
+
+
+def matches(metadata: Dict[str, Any], where: Where) -> bool:
+    """Evaluate a Chroma-style where filter against one record's metadata"""
+    if not where:
+        return True
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(matches(metadata, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for operator, operand in condition.items():
+                if operator == "$eq" and value != operand:
+                    return False
+                if operator == "$ne" and value == operand:
+                    return False
+                if operator == "$in" and value not in operand:
+                    return False
+                if operator == "$nin" and value in operand:
+                    return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+class NumpyVectorIndex(VectorBackend):
+    """Exact brute-force search over memory-mapped embeddings.
+
+    Vectors are unit-normalized and appended as raw rows to a flat file that
+    is mapped with np.memmap, so opening an index copies nothing; scoring is
+    a blocked matrix product with argpartition top-k. With int8 quantization
+    each row is stored as int8 codes plus a float32 scale, a quarter of the
+    size of float32 rows.
+
+    Ids, texts and metadata live in SQLite; ids and metadata are also held in
+    memory for filtering. Replaced and deleted rows are tombstoned and
+    compacted into a new file generation once they outnumber live rows.
+
+    Several processes, including pods sharing the directory over a network
+    filesystem, may use one index. Writers serialize on an exclusive flock
+    of `write.lock`, and every write bumps a version in SQLite that makes
+    other processes reload their in-memory state before their next read or
+    write. The records database uses a rollback journal, since WAL needs
+    memory shared between its processes.
+    """
+
+    def __init__(self, path: str, quantization: str = "float32"):
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unsupported quantization: {quantization}")
+        self.path = path
+        self.quantization = quantization
+        self.dtype = np.int8 if quantization == "int8" else np.float32
+        self._lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._version = -1
+        self._dim = 0
+        self._generation = 0
+        self._ids: List[Optional[str]] = []
+        self._metadatas: List[Optional[Dict[str, Any]]] = []
+        self._rows: Dict[str, int] = {}
+        self._live = np.zeros(0, dtype=bool)
+        self._vectors: Optional[np.ndarray] = None
+        self._scales: Optional[np.ndarray] = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(self.path, exist_ok=True)
+            conn = sqlite3.connect(os.path.join(self.path, "records.sqlite3"), check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=DELETE")
+            conn.executescript(
+                "CREATE TABLE IF NOT EXISTS records ("
+                " row INTEGER PRIMARY KEY, id TEXT NOT NULL, document TEXT,"
+                " metadata TEXT NOT NULL, deleted INTEGER NOT NULL DEFAULT 0);"
+                "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);"
+                "INSERT OR IGNORE INTO meta VALUES ('dim', 0), ('generation', 0), ('version', 0);"
+            )
+            self._conn = conn
+        return self._conn
+
+    def _file(self, name: str, generation: Optional[int] = None) -> str:
+        generation = self._generation if generation is None else generation
+        return os.path.join(self.path, f"{name}.{generation}.bin")
+
+    def _refresh(self) -> None:
+        """Reload ids, metadata and the vector mapping if the index changed
+        since this process last read or wrote it"""
+        version = self.conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+        if version == self._version:
+            return
+        # One read transaction, so meta and records come from the same commit
+        self.conn.execute("BEGIN")
+        try:
+            meta = dict(self.conn.execute("SELECT key, value FROM meta").fetchall())
+            rows = self.conn.execute("SELECT row, id, metadata, deleted FROM records ORDER BY row").fetchall()
+        finally:
+            self.conn.commit()
+        self._dim = meta["dim"]
+        self._generation = meta["generation"]
+        size = rows[-1][0] + 1 if rows else 0
+        self._ids = [None] * size
+        self._metadatas = [None] * size
+        self._live = np.zeros(size, dtype=bool)
+        self._rows = {}
+        for row, id, metadata, deleted in rows:
+            if not deleted:
+                self._ids[row] = id
+                self._metadatas[row] = json.loads(metadata)
+                self._live[row] = True
+                self._rows[id] = row
+        self._map(size)
+        self._version = meta["version"]
+
+    @contextmanager
+    def _writing(self) -> Iterator[None]:
+        """Hold the cross-process writer lock with up-to-date in-memory state"""
+        with self._lock:
+            os.makedirs(self.path, exist_ok=True)
+            fd = os.open(os.path.join(self.path, "write.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                self._refresh()
+                yield
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
+
+    def _commit(self) -> None:
+        """Commit a write and bump the version other processes reload on"""
+        self.conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+        version = self.conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+        self.conn.commit()
+        self._version = version
+
+    def _map(self, size: int) -> None:
+        """Map the first `size` rows of the vector files; bytes past them are
+        left over from an interrupted write and are ignored"""
+        if size == 0 or self._dim == 0:
+            self._vectors = np.zeros((0, self._dim), dtype=self.dtype)
+            self._scales = np.zeros(0, dtype=np.float32)
+            return
+        self._vectors = np.memmap(self._file("vectors"), dtype=self.dtype, mode="r", shape=(size, self._dim))
+        self._scales = (
+            np.memmap(self._file("scales"), dtype=np.float32, mode="r", shape=(size,))
+            if self.quantization == "int8" else None
+        )
+
+    def _encode(self, embeddings: List[List[float]]) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+        if self.quantization == "float32":
+            return vectors, None
+        scales = np.abs(vectors).max(axis=1) / 127
+        scales[scales == 0] = 1
+        codes = np.round(vectors / scales[:, None]).astype(np.int8)
+        return codes, scales.astype(np.float32)
+
+    def _decode(self, rows: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(self._vectors[rows], dtype=np.float32)
+        if self.quantization == "int8":
+            vectors *= self._scales[rows][:, None]
+        return vectors
+
+    @staticmethod
+    def _append(path: str, size: int, data: np.ndarray) -> None:
+        row_bytes = data.itemsize * (data.shape[1] if data.ndim > 1 else 1)
+        with open(path, "ab") as f:
+            f.truncate(size * row_bytes)
+            f.write(data.tobytes())
+
+    def upsert(self, ids, documents, embeddings, metadatas):
+        if not ids:
+            return
+        metadatas = metadatas or [{} for _ in ids]
+        vectors, scales = self._encode(embeddings)
+        with self._writing():
+            if self._dim == 0:
+                self._dim = vectors.shape[1]
+                self.conn.execute("UPDATE meta SET value = ? WHERE key = 'dim'", (self._dim,))
+            elif vectors.shape[1] != self._dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match index dimension {self._dim}")
+
+            # Within a batch the last occurrence of an id wins, as in Chroma
+            latest = {id: i for i, id in enumerate(ids)}
+            keep = sorted(latest.values())
+            replaced = [self._rows[id] for id in latest if id in self._rows]
+            start = len(self._ids)
+            self._append(self._file("vectors"), start, vectors[keep])
+            if scales is not None:
+                self._append(self._file("scales"), start, scales[keep])
+
+            if replaced:
+                self._tombstone(replaced)
+            self.conn.executemany(
+                "INSERT INTO records (row, id, document, metadata) VALUES (?, ?, ?, ?)",
+                [
+                    (start + n, ids[i], documents[i], json.dumps(metadatas[i] or {}))
+                    for n, i in enumerate(keep)
+                ]
+            )
+            self._commit()
+
+            for n, i in enumerate(keep):
+                self._ids.append(ids[i])
+                self._metadatas.append(metadatas[i] or {})
+                self._rows[ids[i]] = start + n
+            self._live = np.concatenate([self._live, np.ones(len(keep), dtype=bool)])
+            self._map(len(self._ids))
+            self._maybe_compact()
+
+    def update(self, ids, metadatas):
+        with self._writing():
+            updates = [
+                (json.dumps(metadata or {}), self._rows[id])
+                for id, metadata in zip(ids, metadatas) if id in self._rows
+            ]
+            self.conn.executemany("UPDATE records SET metadata = ? WHERE row = ?", updates)
+            self._commit()
+            for id, metadata in zip(ids, metadatas):
+                if id in self._rows:
+                    self._metadatas[self._rows[id]] = metadata or {}
+
+    def _select(self, ids: Optional[List[str]], where: Where) -> List[int]:
+        """Live rows matching ids and filter, in insertion order"""
+        if ids is not None:
+            rows = sorted(self._rows[id] for id in set(ids) if id in self._rows)
+        else:
+            rows = np.flatnonzero(self._live).tolist()
+        if where:
+            rows = [row for row in rows if matches(self._metadatas[row], where)]
+        return rows
+
+    def _documents(self, rows: List[int], version: int) -> Optional[Dict[int, str]]:
+        """Texts of rows as numbered at `version`; None if another process has
+        written since, as compaction renumbers rows"""
+        documents = {}
+        self.conn.execute("BEGIN")
+        try:
+            if self.conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0] != version:
+                return None
+            for start in range(0, len(rows), SQL_BATCH_SIZE):
+                batch = rows[start:start + SQL_BATCH_SIZE]
+                placeholders = ",".join("?" * len(batch))
+                documents.update(self.conn.execute(
+                    f"SELECT row, document FROM records WHERE row IN ({placeholders})", batch
+                ).fetchall())
+        finally:
+            self.conn.commit()
+        return documents
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=("documents", "metadatas")):
+        with self._lock:
+            documents = None
+            while documents is None:
+                self._refresh()
+                rows = self._select(ids, where)
+                rows = rows[offset or 0:]
+                if limit is not None:
+                    rows = rows[:limit]
+                documents = self._documents(rows, self._version) if "documents" in include else {}
+            result: Dict[str, Any] = {"ids": [self._ids[row] for row in rows]}
+            if "documents" in include:
+                result["documents"] = [documents[row] for row in rows]
+            if "metadatas" in include:
+                result["metadatas"] = [self._metadatas[row] for row in rows]
+            if "embeddings" in include:
+                result["embeddings"] = self._decode(np.asarray(rows, dtype=np.int64)).tolist() if rows else []
+            return result
+
+    def query(self, query_embeddings, n_results, where=None, include=("documents", "metadatas", "distances")):
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms == 0, 1, norms)
+        with self._lock:
+            self._refresh()
+            vectors, scales, live = self._vectors, self._scales, self._live
+            mask = live.copy()
+            if where:
+                mask[:] = False
+                mask[self._select(None, where)] = True
+            # Snapshot what results need so scoring runs outside the lock
+            ids, metadatas, version = self._ids, self._metadatas, self._version
+
+        rows, scores = self._top_k(queries, vectors, scales, mask, n_results)
+        result: Dict[str, Any] = {"ids": [[ids[row] for row in query_rows] for query_rows in rows]}
+        if "distances" in include:
+            result["distances"] = [(1 - query_scores).tolist() for query_scores in scores]
+        if "metadatas" in include:
+            result["metadatas"] = [[metadatas[row] for row in query_rows] for query_rows in rows]
+        if "documents" in include:
+            with self._lock:
+                documents = self._documents(sorted({int(row) for query_rows in rows for row in query_rows}), version)
+            if documents is None:
+                # Another process wrote to the index while this query was scored
+                return self.query(query_embeddings, n_results, where, include)
+            result["documents"] = [[documents.get(int(row)) for row in query_rows] for query_rows in rows]
+        return result
+
+    @staticmethod
+    def _top_k(
+        queries: np.ndarray,
+        vectors: np.ndarray,
+        scales: Optional[np.ndarray],
+        mask: np.ndarray,
+        k: int
+    ) -> Tuple[List[np.ndarray], List[np.ndarray]]:
+        """Best k rows and cosine similarities per query, scored block by block"""
+        best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+        best_scores = np.zeros((len(queries), 0), dtype=np.float32)
+        for start in range(0, len(vectors), SEARCH_BLOCK_ROWS):
+            stop = min(start + SEARCH_BLOCK_ROWS, len(vectors))
+            candidates = np.flatnonzero(mask[start:stop]) + start
+            if len(candidates) == 0:
+                continue
+            block = vectors[start:stop] if len(candidates) == stop - start else vectors[candidates]
+            scores = queries @ np.asarray(block, dtype=np.float32).T
+            if scales is not None:
+                scores *= scales[candidates]
+            if scores.shape[1] > k:
+                top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                scores = np.take_along_axis(scores, top, axis=1)
+                block_rows = candidates[top]
+            else:
+                block_rows = np.broadcast_to(candidates, scores.shape)
+            best_rows = np.concatenate([best_rows, block_rows], axis=1)
+            best_scores = np.concatenate([best_scores, scores], axis=1)
+
+        order = np.argsort(-best_scores, axis=1, kind="stable")[:, :k]
+        rows = np.take_along_axis(best_rows, order, axis=1)
+        scores = np.take_along_axis(best_scores, order, axis=1)
+        return list(rows), list(scores)
+
+    def delete(self, ids=None, where=None):
+        with self._writing():
+            rows = self._select(ids, where)
+            if not rows:
+                return
+            self._tombstone(rows)
+            self._commit()
+            self._maybe_compact()
+
+    def _tombstone(self, rows: List[int]) -> None:
+        """Mark rows deleted; the caller commits"""
+        self.conn.executemany("UPDATE records SET deleted = 1 WHERE row = ?", [(row,) for row in rows])
+        for row in rows:
+            del self._rows[self._ids[row]]
+            self._ids[row] = None
+            self._metadatas[row] = None
+        self._live[rows] = False
+
+    def _maybe_compact(self) -> None:
+        deleted = len(self._live) - len(self._rows)
+        if deleted < COMPACT_MIN_DELETED or deleted <= len(self._rows):
+            return
+        live = np.flatnonzero(self._live)
+        generation = self._generation + 1
+        self._append(self._file("vectors", generation), 0, np.ascontiguousarray(self._vectors[live]))
+        if self._scales is not None:
+            self._append(self._file("scales", generation), 0, np.ascontiguousarray(self._scales[live]))
+
+        # Renumber rows in the same transaction that switches generations, so
+        # the records always describe the files of the committed generation
+        old_generation = self._generation
+        self.conn.execute("DELETE FROM records WHERE deleted = 1")
+        self.conn.execute("UPDATE records SET row = -1 - row")
+        self.conn.executemany(
+            "UPDATE records SET row = ? WHERE row = ?",
+            [(new_row, -1 - int(old_row)) for new_row, old_row in enumerate(live)]
+        )
+        self.conn.execute("UPDATE meta SET value = ? WHERE key = 'generation'", (generation,))
+        self._commit()
+
+        self._generation = generation
+        self._ids = [self._ids[row] for row in live]
+        self._metadatas = [self._metadatas[row] for row in live]
+        self._rows = {id: row for row, id in enumerate(self._ids)}
+        self._live = np.ones(len(live), dtype=bool)
+        self._map(len(live))
+        for name in ("vectors", "scales"):
+            path = self._file(name, old_generation)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def count(self):
+        with self._lock:
+            self._refresh()
+            return len(self._rows)
+
+    def drop(self):
+        drop_numpy_index(self.path)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            self._vectors = None
+            self._scales = None
+            self._version = -1
+
+
+# Backend names accepted by VECTOR_BACKEND and VECTOR_BACKEND_OVERRIDES
+NUMPY_BACKENDS = {"numpy": "float32", "numpy_int8": "int8"}
+VECTOR_BACKENDS = ("chroma", *NUMPY_BACKENDS)
+
+
+def stack_backend_name(stack_id: UUID) -> str:
+    name = settings.VECTOR_BACKEND_OVERRIDES.get(str(stack_id), settings.VECTOR_BACKEND)
+    if name not in VECTOR_BACKENDS:
+        raise ValueError(f"Unsupported vector backend: {name}")
+    return name
+
+
+def numpy_index_path(stack_id: UUID, quantization: str) -> str:
+    return os.path.join(settings.NUMPY_INDEX_DIR, f"stack_{stack_id}", quantization)
+
+
+_indexes: Dict[str, NumpyVectorIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_numpy_index(stack_id: UUID, quantization: str = "float32") -> NumpyVectorIndex:
+    """Get the shared handle to a stack's NumPy vector index"""
+    path = numpy_index_path(stack_id, quantization)
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is None:
+            index = _indexes[path] = NumpyVectorIndex(path, quantization)
+        return index
+
+
+def drop_numpy_index(path: str) -> None:
+    """Delete a NumPy vector index from disk"""
+    with _indexes_lock:
+        index = _indexes.pop(path, None)
+    if index is not None:
+        index.close()
+    shutil.rmtree(path, ignore_errors=True)
+
+
+def close_vector_indexes() -> None:
+    with _indexes_lock:
+        indexes = list(_indexes.values())
+        _indexes.clear()
+    for index in indexes:
+        index.close()
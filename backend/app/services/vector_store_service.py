@@ -1,69 +1,277 @@
-from typing import List, Optional, Dict, Any
-import chromadb
-from chromadb.config import Settings as ChromaSettings
+from typing import List, Optional, Dict, Any, Tuple
+from uuid import UUID
+from .client_registry import get_client_registry
+from .embedding_service import EMBEDDING_MODELS
+from .vector_backends import (
+    NUMPY_BACKENDS,
+    ChromaBackend,
+    VectorBackend,
+    get_numpy_index,
+    stack_backend_name
+)
 from ..config import settings
+from ..database import SessionLocal
+from ..repositories.document_repository import DocumentRepository
+
+# Vector storage modes: one Chroma collection per stack, or a shared
+# collection per embedding model partitioned by a stack_id metadata field.
+# Chroma fixes a collection's dimension on first insert, so models with
+# different dimensions can't share one.
+PER_STACK_MODE = "per_stack"
+SHARED_MODE = "shared"
+STACK_COLLECTION_PREFIX = "stack_"
+
+
+def shared_collection_name(embedding_model: str) -> str:
+    return f"{settings.SHARED_COLLECTION_NAME}_{embedding_model.lower()}"
 
 
 class VectorStoreService:
-    """Service for managing vector storage using ChromaDB"""
-    
-    def __init__(self, collection_name: str = "default"):
-        self.client = chromadb.PersistentClient(
-            path=settings.CHROMA_PERSIST_DIRECTORY,
-            settings=ChromaSettings(anonymized_telemetry=False)
-        )
+    """Service for managing vector storage.
+
+    Records are kept by a VectorBackend: a ChromaDB collection, or a NumPy
+    index for stacks configured with the numpy backends. With a partition set,
+    the service reads and writes only that stack's records in a shared
+    collection: every record carries a stack_id field and every query and
+    delete is filtered on it.
+    """
+
+    def __init__(
+        self,
+        collection_name: str = "default",
+        partition: Optional[str] = None,
+        backend: Optional[VectorBackend] = None
+    ):
         self.collection_name = collection_name
-        self._collection = None
-    
-    @property
-    def collection(self):
-        if self._collection is None:
-            self._collection = self.client.get_or_create_collection(
-                name=self.collection_name,
-                metadata={"hnsw:space": "cosine"}
+        self.partition = partition
+        self.backend = backend or ChromaBackend(collection_name)
+
+    @classmethod
+    def for_stack(cls, stack_id: UUID, embedding_model: str, mode: Optional[str] = None) -> "VectorStoreService":
+        """Vector store for a stack's records embedded with embedding_model,
+        with the stack's configured backend and storage mode"""
+        backend = stack_backend_name(stack_id)
+        if backend in NUMPY_BACKENDS:
+            # NumPy indexes are always per stack
+            return cls(
+                collection_name=f"{STACK_COLLECTION_PREFIX}{stack_id}",
+                backend=get_numpy_index(stack_id, NUMPY_BACKENDS[backend])
             )
-        return self._collection
-    
+        mode = mode or settings.VECTOR_STORE_MODE
+        if mode == SHARED_MODE:
+            return cls(collection_name=shared_collection_name(embedding_model), partition=str(stack_id))
+        if mode == PER_STACK_MODE:
+            return cls(collection_name=f"{STACK_COLLECTION_PREFIX}{stack_id}")
+        raise ValueError(f"Unsupported vector store mode: {mode}")
+
+    @classmethod
+    def all_for_stack(cls, stack_id: UUID, mode: Optional[str] = None) -> List["VectorStoreService"]:
+        """Every store that may hold a stack's records, whatever model embedded them"""
+        stores: Dict[str, VectorStoreService] = {}
+        for embedding_model in EMBEDDING_MODELS:
+            store = cls.for_stack(stack_id, embedding_model, mode)
+            stores.setdefault(store.collection_name, store)
+        return list(stores.values())
+
+    def _where(self, metadata_filter: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """Add the partition condition to a metadata filter"""
+        conditions = [{key: value} for key, value in (metadata_filter or {}).items()]
+        if self.partition is not None:
+            conditions.append({"stack_id": self.partition})
+        if not conditions:
+            return None
+        if len(conditions) == 1:
+            return conditions[0]
+        return {"$and": conditions}
+
+    def _tag(self, metadatas: Optional[List[Dict[str, Any]]], count: int) -> Optional[List[Dict[str, Any]]]:
+        """Stamp records with the partition they belong to"""
+        if self.partition is None:
+            return metadatas
+        return [{**(metadata or {}), "stack_id": self.partition} for metadata in (metadatas or [{}] * count)]
+
     def add_documents(
-        self, 
-        documents: List[str], 
+        self,
+        documents: List[str],
         embeddings: List[List[float]],
         ids: List[str],
         metadatas: Optional[List[Dict[str, Any]]] = None
     ) -> None:
         """Add documents with their embeddings to the collection"""
-        self.collection.add(
+        # Upsert so a re-run ingestion job can rewrite chunks it already stored
+        self.backend.upsert(
+            ids=ids,
             documents=documents,
             embeddings=embeddings,
-            ids=ids,
-            metadatas=metadatas
+            metadatas=self._tag(metadatas, len(ids))
+        )
+
+    def update_metadata(self, ids: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        """Rewrite metadata of existing documents without touching their embeddings"""
+        self.backend.update(ids=ids, metadatas=self._tag(metadatas, len(ids)))
+
+    def get_ids(self, metadata_filter: Dict[str, Any]) -> List[str]:
+        """Get the ids of documents matching a metadata filter"""
+        return self.backend.get(where=self._where(metadata_filter), include=[])["ids"]
+
+    def get_by_ids(self, ids: List[str]) -> Dict[str, Any]:
+        """Get documents by id"""
+        return self.backend.get(ids=ids, where=self._where(), include=["documents", "metadatas"])
+
+    def get_documents(
+        self,
+        metadata_filter: Optional[Dict[str, Any]] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Get documents matching a metadata filter, with their embeddings"""
+        return self.backend.get(
+            where=self._where(metadata_filter),
+            limit=limit,
+            offset=offset,
+            include=["documents", "embeddings", "metadatas"]
         )
-    
+
+    def delete_ids(self, ids: List[str]) -> None:
+        """Delete documents by id"""
+        if ids:
+            self.backend.delete(ids=ids, where=self._where())
+
     def query(
-        self, 
-        query_embedding: List[float], 
+        self,
+        query_embedding: List[float],
         n_results: int = 5
     ) -> Dict[str, Any]:
         """Query similar documents"""
-        results = self.collection.query(
-            query_embeddings=[query_embedding],
+        return self.query_many([query_embedding], n_results=n_results)
+
+    def query_many(
+        self,
+        query_embeddings: List[List[float]],
+        n_results: int = 5
+    ) -> Dict[str, Any]:
+        """Query similar documents for several embeddings in one call; each
+        result field holds one list per query"""
+        return self.backend.query(
+            query_embeddings=query_embeddings,
             n_results=n_results,
+            where=self._where(),
             include=["documents", "metadatas", "distances"]
         )
-        return results
-    
+
+    @property
+    def batch_key(self) -> Tuple[str, str, Optional[str]]:
+        """Stores with the same key can answer queries in one query_many call"""
+        return (type(self.backend).__name__, self.collection_name, self.partition)
+
     def delete_by_metadata(self, metadata_filter: Dict[str, Any]) -> None:
         """Delete documents by metadata filter"""
-        self.collection.delete(where=metadata_filter)
-    
-    def get_collection_for_stack(self, stack_id: str) -> "VectorStoreService":
+        self.backend.delete(where=self._where(metadata_filter))
+
+    def get_collection_for_stack(self, stack_id: str, embedding_model: str) -> "VectorStoreService":
         """Get or create a collection for a specific stack"""
-        return VectorStoreService(collection_name=f"stack_{stack_id}")
-    
+        return VectorStoreService.for_stack(stack_id, embedding_model)
+
     def clear_collection(self) -> None:
-        """Clear all documents from the collection"""
+        """Clear all documents from the collection (or from the partition)"""
         try:
-            self.client.delete_collection(self.collection_name)
-            self._collection = None
+            if self.partition is not None:
+                self.backend.delete(where=self._where())
+                return
+            self.backend.drop()
         except Exception:
             pass
+
+
+def migrate_vector_store(target_mode: str, batch_size: int = 1000, keep_source: bool = False) -> Dict[str, int]:
+    """Move every stack's records between per-stack collections and the shared
+    collections. Records are copied with their embeddings, so nothing is
+    re-embedded. Returns the number of records moved per stack.
+
+    A stack whose records were embedded with more than one model can't be
+    moved, since one of its target collections would have to hold vectors of
+    different dimensions; the migration stops before moving anything.
+    """
+    client = get_client_registry().chroma()
+    names = {collection.name for collection in client.list_collections()}
+    moved: Dict[str, int] = {}
+
+    if target_mode == SHARED_MODE:
+        # Per-stack collections don't record the model; the documents do
+        stack_ids = [name[len(STACK_COLLECTION_PREFIX):] for name in names if name.startswith(STACK_COLLECTION_PREFIX)]
+        db = SessionLocal()
+        try:
+            doc_repo = DocumentRepository(db)
+            models = {
+                stack_id: {
+                    doc.embedding_model.lower()
+                    for doc in doc_repo.get_processed_by_stack_id(UUID(stack_id))
+                    if doc.embedding_model
+                }
+                for stack_id in stack_ids
+            }
+        finally:
+            db.close()
+        sources = []
+        for stack_id in sorted(stack_ids):
+            if len(models[stack_id]) > 1:
+                raise ValueError(f"Stack {stack_id} has records from several embedding models: {sorted(models[stack_id])}")
+            if not models[stack_id]:
+                print(f"Skipping stack {stack_id}: no processed documents record its embedding model")
+                continue
+            source = VectorStoreService(collection_name=f"{STACK_COLLECTION_PREFIX}{stack_id}")
+            sources.append((stack_id, models[stack_id].pop(), source))
+    elif target_mode == PER_STACK_MODE:
+        sources = []
+        stack_models: Dict[str, List[str]] = {}
+        for embedding_model in EMBEDDING_MODELS:
+            name = shared_collection_name(embedding_model)
+            if name not in names:
+                continue
+            shared = VectorStoreService(collection_name=name)
+            stack_ids = set()
+            offset = 0
+            while True:
+                batch = shared.backend.get(limit=batch_size, offset=offset, include=["metadatas"])
+                if not batch["ids"]:
+                    break
+                stack_ids.update(metadata["stack_id"] for metadata in batch["metadatas"])
+                offset += len(batch["ids"])
+            for stack_id in sorted(stack_ids):
+                stack_models.setdefault(stack_id, []).append(embedding_model)
+                sources.append((stack_id, embedding_model, VectorStoreService(collection_name=name, partition=stack_id)))
+        for stack_id, embedding_models in stack_models.items():
+            if len(embedding_models) > 1:
+                raise ValueError(f"Stack {stack_id} has records from several embedding models: {embedding_models}")
+    else:
+        raise ValueError(f"Unsupported vector store mode: {target_mode}")
+
+    for stack_id, embedding_model, source in sources:
+        target = VectorStoreService.for_stack(stack_id, embedding_model, mode=target_mode)
+        count = 0
+        while True:
+            batch = source.get_documents(limit=batch_size, offset=count)
+            if not batch["ids"]:
+                break
+            metadatas = [
+                {key: value for key, value in metadata.items() if key != "stack_id"}
+                for metadata in batch["metadatas"]
+            ]
+            target.add_documents(
+                documents=batch["documents"],
+                embeddings=batch["embeddings"],
+                ids=batch["ids"],
+                metadatas=metadatas
+            )
+            count += len(batch["ids"])
+        moved[stack_id] = count
+        if not keep_source:
+            source.clear_collection()
+
+    if target_mode == PER_STACK_MODE and not keep_source:
+        for embedding_model in EMBEDDING_MODELS:
+            try:
+                client.delete_collection(shared_collection_name(embedding_model))
+            except Exception:
+                pass
+    return moved
@@ -1,5 +1,5 @@
-from typing import List, Dict, Any, Optional
-import httpx
+from typing import List, Dict, Any
+from .client_registry import get_client_registry
 from ..config import settings
 
 
@@ -46,23 +46,23 @@ class WebSearchService:
             "num": num_results
         }
         
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.get(self.base_url, params=params, timeout=30)
-                response.raise_for_status()
-                data = response.json()
-                
-                results = []
-                for item in data.get("organic_results", [])[:num_results]:
-                    results.append({
-                        "title": item.get("title", ""),
-                        "link": item.get("link", ""),
-                        "snippet": item.get("snippet", "")
-                    })
-                return results
-            except Exception as e:
-                print(f"SerpAPI search error: {e}")
-                return []
+        client = get_client_registry().async_http
+        try:
+            response = await client.get(self.base_url, params=params, timeout=30)
+            response.raise_for_status()
+            data = response.json()
+            
+            results = []
+            for item in data.get("organic_results", [])[:num_results]:
+                results.append({
+                    "title": item.get("title", ""),
+                    "link": item.get("link", ""),
+                    "snippet": item.get("snippet", "")
+                })
+            return results
+        except Exception as e:
+            print(f"SerpAPI search error: {e}")
+            return []
     
     async def _search_brave(self, query: str, num_results: int) -> List[Dict[str, Any]]:
         """Perform search using Brave Search API"""
@@ -76,28 +76,28 @@ class WebSearchService:
             "count": num_results
         }
         
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.get(
-                    self.base_url, 
-                    headers=headers, 
-                    params=params, 
-                    timeout=30
-                )
-                response.raise_for_status()
-                data = response.json()
-                
-                results = []
-                for item in data.get("web", {}).get("results", [])[:num_results]:
-                    results.append({
-                        "title": item.get("title", ""),
-                        "link": item.get("url", ""),
-                        "snippet": item.get("description", "")
-                    })
-                return results
-            except Exception as e:
-                print(f"Brave Search error: {e}")
-                return []
+        client = get_client_registry().async_http
+        try:
+            response = await client.get(
+                self.base_url, 
+                headers=headers, 
+                params=params, 
+                timeout=30
+            )
+            response.raise_for_status()
+            data = response.json()
+            
+            results = []
+            for item in data.get("web", {}).get("results", [])[:num_results]:
+                results.append({
+                    "title": item.get("title", ""),
+                    "link": item.get("url", ""),
+                    "snippet": item.get("description", "")
+                })
+            return results
+        except Exception as e:
+            print(f"Brave Search error: {e}")
+            return []
     
     def format_results_as_context(self, results: List[Dict[str, Any]]) -> str:
         """Format search results as context for LLM"""
@@ -0,0 +1,378 @@
+import hashlib
+import json
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional, Tuple
+from uuid import UUID
+from .embedding_service import EmbeddingService
+from .llm_service import LLMService
+from ..config import settings
+
+
+# Defaults applied to node configs at compile time so execution never has to
+# re-resolve them per message
+NODE_CONFIG_DEFAULTS: Dict[str, Dict[str, Any]] = {
+    "knowledgeBase": {
+        "embeddingModel": "openai",
+        "apiKey": None,
+        "topK": 5,
+        # Reciprocal rank fusion of dense and BM25 results; a weight of 0
+        # turns that retriever off
+        "vectorWeight": 1.0,
+        "lexicalWeight": 1.0,
+        "rrfK": 60,
+        # Reorder candidates with the local scorer in context_assembly
+        "enableRerank": False,
+    },
+    "llmEngine": {
+        "provider": "openai",
+        "model": "gpt-4o-mini",
+        "apiKey": None,
+        "systemPrompt": None,
+        "temperature": 0.7,
+        "enableWebSearch": False,
+        "webSearchProvider": "serpapi",
+        "enableResponseCache": False,
+        "responseCacheThreshold": settings.RESPONSE_CACHE_THRESHOLD,
+        # Tokens of document context in the prompt; unset means the model's
+        # entry in MODEL_CONTEXT_BUDGETS
+        "contextTokenBudget": None,
+        # Describe the workflow's own nodes and data flow to the model
+        "includeWorkflowContext": False,
+        # Earlier turns of the stack's conversation, within a token budget
+        "enableMemory": False,
+        "memoryTokenBudget": settings.MEMORY_TOKEN_BUDGET,
+    },
+}
+
+# Per-model document context budgets in tokens; unlisted models use
+# CONTEXT_TOKEN_BUDGET. Prompt tokens cost the most on the larger models
+MODEL_CONTEXT_BUDGETS: Dict[str, int] = {
+    "gpt-4o": 1500,
+    "gpt-4-turbo": 1500,
+}
+
+
+@dataclass(frozen=True)
+class CompiledNode:
+    """A workflow node with its config resolved and its dependencies known"""
+    id: str
+    type: str
+    label: str
+    config: Dict[str, Any]
+    dependencies: Tuple[str, ...] = ()
+
+
+@dataclass
+class CompiledWorkflow:
+    """Execution plan for a workflow, reusable until the workflow changes"""
+    workflow_hash: str
+    workflow_data: Dict[str, Any]
+    nodes: List[CompiledNode]
+    errors: List[str] = field(default_factory=list)
+    warnings: List[str] = field(default_factory=list)
+    # Prompt description of the workflow, built only when an LLM engine asks for it
+    workflow_context: Optional[str] = None
+    _services: Dict[str, Any] = field(default_factory=dict, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    @property
+    def valid(self) -> bool:
+        return len(self.errors) == 0
+
+    @property
+    def validation(self) -> Dict[str, Any]:
+        return {
+            "valid": self.valid,
+            "errors": list(self.errors),
+            "warnings": list(self.warnings)
+        }
+
+    def embedding_service(self, node: CompiledNode) -> EmbeddingService:
+        """Get the embedding service handle for a knowledge base node"""
+        return self._get_service(
+            f"embedding:{node.id}",
+            lambda: EmbeddingService(
+                provider=node.config["embeddingModel"],
+                api_key=node.config["apiKey"]
+            )
+        )
+
+    @property
+    def response_cache_node(self) -> Optional[CompiledNode]:
+        """The LLM engine node that opted into the semantic response cache, if any.
+
+        Answers that depend on conversation memory are never reused.
+        """
+        return next(
+            (
+                node for node in self.nodes
+                if node.type == "llmEngine" and node.config["enableResponseCache"] and not node.config["enableMemory"]
+            ),
+            None
+        )
+
+    def query_embedding_service(self, node: CompiledNode) -> EmbeddingService:
+        """Embedding service for semantic cache lookups made on behalf of an LLM
+        engine node; reuses the knowledge base's so the query is embedded once"""
+        knowledge_base = next((n for n in self.nodes if n.type == "knowledgeBase"), None)
+        if knowledge_base is not None:
+            return self.embedding_service(knowledge_base)
+        return self._get_service(
+            f"embedding:{node.id}",
+            lambda: EmbeddingService(
+                provider=node.config["provider"],
+                api_key=node.config["apiKey"]
+            )
+        )
+
+    def llm_service(self, node: CompiledNode) -> LLMService:
+        """Get the LLM service handle for an LLM engine node"""
+        return self._get_service(
+            f"llm:{node.id}",
+            lambda: LLMService(
+                provider=node.config["provider"],
+                model=node.config["model"],
+                api_key=node.config["apiKey"]
+            )
+        )
+
+    def _get_service(self, key: str, factory):
+        # Handles are built on first use so compiling (e.g. from /build) never
+        # needs provider credentials
+        service = self._services.get(key)
+        if service is None:
+            with self._lock:
+                service = self._services.get(key)
+                if service is None:
+                    service = factory()
+                    self._services[key] = service
+        return service
+
+
+def hash_workflow(workflow_data: Dict[str, Any]) -> str:
+    """Stable hash of the workflow JSON"""
+    payload = json.dumps(workflow_data or {}, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def format_workflow_context(workflow_data: Dict[str, Any]) -> str:
+    """Format workflow structure as readable context for the LLM"""
+    nodes = workflow_data.get("nodes", [])
+    edges = workflow_data.get("edges", [])
+
+    if not nodes:
+        return "No workflow configured."
+
+    parts = ["Current Workflow Configuration:"]
+    parts.append("\n=== Workflow Components ===")
+
+    # List all nodes
+    for node in nodes:
+        node_type = node.get("type", "unknown")
+        node_data = node.get("data", {})
+        node_label = node_data.get("label", "Unnamed")
+        node_config = node_data.get("config", {})
+
+        type_names = {
+            "userQuery": "User Query Input",
+            "knowledgeBase": "Knowledge Base (RAG)",
+            "llmEngine": "LLM Engine",
+            "output": "Output"
+        }
+
+        parts.append(f"\n• {node_label} ({type_names.get(node_type, node_type)}):")
+
+        # Add configuration details
+        if node_type == "knowledgeBase" and node_config:
+            if node_config.get("embeddingModel"):
+                parts.append(f"  - Embedding Model: {node_config['embeddingModel']}")
+
+        elif node_type == "llmEngine" and node_config:
+            if node_config.get("provider"):
+                parts.append(f"  - Provider: {node_config['provider']}")
+            if node_config.get("model"):
+                parts.append(f"  - Model: {node_config['model']}")
+            if node_config.get("temperature") is not None:
+                parts.append(f"  - Temperature: {node_config['temperature']}")
+            if node_config.get("systemPrompt"):
+                prompt_preview = node_config['systemPrompt'][:100] + "..." if len(node_config['systemPrompt']) > 100 else node_config['systemPrompt']
+                parts.append(f"  - System Prompt: {prompt_preview}")
+            if node_config.get("enableWebSearch"):
+                parts.append(f"  - Web Search: Enabled")
+
+    # Show data flow
+    if edges:
+        parts.append("\n=== Data Flow ===")
+        node_map = {node["id"]: node.get("data", {}).get("label", "Unnamed") for node in nodes}
+        for edge in edges:
+            source_label = node_map.get(edge.get("source", ""), "Unknown")
+            target_label = node_map.get(edge.get("target", ""), "Unknown")
+            parts.append(f"  {source_label} → {target_label}")
+
+    return "\n".join(parts)
+
+
+def _resolve_config(node_type: str, config: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    resolved = dict(NODE_CONFIG_DEFAULTS.get(node_type, {}))
+    resolved["timeout"] = settings.WORKFLOW_NODE_TIMEOUT
+    for key, value in (config or {}).items():
+        if value is not None:
+            resolved[key] = value
+    if node_type == "llmEngine" and resolved["contextTokenBudget"] is None:
+        resolved["contextTokenBudget"] = MODEL_CONTEXT_BUDGETS.get(resolved["model"], settings.CONTEXT_TOKEN_BUDGET)
+    return resolved
+
+
+def _build_execution_order(
+    nodes: List[Dict],
+    edges: List[Dict]
+) -> List[str]:
+    """Topologically sort node ids using Kahn's algorithm"""
+    graph = {node["id"]: [] for node in nodes}
+    in_degree = {node["id"]: 0 for node in nodes}
+
+    for edge in edges:
+        source = edge["source"]
+        target = edge["target"]
+        if source in graph and target in in_degree:
+            graph[source].append(target)
+            in_degree[target] += 1
+
+    queue = deque(node_id for node_id, degree in in_degree.items() if degree == 0)
+    result = []
+
+    while queue:
+        node_id = queue.popleft()
+        result.append(node_id)
+        for neighbor in graph.get(node_id, []):
+            in_degree[neighbor] -= 1
+            if in_degree[neighbor] == 0:
+                queue.append(neighbor)
+
+    return result
+
+
+def _validate(nodes: List[Dict], edges: List[Dict]) -> Tuple[List[str], List[str]]:
+    errors = []
+    warnings = []
+
+    node_types = [node.get("type") for node in nodes]
+
+    if "userQuery" not in node_types:
+        errors.append("Workflow must have a User Query component")
+
+    if "output" not in node_types:
+        errors.append("Workflow must have an Output component")
+
+    if "llmEngine" not in node_types:
+        warnings.append("Workflow has no LLM Engine - responses will be limited")
+
+    connected_nodes = set()
+    for edge in edges:
+        connected_nodes.add(edge["source"])
+        connected_nodes.add(edge["target"])
+
+    for node in nodes:
+        if node["id"] not in connected_nodes and len(nodes) > 1:
+            warnings.append(f"Node '{node.get('data', {}).get('label', node['id'])}' is not connected")
+
+    return errors, warnings
+
+
+def compile_workflow(
+    workflow_data: Dict[str, Any],
+    workflow_hash: Optional[str] = None
+) -> CompiledWorkflow:
+    """Compile workflow JSON into an execution plan"""
+    workflow_data = workflow_data or {}
+    nodes = workflow_data.get("nodes", [])
+    edges = workflow_data.get("edges", [])
+
+    node_map = {node["id"]: node for node in nodes}
+    dependencies: Dict[str, List[str]] = {node["id"]: [] for node in nodes}
+    for edge in edges:
+        if edge["target"] in dependencies and edge["source"] in node_map:
+            dependencies[edge["target"]].append(edge["source"])
+
+    execution_order = _build_execution_order(nodes, edges)
+    compiled_nodes = []
+    for node_id in execution_order:
+        node = node_map[node_id]
+        node_type = node.get("type", "")
+        node_data = node.get("data", {}) or {}
+        label = node_data.get("label", node_id)
+        config = _resolve_config(node_type, node_data.get("config"))
+        node_dependencies = list(dependencies[node_id])
+
+        # Web search only needs the query, so it becomes its own node that
+        # can run alongside knowledge base retrieval
+        if node_type == "llmEngine" and config["enableWebSearch"]:
+            web_node = CompiledNode(
+                id=f"{node_id}:webSearch",
+                type="webSearch",
+                label=f"{label} Web Search",
+                config={"provider": config["webSearchProvider"], "timeout": config["timeout"]}
+            )
+            compiled_nodes.append(web_node)
+            node_dependencies.append(web_node.id)
+
+        compiled_nodes.append(CompiledNode(
+            id=node_id,
+            type=node_type,
+            label=label,
+            config=config,
+            dependencies=tuple(node_dependencies)
+        ))
+
+    errors, warnings = _validate(nodes, edges)
+    if len(execution_order) < len(nodes):
+        errors.append("Workflow contains a cycle")
+
+    wants_workflow_context = any(
+        node.type == "llmEngine" and node.config["includeWorkflowContext"] for node in compiled_nodes
+    )
+    return CompiledWorkflow(
+        workflow_hash=workflow_hash or hash_workflow(workflow_data),
+        workflow_data=workflow_data,
+        nodes=compiled_nodes,
+        errors=errors,
+        warnings=warnings,
+        workflow_context=format_workflow_context(workflow_data) if wants_workflow_context else None
+    )
+
+
+class WorkflowPlanCache:
+    """Per-stack cache of compiled workflows keyed by workflow hash"""
+
+    def __init__(self):
+        self._plans: Dict[str, CompiledWorkflow] = {}
+        self._lock = threading.Lock()
+
+    def get_or_compile(
+        self,
+        stack_id: UUID,
+        workflow_data: Dict[str, Any]
+    ) -> CompiledWorkflow:
+        key = str(stack_id)
+        workflow_hash = hash_workflow(workflow_data)
+        plan = self._plans.get(key)
+        if plan is not None and plan.workflow_hash == workflow_hash:
+            return plan
+
+        plan = compile_workflow(workflow_data, workflow_hash=workflow_hash)
+        with self._lock:
+            self._plans[key] = plan
+        return plan
+
+    def invalidate(self, stack_id: UUID) -> None:
+        with self._lock:
+            self._plans.pop(str(stack_id), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._plans.clear()
+
+
+workflow_plan_cache = WorkflowPlanCache()
@@ -1,19 +1,47 @@
-from typing import Dict, Any, List, Optional
+import asyncio
+import time
+from typing import Dict, Any, List, Optional, AsyncIterator, Tuple, Union
 from uuid import UUID
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from .embedding_service import EmbeddingService
-from .llm_service import LLMService
+from .chunking import get_tokenizer
+from .context_assembly import ContextChunk, dedup, format_chunks, pack, rerank
+from .conversation_memory import get_conversation_memory
+from .prompt_metrics import PROMPT_SECTIONS, get_prompt_metrics
+from .response_cache import get_response_cache
+from .lexical_index import get_lexical_index, reciprocal_rank_fusion
+from .query_batcher import get_query_batcher
+from .retrieval_cache import get_retrieval_cache
 from .vector_store_service import VectorStoreService
 from .web_search_service import WebSearchService
-from ..repositories import DocumentRepository
+from .workflow_compiler import CompiledNode, CompiledWorkflow, compile_workflow, workflow_plan_cache
+
+# Nodes that only enrich the prompt; a timeout drops their contribution
+# instead of failing the whole workflow
+BEST_EFFORT_NODE_TYPES = {"knowledgeBase", "webSearch"}
+
+# Candidates fetched from each retriever per result when fusing rankings
+HYBRID_CANDIDATE_FACTOR = 4
+# Candidates retrieved per requested chunk ahead of rerank and dedup
+CONTEXT_CANDIDATE_FACTOR = 2
 
 
 class WorkflowEngine:
     """Engine for executing workflows based on node configurations"""
     
-    def __init__(self, db: Session):
+    def __init__(self, db: Union[Session, AsyncSession]):
         self.db = db
     
+    def compile_workflow(
+        self,
+        workflow_data: Dict[str, Any],
+        stack_id: Optional[UUID] = None
+    ) -> CompiledWorkflow:
+        """Compile a workflow into an execution plan, cached per stack"""
+        if stack_id is None:
+            return compile_workflow(workflow_data)
+        return workflow_plan_cache.get_or_compile(stack_id, workflow_data)
+    
     async def execute(
         self, 
         stack_id: UUID, 
@@ -21,193 +49,344 @@ class WorkflowEngine:
         query: str
     ) -> str:
         """Execute the workflow and return the final response"""
-        nodes = workflow_data.get("nodes", [])
-        edges = workflow_data.get("edges", [])
+        plan = self.compile_workflow(workflow_data, stack_id=stack_id)
         
-        # Build execution order
-        execution_order = self._build_execution_order(nodes, edges)
+        cached, query_embedding = await self._cached_response(stack_id, plan, query)
+        if cached is not None:
+            return cached
+        started = time.perf_counter()
         
-        # Execute nodes in order
         context = {
             "query": query, 
             "knowledge_context": None, 
-            "web_context": None,
-            "workflow_data": workflow_data
+            "web_context": {},
+            "prompt_sizes": {}
         }
         
-        for node in execution_order:
-            node_type = node.get("type", "")
-            node_config = node.get("data", {}).get("config", {})
-            
-            if node_type == "userQuery":
-                # User query is already in context
-                pass
-            elif node_type == "knowledgeBase":
-                context["knowledge_context"] = await self._execute_knowledge_base(
-                    stack_id, query, node_config
-                )
-            elif node_type == "llmEngine":
-                response = await self._execute_llm_engine(context, node_config)
-                context["response"] = response
-            elif node_type == "output":
-                # Output node just returns the response
-                pass
+        await self._run_plan(stack_id, plan, context)
         
+        self._store_response(stack_id, plan, query_embedding, context, started)
         return context.get("response", "No response generated")
     
-    def _build_execution_order(
+    async def execute_stream(
         self, 
-        nodes: List[Dict], 
-        edges: List[Dict]
-    ) -> List[Dict]:
-        """Build execution order based on node connections"""
-        # Create adjacency list
-        graph = {node["id"]: [] for node in nodes}
-        in_degree = {node["id"]: 0 for node in nodes}
+        stack_id: UUID, 
+        workflow_data: Dict[str, Any], 
+        query: str
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Execute the workflow, yielding node progress and token events as they happen.
         
-        for edge in edges:
-            source = edge["source"]
-            target = edge["target"]
-            if source in graph:
-                graph[source].append(target)
-            if target in in_degree:
-                in_degree[target] += 1
+        Events are dicts with a "type" of "node", "token" or "done"; the final
+        "done" event carries the assembled response.
+        """
+        plan = self.compile_workflow(workflow_data, stack_id=stack_id)
         
-        # Topological sort using Kahn's algorithm
-        queue = [node_id for node_id, degree in in_degree.items() if degree == 0]
-        result = []
-        node_map = {node["id"]: node for node in nodes}
+        cached, query_embedding = await self._cached_response(stack_id, plan, query)
+        if cached is not None:
+            yield {"type": "token", "node_id": plan.response_cache_node.id, "content": cached}
+            # No prompt was sent
+            yield {"type": "done", "response": cached, "prompt_tokens": {}}
+            return
+        started = time.perf_counter()
+        events: asyncio.Queue = asyncio.Queue()
         
-        while queue:
-            node_id = queue.pop(0)
-            if node_id in node_map:
-                result.append(node_map[node_id])
-            
-            for neighbor in graph.get(node_id, []):
-                in_degree[neighbor] -= 1
-                if in_degree[neighbor] == 0:
-                    queue.append(neighbor)
+        context = {
+            "query": query, 
+            "knowledge_context": None, 
+            "web_context": {},
+            "prompt_sizes": {},
+            "events": events
+        }
+        
+        run = asyncio.create_task(self._run_plan(stack_id, plan, context))
+        run.add_done_callback(lambda _: events.put_nowait(None))
         
-        return result
+        try:
+            while True:
+                event = await events.get()
+                if event is None:
+                    break
+                yield event
+            # Surface any node failure to the caller
+            await run
+        finally:
+            if not run.done():
+                run.cancel()
+                await asyncio.gather(run, return_exceptions=True)
+        
+        self._store_response(stack_id, plan, query_embedding, context, started)
+        yield {
+            "type": "done",
+            "response": context.get("response", "No response generated"),
+            # Prompt tokens per LLM engine node, by section
+            "prompt_tokens": context["prompt_sizes"]
+        }
+    
+    async def _cached_response(
+        self,
+        stack_id: UUID,
+        plan: CompiledWorkflow,
+        query: str
+    ) -> Tuple[Optional[str], Optional[List[float]]]:
+        """Look the query up in the semantic response cache if the workflow opted in.
+        
+        Returns the cached answer, if any, and the query embedding to store a
+        fresh answer under.
+        """
+        node = plan.response_cache_node
+        if node is None:
+            return None, None
+        try:
+            embedding_service = plan.query_embedding_service(node)
+            query_embedding = (await embedding_service.agenerate_embeddings([query]))[0]
+        except Exception as e:
+            print(f"Response cache lookup failed: {e}")
+            return None, None
+        cached = get_response_cache().lookup(
+            stack_id, plan.workflow_hash, query_embedding, node.config["responseCacheThreshold"]
+        )
+        return cached, query_embedding
+    
+    def _store_response(
+        self,
+        stack_id: UUID,
+        plan: CompiledWorkflow,
+        query_embedding: Optional[List[float]],
+        context: Dict[str, Any],
+        started: float
+    ) -> None:
+        if query_embedding is not None and context.get("response"):
+            get_response_cache().store(
+                stack_id,
+                plan.workflow_hash,
+                query_embedding,
+                context["response"],
+                time.perf_counter() - started
+            )
+    
+    async def _run_plan(
+        self,
+        stack_id: UUID,
+        plan: CompiledWorkflow,
+        context: Dict[str, Any]
+    ) -> None:
+        """Run nodes as a dependency graph, starting each one as soon as its inputs are ready"""
+        tasks: Dict[str, asyncio.Task] = {}
+        
+        events: Optional[asyncio.Queue] = context.get("events")
+        
+        def emit(node: CompiledNode, status: str) -> None:
+            if events is not None:
+                events.put_nowait({
+                    "type": "node",
+                    "node_id": node.id,
+                    "node_type": node.type,
+                    "label": node.label,
+                    "status": status
+                })
+        
+        async def run_node(node: CompiledNode) -> None:
+            if node.dependencies:
+                await asyncio.gather(*(tasks[dep] for dep in node.dependencies))
+            emit(node, "started")
+            try:
+                await asyncio.wait_for(
+                    self._execute_node(stack_id, plan, node, context),
+                    timeout=node.config["timeout"]
+                )
+            except asyncio.TimeoutError:
+                if node.type not in BEST_EFFORT_NODE_TYPES:
+                    emit(node, "failed")
+                    raise TimeoutError(f"Node '{node.label}' timed out after {node.config['timeout']}s")
+                print(f"Node '{node.label}' timed out, continuing without it")
+                emit(node, "skipped")
+                return
+            except Exception:
+                emit(node, "failed")
+                raise
+            emit(node, "completed")
+        
+        # Plan nodes are topologically ordered, so dependencies are always scheduled first
+        for node in plan.nodes:
+            tasks[node.id] = asyncio.create_task(run_node(node))
+        
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            # A failed node fails its consumers; cancel whatever is still running
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+    
+    async def _execute_node(
+        self,
+        stack_id: UUID,
+        plan: CompiledWorkflow,
+        node: CompiledNode,
+        context: Dict[str, Any]
+    ) -> None:
+        if node.type == "knowledgeBase":
+            context["knowledge_context"] = await self._execute_knowledge_base(
+                stack_id, context["query"], plan, node
+            )
+        elif node.type == "webSearch":
+            context["web_context"][node.id] = await self._execute_web_search(
+                context["query"], node
+            )
+        elif node.type == "llmEngine":
+            context["response"] = await self._execute_llm_engine(stack_id, context, plan, node)
+        # userQuery and output nodes carry no work of their own
     
     async def _execute_knowledge_base(
         self, 
         stack_id: UUID, 
         query: str, 
-        config: Dict[str, Any]
-    ) -> Optional[str]:
-        """Execute knowledge base retrieval"""
-        provider = config.get("embeddingModel", "openai")
-        api_key = config.get("apiKey")
+        plan: CompiledWorkflow,
+        node: CompiledNode
+    ) -> Optional[List[ContextChunk]]:
+        """Retrieve, optionally rerank, and dedup context chunks, reusing cached
+        results for repeated queries. Chunks are packed into the prompt budget
+        by the LLM engine that consumes them."""
+        config = node.config
+        cache = get_retrieval_cache()
+        if cache is not None:
+            key = cache.make_key(
+                stack_id,
+                query,
+                config["topK"],
+                (
+                    config["embeddingModel"],
+                    config["vectorWeight"],
+                    config["lexicalWeight"],
+                    config["rrfK"],
+                    config["enableRerank"]
+                )
+            )
+            found, cached = cache.get(key)
+            if found:
+                return cached
         
+        started = time.perf_counter()
         try:
-            # Generate query embedding
-            embedding_service = EmbeddingService(provider=provider, api_key=api_key)
-            query_embedding = embedding_service.generate_embeddings([query])[0]
-            
-            # Query vector store
-            vector_store = VectorStoreService(collection_name=f"stack_{stack_id}")
-            results = vector_store.query(query_embedding, n_results=5)
-            
-            # Format results as context
-            documents = results.get("documents", [[]])[0]
-            if documents:
-                return "\n\n".join(documents)
-            return None
+            # Extra candidates replace the ones dedup drops, and give the
+            # reranker something to choose from
+            chunks = await self._retrieve(stack_id, query, plan, node, config["topK"] * CONTEXT_CANDIDATE_FACTOR)
+            if config["enableRerank"]:
+                chunks = rerank(query, chunks)
+            chunks = dedup(chunks, config["topK"]) or None
         except Exception as e:
             print(f"Knowledge base error: {e}")
             return None
-    
-    def _format_workflow_context(self, workflow_data: Dict[str, Any]) -> str:
-        """Format workflow structure as readable context for the LLM"""
-        nodes = workflow_data.get("nodes", [])
-        edges = workflow_data.get("edges", [])
         
-        if not nodes:
-            return "No workflow configured."
+        if cache is not None:
+            cache.put(key, chunks, time.perf_counter() - started)
+        return chunks
+    
+    async def _retrieve(
+        self,
+        stack_id: UUID,
+        query: str,
+        plan: CompiledWorkflow,
+        node: CompiledNode,
+        n_results: int
+    ) -> List[ContextChunk]:
+        """Dense retrieval, fused with BM25 results by reciprocal rank when
+        lexicalWeight > 0; best first"""
+        config = node.config
+        vector_weight = config["vectorWeight"]
+        lexical_weight = config["lexicalWeight"]
+        hybrid = lexical_weight > 0
+        # Fusion reorders results, so each retriever contributes a deeper list
+        candidates = n_results * HYBRID_CANDIDATE_FACTOR if hybrid else n_results
+        embedding_service = plan.embedding_service(node)
+        vector_store = VectorStoreService.for_stack(stack_id, embedding_service.provider)
         
-        parts = ["Current Workflow Configuration:"]
-        parts.append("\n=== Workflow Components ===")
+        async def dense() -> Dict[str, Any]:
+            if vector_weight <= 0:
+                return {"ids": [[]], "documents": [[]], "metadatas": [[]], "distances": [[]]}
+            batcher = get_query_batcher()
+            if batcher is not None:
+                return await batcher.query(embedding_service, vector_store, query, candidates)
+            query_embedding = (await embedding_service.agenerate_embeddings([query]))[0]
+            # Chroma is blocking, keep it off the event loop
+            return await asyncio.to_thread(vector_store.query, query_embedding, n_results=candidates)
         
-        # List all nodes
-        for node in nodes:
-            node_type = node.get("type", "unknown")
-            node_data = node.get("data", {})
-            node_label = node_data.get("label", "Unnamed")
-            node_config = node_data.get("config", {})
-            
-            type_names = {
-                "userQuery": "User Query Input",
-                "knowledgeBase": "Knowledge Base (RAG)",
-                "llmEngine": "LLM Engine",
-                "output": "Output"
-            }
-            
-            parts.append(f"\n• {node_label} ({type_names.get(node_type, node_type)}):")
-            
-            # Add configuration details
-            if node_type == "knowledgeBase" and node_config:
-                if node_config.get("embeddingModel"):
-                    parts.append(f"  - Embedding Model: {node_config['embeddingModel']}")
-            
-            elif node_type == "llmEngine" and node_config:
-                if node_config.get("provider"):
-                    parts.append(f"  - Provider: {node_config['provider']}")
-                if node_config.get("model"):
-                    parts.append(f"  - Model: {node_config['model']}")
-                if node_config.get("temperature") is not None:
-                    parts.append(f"  - Temperature: {node_config['temperature']}")
-                if node_config.get("systemPrompt"):
-                    prompt_preview = node_config['systemPrompt'][:100] + "..." if len(node_config['systemPrompt']) > 100 else node_config['systemPrompt']
-                    parts.append(f"  - System Prompt: {prompt_preview}")
-                if node_config.get("enableWebSearch"):
-                    parts.append(f"  - Web Search: Enabled")
+        async def lexical() -> List[Tuple[str, float]]:
+            if not hybrid:
+                return []
+            return await asyncio.to_thread(get_lexical_index(stack_id).search, query, candidates)
         
-        # Show data flow
-        if edges:
-            parts.append("\n=== Data Flow ===")
-            node_map = {node["id"]: node.get("data", {}).get("label", "Unnamed") for node in nodes}
-            for edge in edges:
-                source_label = node_map.get(edge.get("source", ""), "Unknown")
-                target_label = node_map.get(edge.get("target", ""), "Unknown")
-                parts.append(f"  {source_label} → {target_label}")
+        results, lexical_hits = await asyncio.gather(dense(), lexical())
+        ids = results.get("ids", [[]])[0]
+        documents = dict(zip(ids, results.get("documents", [[]])[0]))
+        metadatas = dict(zip(ids, results.get("metadatas", [[]])[0] or [{}] * len(ids)))
+        if not hybrid:
+            distances = results.get("distances", [[]])[0] or [0.0] * len(ids)
+            return [
+                ContextChunk(id, documents[id], 1 - distance, metadatas[id] or {})
+                for id, distance in zip(ids, distances)
+            ]
         
-        return "\n".join(parts)
+        fused = reciprocal_rank_fusion(
+            [(ids, vector_weight), ([id for id, _ in lexical_hits], lexical_weight)],
+            k=config["rrfK"]
+        )[:n_results]
+        # Lexical-only hits still need their text
+        missing = [id for id, _ in fused if id not in documents]
+        if missing:
+            fetched = await asyncio.to_thread(vector_store.get_by_ids, missing)
+            documents.update(zip(fetched["ids"], fetched["documents"]))
+            metadatas.update(zip(fetched["ids"], fetched["metadatas"]))
+        return [
+            ContextChunk(id, documents[id], score, metadatas.get(id) or {})
+            for id, score in fused if id in documents
+        ]
+    
+    async def _execute_web_search(self, query: str, node: CompiledNode) -> Optional[str]:
+        """Execute web search for an LLM engine node"""
+        web_search = WebSearchService(provider=node.config["provider"])
+        results = await web_search.search(query)
+        return web_search.format_results_as_context(results)
     
     async def _execute_llm_engine(
         self, 
+        stack_id: UUID,
         context: Dict[str, Any], 
-        config: Dict[str, Any]
+        plan: CompiledWorkflow,
+        node: CompiledNode
     ) -> str:
         """Execute LLM generation"""
-        provider = config.get("provider", "openai")
-        model = config.get("model", "gpt-4o-mini")
-        api_key = config.get("apiKey")
-        system_prompt = config.get("systemPrompt")
-        temperature = config.get("temperature", 0.7)
-        enable_web_search = config.get("enableWebSearch", False)
+        config = node.config
+        system_prompt = config["systemPrompt"]
+        temperature = config["temperature"]
         
         query = context.get("query", "")
         knowledge_context = context.get("knowledge_context")
         
-        # Perform web search if enabled
-        web_context = None
-        if enable_web_search:
-            search_provider = config.get("webSearchProvider", "serpapi")  # Default to serpapi
-            web_search = WebSearchService(provider=search_provider)
-            results = await web_search.search(query)
-            web_context = web_search.format_results_as_context(results)
+        # Web search ran as a separate node ahead of this one when enabled
+        web_context = context["web_context"].get(f"{node.id}:webSearch")
         
         # Combine contexts
         full_context = None
         context_parts = []
         
-        # Add workflow context first
-        workflow_data = context.get("workflow_data")
-        if workflow_data:
-            workflow_context = self._format_workflow_context(workflow_data)
+        # The workflow's description of itself is opt-in and compiled once
+        # per workflow version
+        workflow_context = plan.workflow_context if config["includeWorkflowContext"] else None
+        if workflow_context:
             context_parts.append(workflow_context)
         
+        memory_context = None
+        if config["enableMemory"]:
+            memory_context = await get_conversation_memory().context(
+                stack_id, query, config["memoryTokenBudget"], plan.llm_service(node)
+            )
+        if memory_context:
+            context_parts.append(f"\n{memory_context}")
+        
+        if knowledge_context:
+            knowledge_context = format_chunks(pack(knowledge_context, config["contextTokenBudget"]))
         if knowledge_context:
             context_parts.append(f"\nDocument Knowledge:\n{knowledge_context}")
         if web_context:
@@ -215,49 +394,39 @@ class WorkflowEngine:
         if context_parts:
             full_context = "\n\n".join(context_parts)
         
+        prompt_sizes = dict(zip(PROMPT_SECTIONS, get_tokenizer().count_many([
+            system_prompt or "", workflow_context or "", memory_context or "",
+            knowledge_context or "", web_context or "", query
+        ])))
+        context["prompt_sizes"][node.id] = prompt_sizes
+        
         # Generate response
-        llm_service = LLMService(provider=provider, model=model, api_key=api_key)
-        response = llm_service.generate_response(
-            query=query,
-            context=full_context,
-            system_prompt=system_prompt,
-            temperature=temperature
-        )
+        llm_service = plan.llm_service(node)
+        events: Optional[asyncio.Queue] = context.get("events")
+        started = time.perf_counter()
+        if events is None:
+            response = await llm_service.agenerate_response(
+                query=query,
+                context=full_context,
+                system_prompt=system_prompt,
+                temperature=temperature
+            )
+        else:
+            # Streaming: forward deltas as they arrive and assemble the full answer
+            deltas = []
+            async for delta in llm_service.astream_response(
+                query=query,
+                context=full_context,
+                system_prompt=system_prompt,
+                temperature=temperature
+            ):
+                deltas.append(delta)
+                events.put_nowait({"type": "token", "node_id": node.id, "content": delta})
+            response = "".join(deltas)
         
+        get_prompt_metrics().record(prompt_sizes, time.perf_counter() - started)
         return response
     
     def validate_workflow(self, workflow_data: Dict[str, Any]) -> Dict[str, Any]:
         """Validate the workflow structure"""
-        nodes = workflow_data.get("nodes", [])
-        edges = workflow_data.get("edges", [])
-        
-        errors = []
-        warnings = []
-        
-        # Check for required node types
-        node_types = [node.get("type") for node in nodes]
-        
-        if "userQuery" not in node_types:
-            errors.append("Workflow must have a User Query component")
-        
-        if "output" not in node_types:
-            errors.append("Workflow must have an Output component")
-        
-        if "llmEngine" not in node_types:
-            warnings.append("Workflow has no LLM Engine - responses will be limited")
-        
-        # Check for disconnected nodes
-        connected_nodes = set()
-        for edge in edges:
-            connected_nodes.add(edge["source"])
-            connected_nodes.add(edge["target"])
-        
-        for node in nodes:
-            if node["id"] not in connected_nodes and len(nodes) > 1:
-                warnings.append(f"Node '{node.get('data', {}).get('label', node['id'])}' is not connected")
-        
-        return {
-            "valid": len(errors) == 0,
-            "errors": errors,
-            "warnings": warnings
-        }
+        return compile_workflow(workflow_data).validation
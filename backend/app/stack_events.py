@@ -0,0 +1,50 @@
+from typing import Callable, List, Union
+from uuid import UUID
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+# PostgreSQL channel carrying the ids of changed stacks
+STACK_CHANGES_CHANNEL = "stack_changes"
+_NOTIFY = text("SELECT pg_notify(:channel, :stack_id)")
+# Session.info key holding the stacks changed by the current transaction
+_CHANGED_STACKS = "changed_stacks"
+
+_listeners: List[Callable[[UUID], None]] = []
+
+
+def add_stack_change_listener(listener: Callable[[UUID], None]) -> None:
+    """Call listener with the id of each stack changed by a transaction this
+    process commits"""
+    _listeners.append(listener)
+
+
+def stack_changed(db: Union[Session, AsyncSession], stack_id: UUID) -> None:
+    """Record that the session's transaction changes a stack.
+
+    Nothing happens until the caller commits: listeners in this process run
+    after the commit, and on PostgreSQL a NOTIFY sent within the transaction
+    reaches other processes only if it commits.
+    """
+    session = db.sync_session if isinstance(db, AsyncSession) else db
+    session.info.setdefault(_CHANGED_STACKS, set()).add(stack_id)
+
+
+@event.listens_for(Session, "before_commit")
+def _notify_other_processes(session: Session) -> None:
+    changed = session.info.get(_CHANGED_STACKS)
+    if changed and session.get_bind().dialect.name == "postgresql":
+        for stack_id in changed:
+            session.execute(_NOTIFY, {"channel": STACK_CHANGES_CHANNEL, "stack_id": str(stack_id)})
+
+
+@event.listens_for(Session, "after_commit")
+def _notify_listeners(session: Session) -> None:
+    for stack_id in session.info.pop(_CHANGED_STACKS, ()):
+        for listener in _listeners:
+            listener(stack_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changes(session: Session) -> None:
+    session.info.pop(_CHANGED_STACKS, None)
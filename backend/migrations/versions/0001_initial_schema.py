@@ -0,0 +1,60 @@
+"""initial schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-16 00:00:00
+
+Tables as they were before migrations were introduced. Databases created
+by the old create_all() startup already have them and are left as they are.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+    if "stacks" not in existing:
+        op.create_table(
+            "stacks",
+            sa.Column("id", sa.Uuid(), primary_key=True),
+            sa.Column("name", sa.String(255), nullable=False),
+            sa.Column("description", sa.Text(), nullable=True),
+            sa.Column("workflow_data", sa.JSON(), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+            sa.Column("updated_at", sa.DateTime(), nullable=True),
+        )
+    if "documents" not in existing:
+        op.create_table(
+            "documents",
+            sa.Column("id", sa.Uuid(), primary_key=True),
+            sa.Column("stack_id", sa.Uuid(), sa.ForeignKey("stacks.id", ondelete="CASCADE"), nullable=False),
+            sa.Column("filename", sa.String(255), nullable=False),
+            sa.Column("file_path", sa.String(512), nullable=False),
+            sa.Column("content_hash", sa.String(64), nullable=True),
+            sa.Column("is_processed", sa.Boolean(), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+        )
+    if "chat_messages" not in existing:
+        op.create_table(
+            "chat_messages",
+            sa.Column("id", sa.Uuid(), primary_key=True),
+            sa.Column("stack_id", sa.Uuid(), sa.ForeignKey("stacks.id", ondelete="CASCADE"), nullable=False),
+            sa.Column("role", sa.String(50), nullable=False),
+            sa.Column("content", sa.Text(), nullable=False),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+        )
+
+
+def downgrade() -> None:
+    op.drop_table("chat_messages")
+    op.drop_table("documents")
+    op.drop_table("stacks")
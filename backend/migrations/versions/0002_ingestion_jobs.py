@@ -0,0 +1,58 @@
+"""ingestion jobs and document processing state
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-16 00:00:01
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # create_all() databases may already have any of these
+    inspector = sa.inspect(op.get_bind())
+    columns = {column["name"] for column in inspector.get_columns("documents")}
+    with op.batch_alter_table("documents") as batch:
+        if "processing_status" not in columns:
+            batch.add_column(sa.Column("processing_status", sa.String(20), nullable=True, server_default="pending"))
+        if "progress" not in columns:
+            batch.add_column(sa.Column("progress", sa.Float(), nullable=True, server_default="0"))
+        if "embedding_model" not in columns:
+            batch.add_column(sa.Column("embedding_model", sa.String(50), nullable=True))
+    if "ix_documents_content_hash" not in {index["name"] for index in inspector.get_indexes("documents")}:
+        op.create_index("ix_documents_content_hash", "documents", ["content_hash"])
+    if "ingestion_jobs" not in inspector.get_table_names():
+        op.create_table(
+            "ingestion_jobs",
+            sa.Column("id", sa.Uuid(), primary_key=True),
+            sa.Column("document_id", sa.Uuid(), sa.ForeignKey("documents.id", ondelete="CASCADE"), nullable=False),
+            sa.Column("embedding_model", sa.String(50), nullable=False),
+            sa.Column("status", sa.String(20), nullable=False),
+            sa.Column("progress", sa.Float(), nullable=False),
+            sa.Column("message", sa.Text(), nullable=True),
+            sa.Column("error", sa.Text(), nullable=True),
+            sa.Column("attempts", sa.Integer(), nullable=False),
+            sa.Column("lease_expires_at", sa.DateTime(), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+            sa.Column("updated_at", sa.DateTime(), nullable=True),
+            sa.Column("finished_at", sa.DateTime(), nullable=True),
+        )
+
+
+def downgrade() -> None:
+    op.drop_table("ingestion_jobs")
+    op.drop_index("ix_documents_content_hash", table_name="documents")
+    with op.batch_alter_table("documents") as batch:
+        batch.drop_column("embedding_model")
+        batch.drop_column("progress")
+        batch.drop_column("processing_status")
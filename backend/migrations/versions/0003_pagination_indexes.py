@@ -0,0 +1,37 @@
+"""indexes for keyset pagination and per-stack lookups
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-16 00:00:02
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Build without blocking writes on PostgreSQL; CONCURRENTLY cannot run
+    # inside a transaction
+    with op.get_context().autocommit_block():
+        # Chat history pages walk (stack_id, created_at, id) in order
+        op.create_index(
+            "ix_chat_messages_stack_id_created_at", "chat_messages", ["stack_id", "created_at", "id"],
+            postgresql_concurrently=True
+        )
+        op.create_index("ix_documents_stack_id", "documents", ["stack_id"], postgresql_concurrently=True)
+        # The stack list is ordered by most recently updated
+        op.create_index("ix_stacks_updated_at", "stacks", ["updated_at", "id"], postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_stacks_updated_at", table_name="stacks")
+    op.drop_index("ix_documents_stack_id", table_name="documents")
+    op.drop_index("ix_chat_messages_stack_id_created_at", table_name="chat_messages")
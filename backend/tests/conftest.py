@@ -0,0 +1,22 @@
+"""Test settings: a throwaway SQLite database and data directories.
+
+Settings are read when the app is imported, so the environment is set here
+before any test module imports it.
+"""
+import os
+import tempfile
+
+_DATA_DIR = tempfile.mkdtemp(prefix="genai-stack-tests-")
+
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_DATA_DIR, 'app.db')}"
+os.environ["ASYNC_DATABASE_URL"] = ""
+os.environ["RUN_MIGRATIONS_ON_STARTUP"] = "true"
+os.environ["CHROMA_PERSIST_DIRECTORY"] = os.path.join(_DATA_DIR, "chroma")
+os.environ["NUMPY_INDEX_DIR"] = os.path.join(_DATA_DIR, "numpy")
+os.environ["LEXICAL_INDEX_DIR"] = os.path.join(_DATA_DIR, "lexical")
+os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(_DATA_DIR, "embeddings.sqlite3")
+os.environ["UPLOAD_DIR"] = os.path.join(_DATA_DIR, "uploads")
+
+from app.database import run_migrations  # noqa: E402
+
+run_migrations()
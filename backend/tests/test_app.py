@@ -0,0 +1,19 @@
+from fastapi.testclient import TestClient
+from sqlalchemy import inspect
+
+from app.database import engine
+from app.main import app
+
+
+def test_app_boots_on_sqlite():
+    assert engine.dialect.name == "sqlite"
+    assert {"stacks", "documents", "chat_messages", "ingestion_jobs"} <= set(inspect(engine).get_table_names())
+
+    with TestClient(app) as client:
+        created = client.post("/api/stacks", json={"name": "SQLite stack"})
+        assert created.status_code == 200
+        stack_id = created.json()["data"]["id"]
+
+        fetched = client.get(f"/api/stacks/{stack_id}")
+        assert fetched.status_code == 200
+        assert fetched.json()["data"]["name"] == "SQLite stack"
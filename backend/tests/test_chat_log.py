@@ -0,0 +1,28 @@
+import asyncio
+import uuid
+
+from app.services.chat_log import ChatLog
+
+
+def test_failed_flush_leaves_a_single_retry_timer():
+    async def scenario():
+        chat_log = ChatLog(flush_interval=60)
+        stack_id = uuid.uuid4()
+        scheduled = []
+
+        async def failing_write(rows):
+            # A message arrives while the batch is being written
+            chat_log.append(stack_id, "user", "during the write")
+            scheduled.append(chat_log._timer)
+            raise OSError("database unreachable")
+
+        chat_log._write = failing_write
+        chat_log.append(stack_id, "user", "first")
+        assert await chat_log.flush() == 0
+
+        assert scheduled[0] is not None and scheduled[0].cancelled()
+        assert chat_log._timer is not scheduled[0] and not chat_log._timer.cancelled()
+        assert [message.content for message in chat_log.pending(stack_id)] == ["first", "during the write"]
+        chat_log._timer.cancel()
+
+    asyncio.run(scenario())
@@ -0,0 +1,53 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from app.database import AsyncSessionLocal, async_engine
+from app.models.chat import ChatMessage
+from app.models.stack import Stack
+from app.services import conversation_memory
+from app.services.chat_log import ChatLog
+from app.services.conversation_memory import ConversationMemory
+
+
+async def create_stack():
+    async with AsyncSessionLocal() as db:
+        stack = Stack(name="Memory stack")
+        db.add(stack)
+        await db.commit()
+        return stack.id
+
+
+async def commit_from_another_process(stack_id, content, created_at):
+    async with async_engine.begin() as connection:
+        await connection.execute(insert(ChatMessage).values(
+            stack_id=stack_id, role="user", content=content, created_at=created_at
+        ))
+
+
+def test_buffered_messages_do_not_move_the_cursor(monkeypatch):
+    chat_log = ChatLog(flush_interval=60)
+    monkeypatch.setattr(conversation_memory, "get_chat_log", lambda: chat_log)
+
+    async def scenario():
+        stack_id = await create_stack()
+        memory = ConversationMemory(window=10)
+        start = datetime.utcnow()
+        await commit_from_another_process(stack_id, "first", start - timedelta(seconds=2))
+        chat_log.append(stack_id, "user", "buffered")
+
+        context = await memory.context(stack_id, "next question", 1000, llm_service=None)
+        assert context.splitlines()[1:] == ["User: first", "User: buffered"]
+
+        # Timestamped before the buffered message, committed after it was read
+        await commit_from_another_process(stack_id, "late", start - timedelta(seconds=1))
+        assert await chat_log.flush() == 1
+
+        context = await memory.context(stack_id, "next question", 1000, llm_service=None)
+        assert context.splitlines()[1:] == ["User: first", "User: late", "User: buffered"]
+
+        context = await memory.context(stack_id, "next question", 1000, llm_service=None)
+        assert context.splitlines()[1:] == ["User: first", "User: late", "User: buffered"]
+
+    asyncio.run(scenario())
@@ -0,0 +1,99 @@
+import asyncio
+
+import pytest
+from cryptography.fernet import Fernet
+
+from app.database import AsyncSessionLocal
+from app.models.document import Document
+from app.models.stack import Stack
+from app.repositories import AsyncIngestionJobRepository
+from app.services import job_credentials
+from app.services.job_credentials import open_api_key, seal_api_key
+
+
+async def enqueue(encrypted_api_key=None):
+    async with AsyncSessionLocal() as db:
+        stack = Stack(name="Ingestion stack")
+        db.add(stack)
+        await db.flush()
+        document = Document(stack_id=stack.id, filename="doc.pdf", file_path="/tmp/doc.pdf")
+        db.add(document)
+        await db.commit()
+        job = await AsyncIngestionJobRepository(db).enqueue(document.id, "openai", encrypted_api_key)
+        return job.id
+
+
+async def claim(max_attempts=3, lease_seconds=60.0):
+    async with AsyncSessionLocal() as db:
+        return await AsyncIngestionJobRepository(db).claim_next(lease_seconds, max_attempts)
+
+
+async def get(job_id):
+    async with AsyncSessionLocal() as db:
+        job = await AsyncIngestionJobRepository(db).get_by_id(job_id)
+        document = await db.get(Document, job.document_id)
+        return job, document
+
+
+async def drain():
+    while await claim() is not None:
+        pass
+
+
+def test_api_key_is_stored_encrypted_with_the_job():
+    async def scenario():
+        await drain()
+        job_id = await enqueue(seal_api_key("sk-request"))
+        job, _ = await get(job_id)
+        assert "sk-request" not in job.encrypted_api_key
+
+        claimed = await claim()
+        assert claimed.id == job_id
+        assert open_api_key(claimed.encrypted_api_key) == "sk-request"
+
+        async with AsyncSessionLocal() as db:
+            await AsyncIngestionJobRepository(db).mark_completed(job_id, "done")
+        job, _ = await get(job_id)
+        assert job.encrypted_api_key is None
+
+    asyncio.run(scenario())
+
+
+def test_key_sealed_under_another_secret_is_refused(monkeypatch):
+    sealed = seal_api_key("sk-request")
+    monkeypatch.setattr(job_credentials, "_fernet", Fernet(Fernet.generate_key()))
+    with pytest.raises(ValueError, match="INGESTION_KEY_SECRET"):
+        open_api_key(sealed)
+
+
+def test_job_that_keeps_losing_its_lease_is_failed():
+    async def scenario():
+        await drain()
+        job_id = await enqueue()
+        for attempt in range(1, 3):
+            # The worker died: its lease is already over
+            claimed = await claim(max_attempts=2, lease_seconds=-1)
+            assert claimed.id == job_id and claimed.attempts == attempt
+
+        assert await claim(max_attempts=2) is None
+        job, document = await get(job_id)
+        assert job.status == "failed"
+        assert "2 attempts" in job.error
+        assert document.processing_status == "failed"
+
+    asyncio.run(scenario())
+
+
+def test_requeue_on_shutdown_does_not_count_as_an_attempt():
+    async def scenario():
+        await drain()
+        job_id = await enqueue()
+        for _ in range(3):
+            claimed = await claim(max_attempts=1)
+            assert claimed.id == job_id
+            async with AsyncSessionLocal() as db:
+                await AsyncIngestionJobRepository(db).requeue(job_id)
+        job, _ = await get(job_id)
+        assert job.status == "queued" and job.attempts == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,24 @@
+from app.services.lexical_index import LexicalIndex
+
+
+def test_search_reads_one_snapshot(tmp_path):
+    path = str(tmp_path / "bm25.sqlite3")
+    # Another process writing to the same index
+    writer = LexicalIndex(path)
+    writer.add(["a"], ["doc"], ["alpha beta"])
+
+    class RacedIndex(LexicalIndex):
+        raced = False
+
+        def _refresh(self):
+            super()._refresh()
+            if not self.raced:
+                self.raced = True
+                # Commits between this refresh and the postings reads
+                writer.add(["b"], ["doc"], ["alpha gamma"])
+
+    reader = RacedIndex(path)
+    assert [chunk_id for chunk_id, _ in reader.search("alpha", 10)] == ["a"]
+    assert sorted(chunk_id for chunk_id, _ in reader.search("alpha", 10)) == ["a", "b"]
+    writer.close()
+    reader.close()
@@ -0,0 +1,63 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+from app.scripts import measure_ttft
+from app.services.llm_service import LLMService
+
+TOKENS = ["Streaming ", "shows ", "the ", "answer ", "as ", "it ", "is ", "written."]
+TOKEN_DELAY = 0.02
+CONCURRENCY = 20
+
+
+class FakeCompletions:
+    """Chat completions that produce one token every TOKEN_DELAY seconds"""
+
+    async def create(self, model, messages, temperature, stream=False):
+        if not stream:
+            await asyncio.sleep(TOKEN_DELAY * len(TOKENS))
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="".join(TOKENS)))])
+
+        async def chunks():
+            for token in TOKENS:
+                await asyncio.sleep(TOKEN_DELAY)
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=token))])
+        return chunks()
+
+
+def fake_client(monkeypatch):
+    client = SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions()))
+    monkeypatch.setattr(LLMService, "async_client", property(lambda self: client))
+
+
+def test_chunks_arrive_before_the_completion_finishes(monkeypatch):
+    fake_client(monkeypatch)
+    llm_service = LLMService(provider="openai")
+
+    async def stream():
+        started = time.perf_counter()
+        arrivals = []
+        async for delta in llm_service.astream_response("query"):
+            arrivals.append((time.perf_counter() - started, delta))
+        return arrivals
+
+    async def scenario():
+        results = await asyncio.gather(*(stream() for _ in range(CONCURRENCY)))
+        for arrivals in results:
+            assert "".join(delta for _, delta in arrivals) == "".join(TOKENS)
+            # The first delta is available long before the last one
+            assert arrivals[0][0] < arrivals[-1][0] / 2
+
+    asyncio.run(scenario())
+
+
+def test_streaming_lowers_time_to_first_token_under_concurrency(monkeypatch):
+    fake_client(monkeypatch)
+    llm_service = LLMService(provider="openai")
+
+    async def scenario():
+        streamed = await asyncio.gather(*(measure_ttft._streamed(llm_service, "query") for _ in range(CONCURRENCY)))
+        complete = await asyncio.gather(*(measure_ttft._complete(llm_service, "query") for _ in range(CONCURRENCY)))
+        assert max(ttft for ttft, _ in streamed) < min(ttft for ttft, _ in complete) / 2
+
+    asyncio.run(scenario())
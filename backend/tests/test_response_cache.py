@@ -0,0 +1,64 @@
+import asyncio
+
+from app.services.embedding_service import EmbeddingService
+from app.services.llm_service import LLMService
+from app.services.response_cache import ResponseCache, get_response_cache
+from app.services.workflow_engine import WorkflowEngine
+
+WORKFLOW = {
+    "nodes": [
+        {"id": "userQuery-1", "type": "userQuery", "data": {"config": {}}},
+        {"id": "llmEngine-1", "type": "llmEngine", "data": {"config": {"enableResponseCache": True}}},
+        {"id": "output-1", "type": "output", "data": {"config": {}}},
+    ],
+    "edges": [
+        {"id": "e1", "source": "userQuery-1", "target": "llmEngine-1"},
+        {"id": "e2", "source": "llmEngine-1", "target": "output-1"},
+    ],
+}
+
+
+def test_new_workflow_version_drops_the_old_answers():
+    cache = ResponseCache(max_entries=10, ttl=60)
+    cache.store("stack", "v1", [1.0, 0.0], "old answer", 1.0)
+    cache.store("stack", "v2", [1.0, 0.0], "new answer", 1.0)
+    assert cache.stats()["stacks"] == 1
+    assert cache.lookup("stack", "v1", [1.0, 0.0], 0.9) is None
+    assert cache.lookup("stack", "v2", [1.0, 0.0], 0.9) == "new answer"
+
+
+def test_least_recently_used_stacks_are_dropped():
+    cache = ResponseCache(max_entries=10, ttl=60, max_stacks=2)
+    cache.store("a", "v1", [1.0, 0.0], "a", 1.0)
+    cache.store("b", "v1", [1.0, 0.0], "b", 1.0)
+    assert cache.lookup("a", "v1", [1.0, 0.0], 0.9) == "a"
+    cache.store("c", "v1", [1.0, 0.0], "c", 1.0)
+    assert cache.lookup("b", "v1", [1.0, 0.0], 0.9) is None
+    assert cache.lookup("a", "v1", [1.0, 0.0], 0.9) == "a"
+    assert cache.lookup("c", "v1", [1.0, 0.0], 0.9) == "c"
+
+
+def test_streamed_cache_hit_has_the_same_done_fields(monkeypatch):
+    async def embed(self, texts):
+        return [[1.0, 0.0, 0.0] for _ in texts]
+
+    async def stream(self, query, context=None, system_prompt=None, temperature=0.7):
+        for token in ["Hello", " world"]:
+            yield token
+
+    monkeypatch.setattr(EmbeddingService, "agenerate_embeddings", embed)
+    monkeypatch.setattr(LLMService, "astream_response", stream)
+
+    async def done_event():
+        events = [event async for event in WorkflowEngine(db=None).execute_stream("stream-stack", WORKFLOW, "hi")]
+        return events[-1]
+
+    async def scenario():
+        hits = get_response_cache().hits
+        miss = await done_event()
+        hit = await done_event()
+        assert get_response_cache().hits == hits + 1
+        assert miss["response"] == hit["response"] == "Hello world"
+        assert hit.keys() == miss.keys()
+
+    asyncio.run(scenario())
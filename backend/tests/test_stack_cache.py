@@ -0,0 +1,62 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, update
+
+from app.database import AsyncSessionLocal, async_engine
+from app.models.stack import Stack
+from app.services.stack_cache import get_cached_stack, get_stack_cache
+
+
+async def create_stack(name):
+    async with AsyncSessionLocal() as db:
+        stack = Stack(name=name)
+        db.add(stack)
+        await db.commit()
+        return stack.id
+
+
+async def cached_name(stack_id):
+    async with AsyncSessionLocal() as db:
+        stack = await get_cached_stack(db, stack_id)
+        return stack.name if stack is not None else None
+
+
+async def write_from_another_process(statement):
+    # Bypasses the session events, so no listener in this process hears of it
+    async with async_engine.begin() as connection:
+        await connection.execute(statement)
+
+
+def test_polling_invalidates_stacks_changed_elsewhere():
+    async def scenario():
+        cache = get_stack_cache()
+        updated_id = await create_stack("before")
+        deleted_id = await create_stack("deleted")
+        assert await cached_name(updated_id) == "before"
+        assert await cached_name(deleted_id) == "deleted"
+
+        await write_from_another_process(update(Stack).where(Stack.id == updated_id).values(
+            name="after", updated_at=datetime.utcnow() + timedelta(seconds=1)
+        ))
+        await write_from_another_process(delete(Stack).where(Stack.id == deleted_id))
+        assert await cached_name(updated_id) == "before"
+
+        polls, invalidations = cache.polls, cache.invalidations
+        cache.poll_interval = 0.05
+        cache.start()
+        try:
+            for _ in range(100):
+                if cache.invalidations >= invalidations + 2:
+                    break
+                await asyncio.sleep(0.05)
+        finally:
+            await cache.stop()
+
+        assert cache.polls > polls
+        assert not cache.stats()["listening"]
+        assert cache.get(updated_id) is None and cache.get(deleted_id) is None
+        assert await cached_name(updated_id) == "after"
+        assert await cached_name(deleted_id) is None
+
+    asyncio.run(scenario())
@@ -0,0 +1,96 @@
+import uuid
+
+import pytest
+
+from app.database import SessionLocal
+from app.models.document import Document
+from app.models.stack import Stack
+from app.services.vector_store_service import (
+    PER_STACK_MODE,
+    SHARED_MODE,
+    VectorStoreService,
+    migrate_vector_store
+)
+
+# text-embedding-3-small and embedding-001 dimensions
+DIMENSIONS = {"openai": 1536, "gemini": 768}
+
+
+def make_stack(embedding_model):
+    db = SessionLocal()
+    try:
+        stack = Stack(name=f"{embedding_model} stack")
+        db.add(stack)
+        db.flush()
+        document = Document(
+            stack_id=stack.id,
+            filename="doc.pdf",
+            file_path="/tmp/doc.pdf",
+            is_processed=True,
+            processing_status="completed",
+            embedding_model=embedding_model
+        )
+        db.add(document)
+        db.commit()
+        return str(stack.id), str(document.id)
+    finally:
+        db.close()
+
+
+def vector(embedding_model, hot):
+    values = [0.0] * DIMENSIONS[embedding_model]
+    values[hot] = 1.0
+    return values
+
+
+def write(stack_id, document_id, embedding_model, mode):
+    store = VectorStoreService.for_stack(stack_id, embedding_model, mode=mode)
+    store.add_documents(
+        documents=[f"{embedding_model} {i}" for i in range(3)],
+        embeddings=[vector(embedding_model, i) for i in range(3)],
+        ids=[f"{document_id}_{i}" for i in range(3)],
+        metadatas=[{"document_id": document_id}] * 3
+    )
+
+
+def nearest(stack_id, embedding_model, mode):
+    store = VectorStoreService.for_stack(stack_id, embedding_model, mode=mode)
+    return store.query(vector(embedding_model, 1), n_results=1)["documents"][0]
+
+
+def test_shared_mode_keeps_embedding_dimensions_apart():
+    stacks = {model: make_stack(model) for model in DIMENSIONS}
+    for model, (stack_id, document_id) in stacks.items():
+        write(stack_id, document_id, model, SHARED_MODE)
+
+    for model, (stack_id, _) in stacks.items():
+        assert nearest(stack_id, model, SHARED_MODE) == [f"{model} 1"]
+
+
+def test_migration_moves_stacks_with_different_dimensions():
+    stacks = {model: make_stack(model) for model in DIMENSIONS}
+    for model, (stack_id, document_id) in stacks.items():
+        write(stack_id, document_id, model, PER_STACK_MODE)
+
+    moved = migrate_vector_store(SHARED_MODE)
+    for model, (stack_id, _) in stacks.items():
+        assert moved[stack_id] == 3
+        assert nearest(stack_id, model, SHARED_MODE) == [f"{model} 1"]
+
+    moved = migrate_vector_store(PER_STACK_MODE)
+    for model, (stack_id, _) in stacks.items():
+        assert moved[stack_id] == 3
+        assert nearest(stack_id, model, PER_STACK_MODE) == [f"{model} 1"]
+
+
+def test_migration_refuses_a_stack_with_several_models():
+    stack_id, document_id = make_stack("openai")
+    write(stack_id, document_id, "openai", SHARED_MODE)
+    write(stack_id, str(uuid.uuid4()), "gemini", SHARED_MODE)
+
+    with pytest.raises(ValueError, match="several embedding models"):
+        migrate_vector_store(PER_STACK_MODE)
+    assert nearest(stack_id, "openai", SHARED_MODE) == ["openai 1"]
+
+    for store in VectorStoreService.all_for_stack(stack_id, mode=SHARED_MODE):
+        store.clear_collection()
@@ -1,5 +1,5 @@
 import apiClient from './client';
-import type { ChatMessage, ApiResponse } from '../types';
+import type { ChatMessage, ChatStreamEvent, ApiResponse } from '../types';
 
 export const chatApi = {
     sendMessage: async (stackId: string, message: string): Promise<ApiResponse<{ response: string }>> => {
@@ -7,8 +7,55 @@ export const chatApi = {
         return response.data;
     },
 
-    getHistory: async (stackId: string, limit: number = 50): Promise<ApiResponse<ChatMessage[]>> => {
-        const response = await apiClient.get(`/chat/${stackId}/history?limit=${limit}`);
+    streamMessage: async (
+        stackId: string,
+        message: string,
+        onEvent: (event: ChatStreamEvent) => void
+    ): Promise<void> => {
+        const response = await fetch(`${apiClient.defaults.baseURL}/chat/${stackId}/stream`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json', Accept: 'text/event-stream' },
+            body: JSON.stringify({ message }),
+        });
+
+        // Validation failures come back as a regular JSON error response
+        if (!response.headers.get('content-type')?.includes('text/event-stream') || !response.body) {
+            const data: ApiResponse<null> = await response.json();
+            onEvent({
+                type: 'error',
+                code: data.error?.code || 'STREAM_ERROR',
+                message: data.error?.message || 'Failed to start stream',
+            });
+            return;
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            let boundary = buffer.indexOf('\n\n');
+            while (boundary !== -1) {
+                const rawEvent = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+                const data = rawEvent
+                    .split('\n')
+                    .filter((line) => line.startsWith('data: '))
+                    .map((line) => line.slice(6))
+                    .join('\n');
+                if (data) {
+                    onEvent(JSON.parse(data) as ChatStreamEvent);
+                }
+                boundary = buffer.indexOf('\n\n');
+            }
+        }
+    },
+
+    getHistory: async (stackId: string, limit: number = 50, cursor?: string): Promise<ApiResponse<ChatMessage[]>> => {
+        const response = await apiClient.get(`/chat/${stackId}/history`, { params: { limit, cursor } });
         return response.data;
     },
 
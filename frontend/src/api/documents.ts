@@ -1,5 +1,5 @@
 import apiClient from './client';
-import type { Document, ApiResponse } from '../types';
+import type { Document, IngestionJob, ApiResponse } from '../types';
 
 export const documentsApi = {
     upload: async (stackId: string, file: File): Promise<ApiResponse<{ id: string; filename: string; message: string }>> => {
@@ -14,7 +14,8 @@ export const documentsApi = {
         return response.data;
     },
 
-    process: async (documentId: string, embeddingModel: string = 'openai', apiKey?: string): Promise<ApiResponse<Document>> => {
+    // Returns the queued job, or the document itself if it was already processed
+    process: async (documentId: string, embeddingModel: string = 'openai', apiKey?: string): Promise<ApiResponse<IngestionJob | Document>> => {
         const params = new URLSearchParams({ embedding_model: embeddingModel });
         if (apiKey) params.append('api_key', apiKey);
 
@@ -22,6 +23,11 @@ export const documentsApi = {
         return response.data;
     },
 
+    getJob: async (jobId: string): Promise<ApiResponse<IngestionJob>> => {
+        const response = await apiClient.get(`/documents/jobs/${jobId}`);
+        return response.data;
+    },
+
     getByStack: async (stackId: string): Promise<ApiResponse<Document[]>> => {
         const response = await apiClient.get(`/documents/stack/${stackId}`);
         return response.data;
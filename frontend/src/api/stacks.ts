@@ -2,8 +2,8 @@ import apiClient from './client';
 import type { Stack, StackCreate, StackUpdate, WorkflowData, ApiResponse } from '../types';
 
 export const stacksApi = {
-    getAll: async (): Promise<ApiResponse<Stack[]>> => {
-        const response = await apiClient.get('/stacks');
+    getAll: async (cursor?: string): Promise<ApiResponse<Stack[]>> => {
+        const response = await apiClient.get('/stacks', { params: { cursor } });
         return response.data;
     },
 
@@ -66,18 +66,36 @@ export const ChatModal: React.FC<ChatModalProps> = ({
         setMessages((prev) => [...prev, userMessage]);
         setSending(true);
 
+        const assistantId = `temp-${Date.now()}-assistant`;
+        const upsertAssistant = (update: (content: string) => string) => {
+            setMessages((prev) => {
+                const existing = prev.find((m) => m.id === assistantId);
+                if (existing) {
+                    return prev.map((m) => (m.id === assistantId ? { ...m, content: update(m.content) } : m));
+                }
+                return [
+                    ...prev,
+                    {
+                        id: assistantId,
+                        stack_id: stackId,
+                        role: 'assistant',
+                        content: update(''),
+                        created_at: new Date().toISOString(),
+                    },
+                ];
+            });
+        };
+
         try {
-            const response = await chatApi.sendMessage(stackId, message);
-            if (response.success && response.data) {
-                const assistantMessage: ChatMessageType = {
-                    id: `temp-${Date.now()}-assistant`,
-                    stack_id: stackId,
-                    role: 'assistant',
-                    content: response.data.response,
-                    created_at: new Date().toISOString(),
-                };
-                setMessages((prev) => [...prev, assistantMessage]);
-            }
+            await chatApi.streamMessage(stackId, message, (event) => {
+                if (event.type === 'token') {
+                    upsertAssistant((content) => content + event.content);
+                } else if (event.type === 'done') {
+                    upsertAssistant(() => event.response);
+                } else if (event.type === 'error') {
+                    console.error('Failed to send message:', event.message);
+                }
+            });
         } catch (error) {
             console.error('Failed to send message:', error);
         } finally {
@@ -131,7 +149,8 @@ export const ChatModal: React.FC<ChatModalProps> = ({
                             {messages.map((message) => (
                                 <ChatMessage key={message.id} message={message} />
                             ))}
-                            {sending && (
+                            {/* Once tokens start arriving the streaming answer replaces the indicator */}
+                            {sending && messages[messages.length - 1]?.role !== 'assistant' && (
                                 <div className="flex items-center gap-3 p-4 bg-bg-tertiary rounded-lg self-start text-text-secondary text-sm">
                                     <div className="flex gap-1">
                                         <span className="w-1.5 h-1.5 bg-accent-primary rounded-full animate-[bounce_1.4s_infinite_ease-in-out_both_-0.32s]" />
@@ -93,7 +93,20 @@ export const ConfigPanel: React.FC<ConfigPanelProps> = ({
     const handleProcessDocument = async (docId: string) => {
         setProcessing(docId);
         try {
-            await documentsApi.process(docId, config.embeddingModel || 'openai', config.apiKey);
+            const response = await documentsApi.process(docId, config.embeddingModel || 'openai', config.apiKey);
+            // Processing runs as a background job; poll until it finishes
+            if (response.success && response.data && 'status' in response.data) {
+                let job = response.data;
+                while (job.status === 'queued' || job.status === 'running') {
+                    await new Promise((resolve) => setTimeout(resolve, 1500));
+                    const jobResponse = await documentsApi.getJob(job.id);
+                    if (!jobResponse.success || !jobResponse.data) break;
+                    job = jobResponse.data;
+                }
+                if (job.status === 'failed') {
+                    console.error('Processing failed:', job.error);
+                }
+            }
             onDocumentsChange();
         } catch (error) {
             console.error('Processing failed:', error);
@@ -178,6 +191,29 @@ export const ConfigPanel: React.FC<ConfigPanelProps> = ({
                     onChange={(e) => updateConfig({ apiKey: e.target.value })}
                 />
             </div>
+            <div className="flex flex-col gap-2">
+                <label className="text-[13px] font-medium text-text-secondary">Keyword Match Weight: {config.lexicalWeight ?? 1}</label>
+                <input
+                    type="range"
+                    min="0"
+                    max="2"
+                    step="0.1"
+                    value={config.lexicalWeight ?? 1}
+                    onChange={(e) => updateConfig({ lexicalWeight: parseFloat(e.target.value) })}
+                    className="w-full h-1.5 appearance-none bg-bg-tertiary rounded-full outline-none [&::-webkit-slider-thumb]:appearance-none [&::-webkit-slider-thumb]:w-[18px] [&::-webkit-slider-thumb]:h-[18px] [&::-webkit-slider-thumb]:rounded-full [&::-webkit-slider-thumb]:bg-accent-primary [&::-webkit-slider-thumb]:cursor-pointer [&::-webkit-slider-thumb]:border-2 [&::-webkit-slider-thumb]:border-bg-secondary"
+                />
+            </div>
+            <div className="flex flex-col gap-2">
+                <label className="flex items-center gap-2 text-sm text-text-primary cursor-pointer">
+                    <input
+                        type="checkbox"
+                        checked={config.enableRerank || false}
+                        onChange={(e) => updateConfig({ enableRerank: e.target.checked })}
+                        className="w-[18px] h-[18px] accent-accent-primary"
+                    />
+                    <span>Rerank Retrieved Passages</span>
+                </label>
+            </div>
         </>
     );
 
@@ -240,6 +276,39 @@ export const ConfigPanel: React.FC<ConfigPanelProps> = ({
                     <span>Enable Web Search</span>
                 </label>
             </div>
+            <div className="flex flex-col gap-2">
+                <label className="flex items-center gap-2 text-sm text-text-primary cursor-pointer">
+                    <input
+                        type="checkbox"
+                        checked={config.enableResponseCache || false}
+                        onChange={(e) => updateConfig({ enableResponseCache: e.target.checked })}
+                        className="w-[18px] h-[18px] accent-accent-primary"
+                    />
+                    <span>Reuse Answers to Similar Questions</span>
+                </label>
+            </div>
+            <div className="flex flex-col gap-2">
+                <label className="flex items-center gap-2 text-sm text-text-primary cursor-pointer">
+                    <input
+                        type="checkbox"
+                        checked={config.includeWorkflowContext || false}
+                        onChange={(e) => updateConfig({ includeWorkflowContext: e.target.checked })}
+                        className="w-[18px] h-[18px] accent-accent-primary"
+                    />
+                    <span>Describe Workflow to the Model</span>
+                </label>
+            </div>
+            <div className="flex flex-col gap-2">
+                <label className="flex items-center gap-2 text-sm text-text-primary cursor-pointer">
+                    <input
+                        type="checkbox"
+                        checked={config.enableMemory || false}
+                        onChange={(e) => updateConfig({ enableMemory: e.target.checked })}
+                        className="w-[18px] h-[18px] accent-accent-primary"
+                    />
+                    <span>Remember the Conversation</span>
+                </label>
+            </div>
         </>
     );
 
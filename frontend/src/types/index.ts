@@ -62,9 +62,25 @@ export interface Document {
   stack_id: string;
   filename: string;
   is_processed: boolean;
+  processing_status?: 'pending' | 'queued' | 'processing' | 'completed' | 'failed';
+  progress?: number;
   created_at: string;
 }
 
+export interface IngestionJob {
+  id: string;
+  document_id: string;
+  embedding_model: string;
+  status: 'queued' | 'running' | 'completed' | 'failed';
+  progress: number;
+  message: string | null;
+  error: string | null;
+  attempts: number;
+  created_at: string;
+  updated_at: string;
+  finished_at: string | null;
+}
+
 // Chat types
 export interface ChatMessage {
   id: string;
@@ -83,12 +99,20 @@ export interface ChatResponse {
   sources?: string[];
 }
 
+// Server-Sent Events emitted by /chat/{stackId}/stream
+export type ChatStreamEvent =
+  | { type: 'node'; node_id: string; node_type: string; label: string; status: 'started' | 'completed' | 'skipped' | 'failed' }
+  | { type: 'token'; node_id: string; content: string }
+  | { type: 'done'; response: string }
+  | { type: 'error'; code: string; message: string };
+
 // API Response types
 export interface ApiResponse<T> {
   success: boolean;
   data: T | null;
   message: string | null;
   error: ApiError | null;
+  next_cursor?: string | null;
 }
 
 export interface ApiError {